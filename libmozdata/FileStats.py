@@ -2,7 +2,6 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-import argparse
 import numbers
 from datetime import datetime, timedelta, timezone
 from pprint import pprint
@@ -110,6 +109,8 @@ class FileStats(object):
 
 
 if __name__ == "__main__":
+    import argparse
+
     parser = argparse.ArgumentParser(description="File Stats")
     parser.add_argument("-p", "--path", action="store", help="file path")
     parser.add_argument(
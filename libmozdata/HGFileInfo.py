@@ -2,12 +2,20 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import bisect
+import hashlib
+import json
 import logging
+import os
 import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 
 import six
 
-from . import hgmozilla
+from . import config, hgmozilla
 from .connection import Query
 
 
@@ -19,15 +27,39 @@ class HGFileInfo(object):
     """
 
     MAX_REV_COUNT = 4095
-
-    def __init__(self, paths, channel="nightly", node="default", date_type="push"):
+    # The history before this year is retrieved in a single window
+    HISTORY_START_YEAR = 2007
+
+    def __init__(
+        self,
+        paths,
+        channel="nightly",
+        node="default",
+        date_type="push",
+        parallel=False,
+        data=None,
+    ):
         """Constructor
 
         Args:
             paths (List[str]): the paths
             channel (str): channel version of firefox
             node (Optional[str]): the node, by default 'default'
+            date_type (Optional[str]): 'push' or 'creation', the date used to
+                filter the patches. A local repository (Mercurial.LocalRepo)
+                doesn't know the push dates, so 'creation' must be used with it.
+            parallel (Optional[bool]): if True the history is retrieved with
+                concurrent queries on date windows instead of following the
+                file log page by page
+            data (Optional[dict]): the already known log entries for some paths,
+                they aren't retrieved
         """
+        if date_type != "creation" and hgmozilla.Mercurial.LOCAL_REPO:
+            raise Exception(
+                "The push dates aren't available with a local repository, "
+                "use date_type='creation'"
+            )
+
         self.channel = channel
         self.node = node
         self.date_type = "date" if date_type == "creation" else "pushdate"
@@ -35,10 +67,26 @@ class HGFileInfo(object):
         self.paths = [paths] if isinstance(paths, six.string_types) else paths
         for p in self.paths:
             self.data[p] = []
+        if data:
+            self.data.update(data)
+        paths = [p for p in self.paths if not data or p not in data]
         self.bug_pattern = re.compile(r"[\t ]*[Bb][Uu][Gg][\t ]*([0-9]+)")
         self.rev_pattern = re.compile(r"r=([a-zA-Z0-9]+)")
+        self.author_pattern = re.compile(r"<([^>]+)>")
+        self.email_pattern = re.compile(r"<?([\w\-\._\+%]+@[\w\-\._\+%]+)>?")
+        self.indexes = {}
         self.results = []
-        self.__get_info(self.paths, self.node)
+        self.parallel = parallel
+        if paths:
+            if parallel:
+                self.__get_info_by_windows(paths, HGFileInfo.__get_windows())
+            else:
+                self.__get_info(paths, self.node)
+
+    def wait(self):
+        """Wait for the file logs to be retrieved"""
+        for result in self.results:
+            result.wait()
 
     def get(self, path, utc_ts_from=None, utc_ts_to=None, authors=[]):
         if utc_ts_to is None:
@@ -47,19 +95,86 @@ class HGFileInfo(object):
             assert isinstance(revision[self.date_type], list)
             utc_ts_to = revision[self.date_type][0]
 
-        for result in self.results:
-            result.wait()
-
-        author_pattern = re.compile(r"<([^>]+)>")
-        email_pattern = re.compile(r"<?([\w\-\._\+%]+@[\w\-\._\+%]+)>?")
-
-        entries = self.data[path]
+        self.wait()
+
+        if path not in self.indexes:
+            self.indexes[path] = self.__get_index(path)
+        dates, infos, by_author = self.indexes[path]
+
+        if authors:
+            selected = []
+            for author in set(authors):
+                if author in by_author:
+                    author_dates, author_infos = by_author[author]
+                    selected += self.__get_range(
+                        author_dates, author_infos, utc_ts_from, utc_ts_to
+                    )
+            # keep the order of the entries from hg
+            selected.sort(key=lambda info: info[0])
+        else:
+            selected = self.__get_range(dates, infos, utc_ts_from, utc_ts_to)
+            selected = sorted(selected, key=lambda info: info[0])
 
         authors_result = {}
         bugs = set()
         patches = []
 
-        for entry in entries:
+        for _, patch_author, starter, reviewers, entry in selected:
+            if patch_author not in authors_result:
+                authors_result[patch_author] = {"count": 1, "reviewers": {}}
+            else:
+                authors_result[patch_author]["count"] += 1
+
+            if starter:
+                bugs.add(starter)
+
+            if reviewers:
+                _reviewers = authors_result[patch_author]["reviewers"]
+                for reviewer in reviewers:
+                    if reviewer not in _reviewers:
+                        _reviewers[reviewer] = 1
+                    else:
+                        _reviewers[reviewer] += 1
+
+            patches.append(entry)
+
+        return {"authors": authors_result, "bugs": bugs, "patches": patches}
+
+    @staticmethod
+    def __get_range(dates, infos, utc_ts_from, utc_ts_to):
+        """Get the infos with a date in [utc_ts_from, utc_ts_to]
+
+        Args:
+            dates (List[int]): the sorted dates
+            infos (List[tuple]): the infos corresponding to the dates
+
+        Returns:
+            List[tuple]: the infos in the range
+        """
+        lo = 0 if utc_ts_from is None else bisect.bisect_left(dates, utc_ts_from)
+        hi = bisect.bisect_right(dates, utc_ts_to)
+        return infos[lo:hi]
+
+    def __get_index(self, path):
+        """Parse the entries for a path once and sort them by date
+
+        Args:
+            path (str): the path
+
+        Returns:
+            tuple: the sorted dates, the corresponding infos and the same per author
+        """
+        if self.parallel:
+            # the windows came back in any order
+            entries = {entry["node"]: entry for entry in self.data[path]}
+            self.data[path] = sorted(
+                entries.values(),
+                key=lambda e: (e.get("pushid") or 0, e["date"][0]),
+                reverse=True,
+            )
+
+        infos = []
+        for position, entry in enumerate(self.data[path]):
             assert self.date_type in entry
 
             # no pushdate
@@ -74,42 +189,39 @@ class HGFileInfo(object):
             assert isinstance(entry[self.date_type], list)
             utc_date = entry[self.date_type][0]
 
-            if (
-                utc_ts_from is not None and utc_ts_from > utc_date
-            ) or utc_ts_to < utc_date:
-                continue
-
-            m = author_pattern.search(entry["user"])
+            m = self.author_pattern.search(entry["user"])
             if m is None:
-                m = email_pattern.search(entry["user"])
+                m = self.email_pattern.search(entry["user"])
             if m:
                 entry["user"] = m.group(1)
-            patch_author = entry["user"]
-            if authors and patch_author not in authors:
-                continue
-
-            if patch_author not in authors_result:
-                authors_result[patch_author] = {"count": 1, "reviewers": {}}
-            else:
-                authors_result[patch_author]["count"] += 1
 
             info_desc = self.__get_info_from_desc(entry["desc"])
-            starter = info_desc["starter"]
-            if starter:
-                bugs.add(info_desc["starter"])
+            infos.append(
+                (
+                    utc_date,
+                    (
+                        position,
+                        entry["user"],
+                        info_desc["starter"],
+                        info_desc["reviewers"],
+                        entry,
+                    ),
+                )
+            )
 
-            reviewers = info_desc["reviewers"]
-            if reviewers:
-                _reviewers = authors_result[patch_author]["reviewers"]
-                for reviewer in reviewers:
-                    if reviewer not in _reviewers:
-                        _reviewers[reviewer] = 1
-                    else:
-                        _reviewers[reviewer] += 1
+        infos.sort(key=lambda info: info[0])
+        dates = [utc_date for utc_date, _ in infos]
+        infos = [info for _, info in infos]
 
-            patches.append(entry)
+        by_author = {}
+        for utc_date, info in zip(dates, infos):
+            author = info[1]
+            if author not in by_author:
+                by_author[author] = ([], [])
+            by_author[author][0].append(utc_date)
+            by_author[author][1].append(info)
 
-        return {"authors": authors_result, "bugs": bugs, "patches": patches}
+        return dates, infos, by_author
 
     def __get_info_from_desc(self, desc):
         """Get some information from the patch description
@@ -163,3 +275,292 @@ class HGFileInfo(object):
             )
 
         self.results.append(hgmozilla.FileInfo(queries=queries))
+
+    @staticmethod
+    def __get_windows():
+        """Get the initial date windows, one per year
+
+        The windows are on the commit date whereas the entries are filtered
+        on the push date (by default) in get, so their union must cover all
+        the commit dates: the first and the last ones are unbounded.
+
+        Returns:
+            List[tuple]: the windows (first day, last day), None for no bound
+        """
+        today = datetime.now(timezone.utc).date()
+        start = HGFileInfo.HISTORY_START_YEAR
+        windows = [
+            (None, date(1969, 12, 31)),
+            (date(1970, 1, 1), date(start - 1, 12, 31)),
+        ]
+        for year in range(start, today.year):
+            windows.append((date(year, 1, 1), date(year, 12, 31)))
+        windows.append((date(today.year, 1, 1), date(today.year + 1, 12, 31)))
+        windows.append((date(today.year + 2, 1, 1), None))
+
+        return windows
+
+    @staticmethod
+    def __get_revset(path, node, window):
+        """Get the revset for the log of a file in a date window
+
+        Args:
+            path (str): the file path
+            node (str): the revision where the log starts
+            window (tuple): the first and the last day, None for no bound
+
+        Returns:
+            str: the revset
+        """
+        start, end = window
+        if start is None:
+            dates = "<%s" % end.isoformat()
+        elif end is None:
+            dates = ">%s" % start.isoformat()
+        else:
+            dates = "%s to %s" % (start.isoformat(), end.isoformat())
+        path = path.replace("\\", "\\\\").replace('"', '\\"')
+
+        # filelog only visits the revisions of the file whereas file scans
+        # the whole changelog
+        return 'filelog("%s") and date("%s") and ::%s' % (path, dates, node)
+
+    def __window_handler(self, json, data):
+        """Handler for the log of a file in a date window
+
+        A window containing too many entries is split in two halves.
+
+        Args:
+            json (dict): json
+            data (tuple): the path and the window
+        """
+        path, (start, end) = data
+        entries = json["entries"]
+        bounded = start is not None and end is not None
+        if len(entries) > HGFileInfo.MAX_REV_COUNT and bounded and start < end:
+            middle = start + (end - start) // 2
+            self.__get_info_by_windows(
+                [path], [(start, middle), (middle + timedelta(1), end)]
+            )
+        else:
+            if len(entries) > HGFileInfo.MAX_REV_COUNT:
+                logging.getLogger(__name__).warning(
+                    "Too many entries for file %s on %s" % (path, start or end)
+                )
+            self.data[path].extend(entries)
+
+    def __get_info_by_windows(self, paths, windows):
+        """Get info with a revset query for each date window"""
+        queries = []
+        url = hgmozilla.Mercurial.get_repo_url(self.channel) + "/json-log"
+        for path in paths:
+            for start, end in windows:
+                revset = HGFileInfo.__get_revset(path, self.node, (start, end))
+                params = {"rev": revset, "revcount": HGFileInfo.MAX_REV_COUNT + 1}
+                queries.append(
+                    Query(
+                        url,
+                        params,
+                        handler=self.__window_handler,
+                        handlerdata=(path, (start, end)),
+                    )
+                )
+
+        self.results.append(hgmozilla.Mercurial(queries=queries))
+
+
+class HGFileInfoCache(object):
+    """Bounded cache of HGFileInfo, one per channel and path
+
+    The least recently used file infos are dropped when there are more than
+    max_size of them.
+    When a directory is given (by default the option FileLogCache in the
+    Mercurial section of the config), the file logs are saved there with the
+    head of the channel they've been retrieved for. When the head has moved,
+    only the new entries are retrieved.
+    """
+
+    MAX_SIZE = 256
+    DIRECTORY = config.get("Mercurial", "FileLogCache", "")
+    # Number of entries to retrieve at once when a file log is extended
+    INCREMENT = 64
+    # Number of file logs loaded at the same time by prefetch
+    MAX_WORKERS = 8
+
+    def __init__(self, max_size=None, directory=None, date_type="creation"):
+        """Constructor
+
+        Args:
+            max_size (Optional[int]): the maximal number of file infos in memory
+            directory (Optional[str]): the directory where to save the file logs
+            date_type (Optional[str]): the date type used by the file infos
+        """
+        self.max_size = max_size or HGFileInfoCache.MAX_SIZE
+        self.directory = HGFileInfoCache.DIRECTORY if directory is None else directory
+        self.date_type = date_type
+        self.__lock = threading.Lock()
+        self.__infos = OrderedDict()
+        self.__pending = {}
+        self.__executor = None
+
+    def __len__(self):
+        return len(self.__infos)
+
+    def clear(self):
+        """Remove the file infos from memory"""
+        with self.__lock:
+            self.__infos.clear()
+
+    def get(self, path, channel="nightly"):
+        """Get the file info for a path
+
+        Args:
+            path (str): the path
+            channel (Optional[str]): channel version of firefox
+
+        Returns:
+            HGFileInfo: the file info
+        """
+        key = (channel, path)
+        with self.__lock:
+            hi = self.__infos.get(key)
+            if hi is not None:
+                self.__infos.move_to_end(key)
+                return hi
+            future = self.__pending.get(key)
+
+        if future is not None:
+            return future.result()
+        return self.__load(path, channel)
+
+    def prefetch(self, paths, channel="nightly"):
+        """Start to get the file infos for some paths, without waiting for them
+
+        With a directory, the file logs are loaded in the background by at most
+        MAX_WORKERS threads and get waits for them.
+
+        Args:
+            paths (List[str]): the paths
+            channel (Optional[str]): channel version of firefox
+        """
+        if not self.directory:
+            # the file infos retrieve their file logs in the background
+            for path in paths:
+                self.get(path, channel)
+            return
+
+        with self.__lock:
+            if self.__executor is None:
+                self.__executor = ThreadPoolExecutor(
+                    max_workers=HGFileInfoCache.MAX_WORKERS
+                )
+            head = None
+            for path in paths:
+                key = (channel, path)
+                if key in self.__infos or key in self.__pending:
+                    continue
+                if head is None:
+                    # the head is retrieved once for all the paths
+                    head = self.__executor.submit(HGFileInfoCache.__get_head, channel)
+                self.__pending[key] = self.__executor.submit(
+                    self.__load, path, channel, head
+                )
+
+    def __load(self, path, channel, head=None):
+        key = (channel, path)
+        try:
+            if self.directory:
+                hi = self.__get_from_disk(
+                    path, channel, head.result() if head is not None else None
+                )
+            else:
+                hi = HGFileInfo(path, channel=channel, date_type=self.date_type)
+
+            with self.__lock:
+                self.__infos[key] = hi
+                while len(self.__infos) > self.max_size:
+                    self.__infos.popitem(last=False)
+        finally:
+            with self.__lock:
+                self.__pending.pop(key, None)
+
+        return hi
+
+    def __get_file(self, path, channel):
+        name = hashlib.sha1(path.encode("utf-8")).hexdigest() + ".json"
+        return os.path.join(self.directory, channel, name)
+
+    @staticmethod
+    def __get_head(channel):
+        return hgmozilla.Revision.get_revision(channel, "default")["node"]
+
+    def __get_from_disk(self, path, channel, head=None):
+        if head is None:
+            head = HGFileInfoCache.__get_head(channel)
+        filename = self.__get_file(path, channel)
+        saved = None
+        if os.path.exists(filename):
+            with open(filename) as f:
+                saved = json.load(f)
+
+        entries = None
+        if saved is not None:
+            if saved["node"] == head:
+                entries = saved["entries"]
+            elif saved["entries"]:
+                entries = self.__get_new_entries(path, channel, head, saved["entries"])
+                if entries is not None:
+                    entries += saved["entries"]
+
+        if entries is None:
+            hi = HGFileInfo(path, channel=channel, node=head, date_type=self.date_type)
+            hi.wait()
+            entries = hi.data[path]
+        else:
+            hi = HGFileInfo(
+                path,
+                channel=channel,
+                node=head,
+                date_type=self.date_type,
+                data={path: entries},
+            )
+
+        if saved is None or saved["node"] != head:
+            os.makedirs(os.path.dirname(filename), exist_ok=True)
+            with open(filename + ".tmp", "w") as f:
+                json.dump({"path": path, "node": head, "entries": entries}, f)
+            os.replace(filename + ".tmp", filename)
+
+        return hi
+
+    def __get_new_entries(self, path, channel, head, entries):
+        """Get the entries of a file log which are more recent than the known ones
+
+        Args:
+            path (str): the path
+            channel (str): channel version of firefox
+            head (str): the head of the channel
+            entries (List[dict]): the known entries
+
+        Returns:
+            List[dict]: the new entries or None if the known ones aren't in the log
+        """
+        last = entries[0]["node"]
+        new_entries = []
+        node = head
+        while True:
+            data = {}
+            hgmozilla.FileInfo(
+                channel,
+                {"node": node, "file": path, "revcount": HGFileInfoCache.INCREMENT + 1},
+                hgmozilla.FileInfo.default_handler,
+                data,
+            ).wait()
+            page = data.get("entries", [])
+            for i, entry in enumerate(page[: HGFileInfoCache.INCREMENT]):
+                if entry["node"] == last:
+                    return new_entries + page[:i]
+            if len(page) <= HGFileInfoCache.INCREMENT:
+                return None
+            new_entries += page[:-1]
+            node = page[-1]["node"]
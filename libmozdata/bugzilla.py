@@ -2,15 +2,16 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import base64
 import functools
 import re
+import threading
+from datetime import datetime, timedelta, timezone
 
 import requests
 import six
 from requests import HTTPError
 
-import libmozdata.versions
-
 from . import config, utils
 from .connection import Connection, Query
 from .handler import Handler
@@ -34,6 +35,12 @@ class Bugzilla(BugzillaBase):
     API_URL = BugzillaBase.URL + "/rest/bug"
     ATTACHMENT_API_URL = API_URL + "/attachment"
     BUGZILLA_CHUNK_SIZE = 100
+    ATTACHMENT_DATA_CHUNK_SIZE = 64 * 1024
+    SEARCH_WINDOW_MAX_COUNT = 5000
+    SEARCH_WINDOW_FIELDS = {
+        "creation_time": "creation_ts",
+        "last_change_time": "delta_ts",
+    }
 
     def __init__(
         self,
@@ -441,6 +448,8 @@ class Bugzilla(BugzillaBase):
     @staticmethod
     def get_status_flags(base_versions=None):
         if not base_versions:
+            import libmozdata.versions
+
             base_versions = libmozdata.versions.get(base=True)
 
         status_flags = {}
@@ -504,6 +513,313 @@ class Bugzilla(BugzillaBase):
 
         return data
 
+    @staticmethod
+    def __get_attachment_response(bz, attachmentid, **kwargs):
+        """Start the retrieval of an attachment content, without reading it"""
+        return bz.session.get(
+            Bugzilla.ATTACHMENT_API_URL + "/" + str(attachmentid),
+            params={"include_fields": "data"},
+            headers=bz.get_header(),
+            verify=True,
+            timeout=bz.TIMEOUT,
+            stream=True,
+            **kwargs,
+        )
+
+    @staticmethod
+    def __read_attachment_data(bz, res, chunk_size):
+        """Decode on the fly the base64 payload of an attachment response"""
+        if res.status_code != 200:
+            res.close()
+            if bz.RAISE_ERROR:
+                res.raise_for_status()
+            return
+
+        data_pattern = re.compile(rb'"data"\s*:\s*"')
+        buf = b""
+        in_data = False
+        try:
+            for chunk in res.iter_content(chunk_size=chunk_size):
+                buf += chunk
+                if not in_data:
+                    m = data_pattern.search(buf)
+                    if m is None:
+                        # keep enough bytes to match a split key
+                        buf = buf[-16:]
+                        continue
+                    buf = buf[m.end() :]
+                    in_data = True
+
+                end = buf.find(b'"')
+                if end != -1:
+                    buf = buf[:end]
+                elif buf.endswith(b"\\"):
+                    # an escape sequence is split between two chunks
+                    continue
+
+                # json may escape "/" and contain escaped newlines
+                buf = buf.replace(b"\\n", b"").replace(b"\\", b"")
+                n = len(buf) - len(buf) % 4
+                if n:
+                    yield base64.b64decode(buf[:n])
+                    buf = buf[n:]
+
+                if end != -1:
+                    return
+        finally:
+            res.close()
+
+    @staticmethod
+    def __collect_attachment_data(chunks, fileobj, max_size):
+        """Join or write the decoded chunks of an attachment"""
+        data = []
+        size = 0
+        for chunk in chunks:
+            if max_size is not None:
+                chunk = chunk[: max_size - size]
+            size += len(chunk)
+            if fileobj is None:
+                data.append(chunk)
+            else:
+                fileobj.write(chunk)
+            if max_size is not None and size >= max_size:
+                chunks.close()
+                break
+
+        return size if fileobj is not None else b"".join(data)
+
+    @staticmethod
+    def iter_attachment_data(attachmentid, chunk_size=None):
+        """Stream the decoded content of an attachment
+
+        The base64 payload is decoded on the fly from the json response,
+        so the whole attachment is never held in memory.
+
+        Args:
+            attachmentid (int or str): the attachment id
+            chunk_size (Optional[int]): the size of the chunks to read
+
+        Yields:
+            bytes: a chunk of the decoded content
+        """
+        if chunk_size is None:
+            chunk_size = Bugzilla.ATTACHMENT_DATA_CHUNK_SIZE
+
+        bz = Bugzilla(queries=[])
+        res = Bugzilla.__get_attachment_response(bz, attachmentid).result()
+        yield from Bugzilla.__read_attachment_data(bz, res, chunk_size)
+
+    @staticmethod
+    def get_attachment_data(attachmentid, fileobj=None, max_size=None):
+        """Get the decoded content of an attachment
+
+        Args:
+            attachmentid (int or str): the attachment id
+            fileobj (Optional): a binary file object where to write the content
+            max_size (Optional[int]): stop once max_size bytes have been read
+
+        Returns:
+            bytes or int: the content or the number of bytes written in fileobj
+        """
+        return Bugzilla.__collect_attachment_data(
+            Bugzilla.iter_attachment_data(attachmentid), fileobj, max_size
+        )
+
+    @staticmethod
+    def get_attachments_data(attachmentids, max_size=None):
+        """Get concurrently the decoded content of some attachments
+
+        The attachments are retrieved with a single connection and each one
+        is decoded in the thread which retrieved it.
+
+        Args:
+            attachmentids (List[int or str]): the attachment ids
+            max_size (Optional[int]): read at most max_size bytes of each attachment
+
+        Returns:
+            dict: the content for each attachment id
+        """
+        data = {}
+        if not attachmentids:
+            return data
+
+        bz = Bugzilla(queries=[])
+
+        def get_hook(attachmentid):
+            def hook(res, *args, **kwargs):
+                chunks = Bugzilla.__read_attachment_data(
+                    bz, res, Bugzilla.ATTACHMENT_DATA_CHUNK_SIZE
+                )
+                data[attachmentid] = Bugzilla.__collect_attachment_data(
+                    chunks, None, max_size
+                )
+
+            return hook
+
+        results = [
+            Bugzilla.__get_attachment_response(
+                bz, attachmentid, hooks={"response": get_hook(attachmentid)}
+            )
+            for attachmentid in attachmentids
+        ]
+        for result in results:
+            result.result()
+
+        return data
+
+    @staticmethod
+    def __get_window_query(query, field, start, end):
+        """Restrict a search query to the bugs having field in [start, end[
+
+        Args:
+            query (dict): the search query
+            field (str): the time field (creation_time or last_change_time)
+            start (datetime): the start of the window
+            end (datetime): the end of the window
+
+        Returns:
+            dict: the restricted search query
+        """
+        params = query.copy()
+        indices = [int(k[1:]) for k in params if re.match(r"^[fjnov][0-9]+$", k)]
+        n = max(indices, default=0) + 1
+        field = Bugzilla.SEARCH_WINDOW_FIELDS[field]
+        params["f%d" % n] = field
+        params["o%d" % n] = "greaterthaneq"
+        params["v%d" % n] = start.strftime("%Y-%m-%dT%H:%M:%SZ")
+        params["f%d" % (n + 1)] = field
+        params["o%d" % (n + 1)] = "lessthan"
+        params["v%d" % (n + 1)] = end.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        return params
+
+    @staticmethod
+    def get_search_windows(
+        query,
+        start,
+        end=None,
+        field="creation_time",
+        max_count=None,
+        min_window=timedelta(hours=1),
+    ):
+        """Split a search query in time windows each containing at most max_count bugs
+
+        The windows are counted concurrently and the ones containing too many
+        bugs are recursively split in two halves.
+
+        Args:
+            query (dict): the search query
+            start (str or datetime): the start date
+            end (Optional[str or datetime]): the end date, by default now
+            field (Optional[str]): creation_time or last_change_time
+            max_count (Optional[int]): the maximal number of bugs in a window
+            min_window (Optional[timedelta]): windows smaller than this are not split
+
+        Returns:
+            List[dict]: the search queries, one for each page of each window
+        """
+        if field not in Bugzilla.SEARCH_WINDOW_FIELDS:
+            raise Exception("Unexpected time field: " + field)
+        if query.get("j_top", "AND") != "AND":
+            raise Exception("Only queries with j_top=AND can be split")
+
+        if max_count is None:
+            max_count = Bugzilla.SEARCH_WINDOW_MAX_COUNT
+        start = utils.get_date_ymd(start)
+        end = utils.get_date_ymd(end) if end else datetime.now(timezone.utc)
+
+        def handler(json, data):
+            data["count"] = json["bug_count"]
+
+        windows = []
+        to_count = [(start, end)]
+        while to_count:
+            counts = [{"window": window, "count": 0} for window in to_count]
+            queries = []
+            for count in counts:
+                params = Bugzilla.__get_window_query(query, field, *count["window"])
+                params["count_only"] = 1
+                queries.append(Query(Bugzilla.API_URL, params, handler, count))
+            Bugzilla(queries=queries).wait()
+
+            to_count = []
+            for count in counts:
+                w_start, w_end = count["window"]
+                if count["count"] > max_count and w_end - w_start > min_window:
+                    middle = w_start + (w_end - w_start) / 2
+                    to_count += [(w_start, middle), (middle, w_end)]
+                elif count["count"]:
+                    windows.append(count)
+
+        pages = []
+        for count in sorted(windows, key=lambda c: c["window"]):
+            params = Bugzilla.__get_window_query(query, field, *count["window"])
+            params["limit"] = Bugzilla.BUGZILLA_CHUNK_SIZE
+            params["order"] = "bug_id"
+            for i in range(0, count["count"], Bugzilla.BUGZILLA_CHUNK_SIZE):
+                params = params.copy()
+                params["offset"] = i
+                pages.append(params)
+
+        return pages
+
+    @staticmethod
+    def search_by_time_windows(
+        query,
+        start,
+        end=None,
+        field="creation_time",
+        include_fields="_default",
+        bughandler=None,
+        bugdata=None,
+        max_count=None,
+        **kwargs,
+    ):
+        """Make a search query split in time windows (see get_search_windows)
+
+        All the windows are retrieved concurrently and each bug is passed
+        only once to the handler, even if it moved from a window to another
+        one (e.g. when field is last_change_time) during the retrieval.
+
+        Args:
+            query (dict): the search query
+            start (str or datetime): the start date
+            end (Optional[str or datetime]): the end date, by default now
+            field (Optional[str]): creation_time or last_change_time
+            include_fields (List[str]): list of include fields
+            bughandler (Optional[function]): the handler to use with each retrieved bug
+            bugdata (Optional): the data to use with the bug handler
+            max_count (Optional[int]): the maximal number of bugs in a window
+
+        Returns:
+            Bugzilla: the connection, already waited
+        """
+        pages = Bugzilla.get_search_windows(
+            query, start, end=end, field=field, max_count=max_count
+        )
+        if isinstance(include_fields, list) and "id" not in include_fields:
+            include_fields = include_fields + ["id"]
+        # The pages are sent as they are, so they must contain the fields to get
+        for page in pages:
+            page["include_fields"] = include_fields
+        bughandler = Handler.get(bughandler, bugdata)
+        seen = set()
+        lock = threading.Lock()
+
+        def __handler(bug):
+            with lock:
+                if bug["id"] in seen:
+                    return
+                seen.add(bug["id"])
+            bughandler.handle(bug)
+
+        bz = Bugzilla(
+            pages, include_fields=include_fields, bughandler=__handler, **kwargs
+        )
+        bz.wait()
+
+        return bz
+
     def __is_bugid(self):
         """Check if the first bugid is a bug id or a search query
 
@@ -16,6 +16,7 @@ class CrashClouseau(Connection):
 
 class Reports(CrashClouseau):
     API_URL = CrashClouseau.API_URL + "/reports"
+    BATCH_SIZE = 20
 
     def __init__(
         self, params=None, handler=None, handlerdata=None, queries=None, **kwargs
@@ -38,39 +39,43 @@ class Reports(CrashClouseau):
     @staticmethod
     def _default_handler(res, data):
         for report in res:
-            signature = report["signature"]
-            if signature not in data:
-                data[signature] = [report]
-            else:
-                data[signature].append(report)
+            data.setdefault(report["signature"], []).append(report)
 
     @classmethod
-    def get_by_signatures(cls, signatures, product=None, channel=None):
+    def get_by_signatures(
+        cls, signatures, product=None, channel=None, max_workers=None
+    ):
         """Get reports by signatures
 
+        The batches of signatures are retrieved through a single connection, so
+        at most max_workers of them are pending at the same time, and the reports
+        are added to the result as soon as a batch is retrieved.
+
         Args:
             signatures: signatures to get their reports.
             product: filter out reports that are not from this product.
             channel: filter out reports that are not from this release channel.
+            max_workers (Optional[int]): the maximal number of concurrent requests.
 
         Returns:
             dict: the reports by signatures
         """
         data = {}
-        requests = [
-            cls(
-                params={
+        queries = [
+            Query(
+                cls.API_URL,
+                {
                     "signatures": signatures_batch,
                     "product": product,
                     "channel": channel,
                 },
-                handler=cls._default_handler,
-                handlerdata=data,
+                cls._default_handler,
+                data,
             )
-            for signatures_batch in batched(signatures, 20)
+            for signatures_batch in batched(signatures, cls.BATCH_SIZE)
         ]
-
-        for request in requests:
-            request.wait()
+        if queries:
+            kwargs = {"max_workers": max_workers} if max_workers else {}
+            cls(queries=queries, **kwargs).wait()
 
         return data
@@ -0,0 +1,230 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import threading
+import zlib
+from array import array
+from bisect import bisect_right
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class CommentCorpus(object):
+    """Compact store for the comments of a lot of bugs
+
+    The comment texts are compressed in blocks of about BLOCK_SIZE bytes,
+    the authors and the creation times are interned and the other data are
+    stored in arrays of integers.
+    A CommentCorpus can be directly used as a commenthandler:
+        corpus = CommentCorpus()
+        Bugzilla(bugids, commenthandler=corpus).get_data().wait()
+    """
+
+    BLOCK_SIZE = 1 << 16
+
+    def __init__(self, block_size=None, compression=None):
+        """Constructor
+
+        Args:
+            block_size (Optional[int]): the uncompressed size of the blocks
+            compression (Optional[str]): 'zlib' or 'zstd', by default zstd when available
+        """
+        if compression is None:
+            compression = "zstd" if zstandard is not None else "zlib"
+        if compression == "zstd":
+            if zstandard is None:
+                raise ImportError("zstandard is required for zstd compression")
+            self.__compress = zstandard.ZstdCompressor().compress
+            self.__decompress = zstandard.ZstdDecompressor().decompress
+        elif compression == "zlib":
+            self.__compress = zlib.compress
+            self.__decompress = zlib.decompress
+        else:
+            raise Exception("Unexpected compression: " + compression)
+
+        self.compression = compression
+        self.block_size = block_size or CommentCorpus.BLOCK_SIZE
+        self.__lock = threading.Lock()
+        self.__strings = {}
+        self.__string_list = []
+        self.__bugs = {}
+        self.__ids = array("q")
+        self.__comment_bugs = array("l")
+        self.__comment_indices = array("l")
+        self.__authors = array("l")
+        self.__times = array("l")
+        self.__blocks = []
+        self.__block_starts = []
+        self.__block_lengths = []
+        self.__pending = []
+        self.__pending_size = 0
+        self.__last_block = (None, None)
+
+    def __call__(self, bug, bugid):
+        """Handler for Bugzilla comments
+
+        Args:
+            bug (dict): the json for a bug, containing its comments
+            bugid (str): the bug id
+        """
+        for comment in bug["comments"]:
+            self.add(bugid, comment)
+
+    def __len__(self):
+        return len(self.__ids)
+
+    def __contains__(self, bugid):
+        return str(bugid) in self.__bugs
+
+    def __intern(self, s):
+        n = self.__strings.get(s)
+        if n is None:
+            n = self.__strings[s] = len(self.__string_list)
+            self.__string_list.append(s)
+        return n
+
+    def add(self, bugid, comment):
+        """Add a comment at the end of the comments of a bug
+
+        Args:
+            bugid (str): the bug id
+            comment (dict): the comment as returned by Bugzilla
+        """
+        text = comment.get("text", "").encode("utf-8")
+        author = comment.get("author", comment.get("creator", ""))
+        time = comment.get("creation_time", comment.get("time", ""))
+        with self.__lock:
+            n = len(self.__ids)
+            bugid = str(bugid)
+            if bugid not in self.__bugs:
+                self.__bugs[bugid] = array("q")
+            self.__comment_bugs.append(self.__intern(bugid))
+            self.__comment_indices.append(len(self.__bugs[bugid]))
+            self.__bugs[bugid].append(n)
+            self.__ids.append(comment.get("id", -1))
+            self.__authors.append(self.__intern(author))
+            self.__times.append(self.__intern(time))
+            self.__pending.append(text)
+            self.__pending_size += len(text)
+            if self.__pending_size >= self.block_size:
+                self.__flush()
+
+    def flush(self):
+        """Compress the pending comments"""
+        with self.__lock:
+            self.__flush()
+
+    def __flush(self):
+        if not self.__pending:
+            return
+        self.__block_starts.append(len(self.__ids) - len(self.__pending))
+        self.__block_lengths.append(array("l", map(len, self.__pending)))
+        self.__blocks.append(self.__compress(b"".join(self.__pending)))
+        self.__pending = []
+        self.__pending_size = 0
+
+    def __get_block(self, i):
+        index, texts = self.__last_block
+        if index != i:
+            raw = self.__decompress(self.__blocks[i])
+            texts = []
+            pos = 0
+            for length in self.__block_lengths[i]:
+                texts.append(raw[pos : pos + length].decode("utf-8"))
+                pos += length
+            self.__last_block = (i, texts)
+        return texts
+
+    def __get_text(self, n):
+        i = bisect_right(self.__block_starts, n) - 1
+        if i == -1 or n - self.__block_starts[i] >= len(self.__block_lengths[i]):
+            start = len(self.__ids) - len(self.__pending)
+            return self.__pending[n - start].decode("utf-8")
+        return self.__get_block(i)[n - self.__block_starts[i]]
+
+    def __make_comment(self, n, text):
+        return {
+            "id": self.__ids[n],
+            "author": self.__string_list[self.__authors[n]],
+            "creation_time": self.__string_list[self.__times[n]],
+            "text": text,
+        }
+
+    def bugs(self):
+        """Get the bug ids
+
+        Returns:
+            List[str]: the bug ids
+        """
+        return list(self.__bugs.keys())
+
+    def count(self, bugid):
+        """Get the number of comments for a bug
+
+        Args:
+            bugid (str): the bug id
+
+        Returns:
+            int: the number of comments
+        """
+        comments = self.__bugs.get(str(bugid))
+        return len(comments) if comments is not None else 0
+
+    def get(self, bugid, index):
+        """Get a comment
+
+        Args:
+            bugid (str): the bug id
+            index (int): the index of the comment in the bug (0 is the description)
+
+        Returns:
+            dict: the comment
+        """
+        with self.__lock:
+            n = self.__bugs[str(bugid)][index]
+            return self.__make_comment(n, self.__get_text(n))
+
+    def get_comments(self, bugid):
+        """Get all the comments of a bug
+
+        Args:
+            bugid (str): the bug id
+
+        Returns:
+            List[dict]: the comments
+        """
+        return [self.get(bugid, i) for i in range(self.count(bugid))]
+
+    def iter_comments(self):
+        """Iterate over all the comments, decompressing one block at a time
+
+        Yields:
+            (str, int, dict): the bug id, the index of the comment in the bug and the comment
+        """
+        with self.__lock:
+            self.__flush()
+            blocks = list(zip(self.__block_starts, self.__block_lengths))
+
+        for i, (start, lengths) in enumerate(blocks):
+            raw = self.__decompress(self.__blocks[i])
+            pos = 0
+            for n in range(start, start + len(lengths)):
+                text = raw[pos : pos + lengths[n - start]].decode("utf-8")
+                pos += lengths[n - start]
+                yield (
+                    self.__string_list[self.__comment_bugs[n]],
+                    self.__comment_indices[n],
+                    self.__make_comment(n, text),
+                )
+
+    def get_compressed_size(self):
+        """Get the size of the compressed texts
+
+        Returns:
+            int: the size in bytes
+        """
+        return sum(len(block) for block in self.__blocks) + self.__pending_size
@@ -71,13 +71,6 @@ class Connection(object):
             queries (Optional[Query]): the queries
         """
 
-        self.session = FuturesSession(max_workers=self.MAX_WORKERS)
-        retries = Retry(
-            total=Connection.MAX_RETRIES,
-            backoff_factor=1,
-            status_forcelist=Connection.STATUS_FORCELIST,
-        )
-        self.session.mount(base_url, HTTPAdapter(max_retries=retries))
         self.results = []
         self.queries = queries
 
@@ -100,6 +93,15 @@ class Connection(object):
         if not self.USER_AGENT:
             self.USER_AGENT = config.get("User-Agent", "name", required=True)
 
+        # The session is created once the options are set to use max_workers
+        self.session = FuturesSession(max_workers=self.MAX_WORKERS)
+        retries = Retry(
+            total=Connection.MAX_RETRIES,
+            backoff_factor=1,
+            status_forcelist=Connection.STATUS_FORCELIST,
+        )
+        self.session.mount(base_url, HTTPAdapter(max_retries=retries))
+
         self.exec_queries()
 
     def __get_cb(self, query):
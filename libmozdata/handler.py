@@ -9,7 +9,7 @@ class Handler(object):
         self.data = data
 
     def handle(self, *args):
-        if self.handler:
+        if self.handler is not None:
             if self.data is not None:
                 args += (self.data,)
                 self.handler(*args)
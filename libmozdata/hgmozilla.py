@@ -2,17 +2,496 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import bisect
+import copy
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+
 import six
 
-from . import config
+from . import config, utils
 from .connection import Connection, Query
 
 
+class LocalRepository(object):
+    """A local clone of a mercurial repository (e.g. mozilla-unified)
+
+    The queries are served through a persistent hglib command server instead
+    of going over HTTP to hg.mozilla.org and the results have the same shape as
+    the json returned by hgweb.
+    Since a local clone doesn't know the pushes, the pushdate and pushid are
+    not set, so the data must be filtered with the creation date.
+    """
+
+    __repositories = {}
+    __repositories_lock = threading.Lock()
+    NODE_ID_PATTERN = re.compile(r"^# Node ID ([0-9a-f]+)$", re.MULTILINE)
+
+    def __init__(self, path):
+        """Constructor
+
+        Args:
+            path (str): the path to the local clone
+        """
+        import hglib
+
+        self.path = path
+        self.client = hglib.open(path)
+        self.lock = threading.Lock()
+        self.error = hglib.error.CommandError
+        self.cmdbuilder = hglib.util.cmdbuilder
+
+    @staticmethod
+    def get(path):
+        """Get the repository for a path, the command server is started once
+
+        Args:
+            path (str): the path to the local clone
+
+        Returns:
+            LocalRepository: the repository
+        """
+        with LocalRepository.__repositories_lock:
+            repo = LocalRepository.__repositories.get(path)
+            if repo is None:
+                repo = LocalRepository.__repositories[path] = LocalRepository(path)
+            return repo
+
+    def close(self):
+        """Stop the command server"""
+        with LocalRepository.__repositories_lock:
+            LocalRepository.__repositories.pop(self.path, None)
+        with self.lock:
+            self.client.close()
+
+    def __run(self, name, *args, **kwargs):
+        cmd = self.cmdbuilder(
+            name.encode("ascii"), *[a.encode("utf-8") for a in args], **kwargs
+        )
+        with self.lock:
+            return self.client.rawcommand(cmd)
+
+    def __json(self, name, *args, **kwargs):
+        return json.loads(self.__run(name, *args, T="json", **kwargs).decode("utf-8"))
+
+    def resolve(self, node, bookmark):
+        """Get the revset for a node
+
+        Args:
+            node (str): the node, 'default' and 'tip' are the head of the channel
+            bookmark (str): the bookmark of the channel in a unified repository
+
+        Returns:
+            str: the revset
+        """
+        if node not in ["default", "tip"]:
+            return node
+        try:
+            self.__run("log", r="bookmark(%s)" % json.dumps(bookmark), T="{node}")
+            return "bookmark(%s)" % json.dumps(bookmark)
+        except self.error:
+            return node
+
+    def get_revisions(self, nodes, bookmark):
+        """Get several revisions in a single log command
+
+        Args:
+            nodes (List[str]): the nodes
+            bookmark (str): the bookmark of the channel
+
+        Returns:
+            dict: the json for each node
+        """
+        revsets = {node: self.resolve(node, bookmark) for node in set(nodes)}
+        revset = " + ".join("present(%s)" % r for r in set(revsets.values()))
+        entries = self.__json("log", r=revset)
+
+        res = {}
+        for node, r in revsets.items():
+            if r != node:
+                # a symbolic name, there's only one revision in the revset
+                try:
+                    res[node] = self.__json("log", r=r)[0]
+                except self.error:
+                    pass
+                continue
+            for entry in entries:
+                if entry["node"].startswith(node):
+                    res[node] = entry
+                    break
+        return res
+
+    @staticmethod
+    def __split_patches(out):
+        """Split the output of an export command
+
+        Args:
+            out (bytes): the output
+
+        Returns:
+            dict: the patch for each full node
+        """
+        patches = {}
+        for patch in out.decode("utf-8").split("# HG changeset patch\n")[1:]:
+            patch = "# HG changeset patch\n" + patch
+            m = LocalRepository.NODE_ID_PATTERN.search(patch)
+            if m:
+                patches[m.group(1)] = patch
+        return patches
+
+    def get_raw_revisions(self, nodes, bookmark):
+        """Get several raw revisions in a single export command
+
+        The nodes which can't be found are missing in the result.
+
+        Args:
+            nodes (List[str]): the nodes
+            bookmark (str): the bookmark of the channel
+
+        Returns:
+            dict: the patch for each node
+        """
+        revsets = {node: self.resolve(node, bookmark) for node in set(nodes)}
+        hashes = {r for node, r in revsets.items() if r == node}
+        patches = {}
+        if hashes:
+            try:
+                out = self.__run(
+                    "export", r=["present(%s)" % r for r in hashes], git=True
+                )
+                patches = self.__split_patches(out)
+            except self.error:
+                # e.g. an ambiguous short hash, so export the nodes one by one
+                for r in hashes:
+                    try:
+                        patches.update(
+                            self.__split_patches(self.__run("export", r=r, git=True))
+                        )
+                    except self.error:
+                        pass
+
+        res = {}
+        for node, r in revsets.items():
+            if r != node:
+                # a symbolic name, there's only one revision in the revset
+                try:
+                    patch = self.__split_patches(self.__run("export", r=r, git=True))
+                except self.error:
+                    continue
+                res.update({node: p for p in patch.values()})
+                continue
+            for full_node, patch in patches.items():
+                if full_node.startswith(node):
+                    res[node] = patch
+                    break
+        return res
+
+    def get_filelog(self, path, node, bookmark, revcount=None):
+        """Get the log of a file
+
+        Args:
+            path (str): the file path
+            node (str): the node where to start
+            bookmark (str): the bookmark of the channel
+            revcount (Optional[int]): the maximal number of entries
+
+        Returns:
+            dict: the json of the file log
+        """
+        revset = "reverse(::%s)" % self.resolve(node, bookmark)
+        entries = self.__json("log", "path:" + path, r=revset, l=revcount)
+        return {"node": node, "path": path, "entries": entries}
+
+    def get_annotations(self, paths, node, bookmark):
+        """Get the annotations for several files in a single annotate command
+
+        Args:
+            paths (List[str]): the file paths
+            node (str): the node
+            bookmark (str): the bookmark of the channel
+
+        Returns:
+            dict: the json of the annotation for each path
+        """
+        r = self.resolve(node, bookmark)
+        try:
+            files = self.__json(
+                "annotate", *["path:" + p for p in paths], r=r, u=True, n=True, c=True
+            )
+        except self.error:
+            # e.g. a file which doesn't exist, so annotate the files one by one
+            files = []
+            for p in paths:
+                try:
+                    files += self.__json(
+                        "annotate", "path:" + p, r=r, u=True, n=True, c=True
+                    )
+                except self.error:
+                    pass
+
+        res = {}
+        for f in files:
+            annotate = []
+            for i, line in enumerate(f["lines"]):
+                line = dict(line)
+                line["abspath"] = f["path"]
+                line["lineno"] = line["targetline"] = i + 1
+                annotate.append(line)
+            res[f["path"]] = {"node": node, "path": f["path"], "annotate": annotate}
+        return res
+
+    def exec_queries(self, queries):
+        """Exec some queries and call their handlers
+
+        The queries for revisions and annotations are batched.
+
+        Args:
+            queries (List[Query]): the queries to exec
+        """
+        batches = {}
+        for query in queries:
+            base, endpoint = query.url.rsplit("/", 1)
+            bookmark = base.rsplit("/", 1)[-1]
+            if bookmark.startswith("mozilla-"):
+                bookmark = bookmark[len("mozilla-") :]
+            params_list = query.params
+            if not isinstance(params_list, list):
+                params_list = [params_list]
+            for params in params_list:
+                params = params or {}
+                node = params.get("node", "default")
+                if endpoint == "json-log":
+                    rev = params.get("rev", "::" + self.resolve(node, bookmark))
+                    entries = self.__json(
+                        "log", r="reverse(%s)" % rev, l=params.get("revcount")
+                    )
+                    self.__handle(
+                        query, {"node": node, "query": rev, "entries": entries}
+                    )
+                elif endpoint == "json-filelog":
+                    self.__handle(
+                        query,
+                        self.get_filelog(
+                            params["file"], node, bookmark, params.get("revcount")
+                        ),
+                    )
+                else:
+                    key = (
+                        endpoint,
+                        bookmark,
+                        node if endpoint == "json-annotate" else "",
+                    )
+                    batches.setdefault(key, []).append((query, params))
+
+        for (endpoint, bookmark, node), batch in batches.items():
+            if endpoint == "json-rev":
+                revs = self.get_revisions([p["node"] for _, p in batch], bookmark)
+                for query, params in batch:
+                    self.__handle(query, revs.get(params["node"]))
+            elif endpoint == "raw-rev":
+                revs = self.get_raw_revisions([p["node"] for _, p in batch], bookmark)
+                for query, params in batch:
+                    self.__handle(query, revs.get(params["node"]))
+            elif endpoint == "json-annotate":
+                res = self.get_annotations(
+                    [p["file"] for _, p in batch], node, bookmark
+                )
+                for query, params in batch:
+                    self.__handle(query, res.get(params["file"]))
+            else:
+                raise Exception(
+                    "Unsupported endpoint for a local repository: " + endpoint
+                )
+
+    def __handle(self, query, response):
+        if response is None:
+            logging.getLogger(__name__).warning(
+                "No data in %s for the query %s" % (self.path, query)
+            )
+        elif query.handlerdata is not None:
+            query.handler(response, query.handlerdata)
+        else:
+            query.handler(response)
+
+
+class RevisionCache(object):
+    """Cache for the revisions
+
+    The revisions are kept (up to MAX_SIZE entries) under their full hash:
+     - the raw revisions only depend on the changeset, which never changes, so
+       they're kept until they're evicted and shared by all the channels;
+     - the json revisions contain the push data, which change over time (e.g.
+       backedoutby is set once the changeset is backed out), so they're only kept
+       for REVISION_TTL seconds and shared by the channels using the same repository.
+    The short hashes are resolved with the full hashes already in the cache and
+    the symbolic nodes (e.g. 'default' or 'tip') are only resolved for TTL seconds
+    since they move.
+    """
+
+    MAX_SIZE = 4096
+    TTL = 60
+    REVISION_TTL = 600
+    MIN_SHORT_LENGTH = 12
+
+    def __init__(self, max_size=None, ttl=None, revision_ttl=None):
+        """Constructor
+
+        Args:
+            max_size (Optional[int]): the maximal number of cached revisions
+            ttl (Optional[int]): the lifetime in seconds of a symbolic node
+            revision_ttl (Optional[int]): the lifetime in seconds of a json revision
+        """
+        self.max_size = max_size or RevisionCache.MAX_SIZE
+        self.ttl = RevisionCache.TTL if ttl is None else ttl
+        self.revision_ttl = (
+            RevisionCache.REVISION_TTL if revision_ttl is None else revision_ttl
+        )
+        self.__lock = threading.Lock()
+        self.__node_pattern = re.compile(r"^[0-9a-f]+$")
+        self.__raw_node_pattern = re.compile(
+            r"^# Node ID ([0-9a-f]{40})$", re.MULTILINE
+        )
+        self.clear()
+
+    def clear(self):
+        """Remove all the cached revisions"""
+        with self.__lock:
+            self.__revisions = OrderedDict()
+            self.__refs = {}
+            self.__nodes = []
+            self.__symbols = {}
+
+    @staticmethod
+    def __get_repo(channel):
+        # the local repository serves the same urls
+        return Mercurial.LOCAL_REPO + Mercurial.get_repo_url(channel)
+
+    def __resolve(self, repo, node):
+        if len(node) == 40 and self.__node_pattern.match(node):
+            return node
+
+        if self.__node_pattern.match(node):
+            if len(node) < RevisionCache.MIN_SHORT_LENGTH:
+                return None
+            i = bisect.bisect_left(self.__nodes, node)
+            nodes = self.__nodes[i : i + 2]
+            if nodes and nodes[0].startswith(node):
+                if len(nodes) == 1 or not nodes[1].startswith(node):
+                    return nodes[0]
+            return None
+
+        full_node, expiry = self.__symbols.get((repo, node), (None, 0))
+        if expiry < time.monotonic():
+            return None
+        return full_node
+
+    def __get(self, scope, repo, node, ttl=None):
+        with self.__lock:
+            full_node = self.__resolve(repo, node)
+            if full_node is None:
+                return None
+            value, timestamp = self.__revisions.get((scope, full_node), (None, 0))
+            if value is None or (
+                ttl is not None and timestamp + ttl < time.monotonic()
+            ):
+                return None
+            self.__revisions.move_to_end((scope, full_node))
+            return value
+
+    def __put(self, scope, repo, node, full_node, value):
+        with self.__lock:
+            value = (value, time.monotonic())
+            if not self.__node_pattern.match(node):
+                self.__symbols[(repo, node)] = (full_node, time.monotonic() + self.ttl)
+
+            key = (scope, full_node)
+            if key in self.__revisions:
+                self.__revisions.move_to_end(key)
+                self.__revisions[key] = value
+                return
+
+            self.__revisions[key] = value
+            if full_node not in self.__refs:
+                self.__refs[full_node] = 0
+                bisect.insort(self.__nodes, full_node)
+            self.__refs[full_node] += 1
+
+            while len(self.__revisions) > self.max_size:
+                (_, old_node), _ = self.__revisions.popitem(last=False)
+                self.__refs[old_node] -= 1
+                if self.__refs[old_node] == 0:
+                    del self.__refs[old_node]
+                    del self.__nodes[bisect.bisect_left(self.__nodes, old_node)]
+
+    def get_revision(self, channel, node):
+        """Get a cached json revision
+
+        Args:
+            channel (str): channel version of firefox
+            node (str): the node
+
+        Returns:
+            dict: a copy of the revision or None if it isn't in the cache
+        """
+        repo = RevisionCache.__get_repo(channel)
+        rev = self.__get(repo, repo, node, self.revision_ttl)
+        return copy.deepcopy(rev) if rev is not None else None
+
+    def put_revision(self, channel, node, rev):
+        """Put a json revision in the cache
+
+        Args:
+            channel (str): channel version of firefox
+            node (str): the node used to get the revision
+            rev (dict): the revision
+        """
+        if rev and "node" in rev:
+            repo = RevisionCache.__get_repo(channel)
+            self.__put(repo, repo, node, rev["node"], copy.deepcopy(rev))
+
+    def get_raw_revision(self, channel, node):
+        """Get a cached raw revision
+
+        Args:
+            channel (str): channel version of firefox
+            node (str): the node
+
+        Returns:
+            str: the revision or None if it isn't in the cache
+        """
+        return self.__get(None, RevisionCache.__get_repo(channel), node)
+
+    def put_raw_revision(self, channel, node, rev):
+        """Put a raw revision in the cache
+
+        Args:
+            channel (str): channel version of firefox
+            node (str): the node used to get the revision
+            rev (str): the revision
+        """
+        m = self.__raw_node_pattern.search(rev) if rev else None
+        if m:
+            self.__put(None, RevisionCache.__get_repo(channel), node, m.group(1), rev)
+
+
 class Mercurial(Connection):
-    """Mozilla mercurial connection: http://hg.mozilla.org"""
+    """Mozilla mercurial connection: http://hg.mozilla.org
+
+    When the option LocalRepo is set in the Mercurial section of the config,
+    the queries are served by a local clone (see LocalRepository).
+    The revisions got with Revision.get_revision and RawRevision.get_revision
+    are kept in Mercurial.cache (see RevisionCache).
+    """
 
     HG_URL = config.get("Mercurial", "URL", "https://hg.mozilla.org")
+    LOCAL_REPO = config.get("Mercurial", "LocalRepo", "")
     remote = HG_URL == "https://hg.mozilla.org"
+    cache = RevisionCache()
 
     def __init__(self, queries, channel="nightly", **kwargs):
         """Constructor
@@ -24,6 +503,26 @@ class Mercurial(Connection):
         super(Mercurial, self).__init__(self.HG_URL, queries, **kwargs)
         self.channel = channel
 
+    def exec_queries(self, queries=None):
+        """Set and exec some queries
+
+        Args:
+            queries (Optional[Query]): the queries to exec
+        """
+        if not self.LOCAL_REPO:
+            return super(Mercurial, self).exec_queries(queries)
+
+        if queries:
+            self.queries = queries
+
+        if self.queries:
+            if isinstance(self.queries, Query):
+                self.queries = [self.queries]
+            repo = LocalRepository.get(self.LOCAL_REPO)
+            self.results.append(
+                self.session.executor.submit(repo.exec_queries, self.queries)
+            )
+
     @staticmethod
     def get_repo(channel):
         """Get the repo name
@@ -51,7 +550,7 @@ class Mercurial(Connection):
         Returns:
             str: the repo url
         """
-        if Mercurial.remote:
+        if Mercurial.remote or Mercurial.LOCAL_REPO:
             return Mercurial.HG_URL + "/" + Mercurial.get_repo(channel)
         else:
             return Mercurial.HG_URL
@@ -118,9 +617,42 @@ class Revision(Mercurial):
         Returns:
             dict: the revision corresponding to the node
         """
-        data = {}
-        Revision(channel, {"node": node}, Revision.default_handler, data).wait()
-        return data
+        return Revision.get_revisions([(channel, node)])[(channel, node)]
+
+    @staticmethod
+    def get_revisions(revisions):
+        """Get several revisions concurrently
+
+        Args:
+            revisions (List[tuple]): the (channel, node) of the revisions
+
+        Returns:
+            dict: the revision for each (channel, node), empty if it doesn't exist
+        """
+        res = {}
+        queries = []
+        for channel, node in revisions:
+            if (channel, node) in res:
+                continue
+            data = Mercurial.cache.get_revision(channel, node)
+            if data is None:
+                data = {}
+                queries.append(
+                    Query(
+                        Revision.get_url(channel),
+                        {"node": node},
+                        Revision.default_handler,
+                        data,
+                    )
+                )
+            res[(channel, node)] = data
+
+        if queries:
+            Revision(queries=queries).wait()
+            for channel, node in res:
+                Mercurial.cache.put_revision(channel, node, res[(channel, node)])
+
+        return res
 
 
 class RawRevision(Mercurial):
@@ -168,14 +700,46 @@ class RawRevision(Mercurial):
         Returns:
             dict: the revision corresponding to the node
         """
-        data = {}
+        return RawRevision.get_revisions([(channel, node)])[(channel, node)]
 
-        def handler(response):
-            data["res"] = response
+    @staticmethod
+    def __handler(response, data):
+        res, key = data
+        res[key] = response
 
-        RawRevision(channel, {"node": node}, handler).wait()
+    @staticmethod
+    def get_revisions(revisions):
+        """Get several revisions concurrently
 
-        return data["res"]
+        Args:
+            revisions (List[tuple]): the (channel, node) of the revisions
+
+        Returns:
+            dict: the revision for each (channel, node), None if it doesn't exist
+        """
+        res = {}
+        queries = []
+        for channel, node in revisions:
+            if (channel, node) in res:
+                continue
+            rev = Mercurial.cache.get_raw_revision(channel, node)
+            if rev is None:
+                queries.append(
+                    Query(
+                        RawRevision.get_url(channel),
+                        {"node": node},
+                        RawRevision.__handler,
+                        (res, (channel, node)),
+                    )
+                )
+            res[(channel, node)] = rev
+
+        if queries:
+            RawRevision(queries=queries).wait()
+            for channel, node in res:
+                Mercurial.cache.put_raw_revision(channel, node, res[(channel, node)])
+
+        return res
 
 
 class FileInfo(Mercurial):
@@ -356,3 +920,202 @@ class Annotate(Mercurial):
             Annotate(queries=queries).wait()
 
         return data
+
+
+class Pushlog(Mercurial):
+    """Connection to get the pushes: https://mozilla-version-control-tools.readthedocs.io/en/latest/hgmo/pushlog.html
+
+    The pushes have consecutive ids, so a range of ids is split in pages
+    which are retrieved concurrently.
+    """
+
+    PAGE_SIZE = 100
+    MAX_PAGES = 8
+
+    def __init__(
+        self,
+        channel="nightly",
+        params=None,
+        handler=None,
+        handlerdata=None,
+        queries=None,
+        **kwargs
+    ):
+        """Constructor
+
+        Args:
+            channel (Optional[str]): the channel, by default 'nightly'
+            params (Optional[dict]): the params for the query
+            handler (Optional[function]): handler to use with the result of the query
+            handlerdata (Optional): data used in second argument of the handler
+            queries (List[Query]): queries to pass to mercurial server
+        """
+        if queries:
+            super(Pushlog, self).__init__(queries, **kwargs)
+        else:
+            super(Pushlog, self).__init__(
+                Query(Pushlog.get_url(channel), params, handler, handlerdata), **kwargs
+            )
+
+    @staticmethod
+    def get_url(channel):
+        """Get the api url
+
+        Args:
+            channel (str): channel version of firefox
+
+        Returns:
+            str: the api url
+        """
+        return Mercurial.get_repo_url(channel) + "/json-pushes"
+
+    @staticmethod
+    def default_handler(json, data):
+        """Default handler
+
+        Args:
+            json (dict): json
+            data (dict): dictionary to update with data
+        """
+        data.update(json)
+
+    @staticmethod
+    def get_last_push_id(channel="nightly"):
+        """Get the id of the last push
+
+        Args:
+            channel (str): channel version of firefox
+
+        Returns:
+            int: the push id
+        """
+        data = {}
+        Pushlog(channel, {"version": 2}, Pushlog.default_handler, data).wait()
+        return data["lastpushid"]
+
+    @staticmethod
+    def __get_date(d):
+        if isinstance(d, six.string_types):
+            return d
+        return utils.as_utc(d).strftime("%Y-%m-%d %H:%M:%S +0000")
+
+    @staticmethod
+    def __page_handler(json, data):
+        pages, start = data
+        pages[start] = json["pushes"]
+
+    @staticmethod
+    def __load_checkpoint(path):
+        if path and os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+        return {}
+
+    @staticmethod
+    def __save_checkpoint(path, url, push_id):
+        checkpoints = Pushlog.__load_checkpoint(path)
+        checkpoints[url] = push_id
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(checkpoints, f)
+        os.replace(tmp, path)
+
+    @staticmethod
+    def iter_pushes(
+        channel="nightly",
+        start_id=0,
+        end_id=None,
+        startdate=None,
+        enddate=None,
+        full=True,
+        page_size=None,
+        checkpoint=None,
+    ):
+        """Iterate over the pushes in a range of ids or dates
+
+        The pages are retrieved concurrently and the pushes are yielded in order
+        as soon as their page is there.
+
+        Args:
+            channel (str): channel version of firefox
+            start_id (Optional[int]): the pushes after this id are retrieved
+            end_id (Optional[int]): the id of the last push, by default the last one
+            startdate (Optional[datetime|str]): the pushes from this date are retrieved
+            enddate (Optional[datetime|str]): the pushes until this date are retrieved
+            full (Optional[bool]): if True the changesets are dicts with the description,
+                the author, the files, ... else they're just the nodes
+            page_size (Optional[int]): the number of pushes in a page
+            checkpoint (Optional[str]): a json file where the id of the last push of
+                each fully consumed page is saved, the iteration resumes after it
+
+        Yields:
+            (int, dict): the push id and the push
+        """
+        url = Pushlog.get_url(channel)
+        page_size = page_size or Pushlog.PAGE_SIZE
+        if checkpoint:
+            start_id = max(start_id, Pushlog.__load_checkpoint(checkpoint).get(url, 0))
+
+        ids = None
+        if startdate is not None or enddate is not None:
+            params = {"version": 2}
+            if startdate is not None:
+                params["startdate"] = Pushlog.__get_date(startdate)
+            if enddate is not None:
+                params["enddate"] = Pushlog.__get_date(enddate)
+            data = {}
+            Pushlog(channel, params, Pushlog.default_handler, data).wait()
+            ids = set(int(i) for i in data["pushes"] if int(i) > start_id)
+            if end_id is not None:
+                ids = set(i for i in ids if i <= end_id)
+            if not ids:
+                return
+            start_id = min(ids) - 1
+            end_id = max(ids)
+        elif end_id is None:
+            end_id = Pushlog.get_last_push_id(channel)
+
+        pages = {}
+        starts = deque(range(start_id, end_id, page_size))
+        futures = deque()
+        connection = None
+
+        while starts or futures:
+            while starts and len(futures) < Pushlog.MAX_PAGES:
+                start = starts.popleft()
+                end = min(start + page_size, end_id)
+                params = {"version": 2, "startID": start, "endID": end}
+                if full:
+                    params["full"] = 1
+                query = Query(url, params, Pushlog.__page_handler, (pages, start))
+                if connection is None:
+                    connection = Pushlog(queries=query)
+                else:
+                    connection.exec_queries(query)
+                futures.append((start, end, connection.results[-1]))
+
+            start, end, future = futures.popleft()
+            future.result()
+            # the response contains the whole page, so don't keep it
+            connection.results.remove(future)
+            pushes = pages.pop(start)
+            for push_id in sorted(pushes, key=int):
+                if ids is None or int(push_id) in ids:
+                    yield int(push_id), pushes[push_id]
+
+            if checkpoint:
+                Pushlog.__save_checkpoint(checkpoint, url, end)
+
+    @staticmethod
+    def iter_changesets(channel="nightly", **kwargs):
+        """Iterate over the changesets of the pushes (see iter_pushes)
+
+        Args:
+            channel (str): channel version of firefox
+
+        Yields:
+            (int, dict, dict|str): the push id, the push and the changeset
+        """
+        for push_id, push in Pushlog.iter_pushes(channel, **kwargs):
+            for changeset in push["changesets"]:
+                yield push_id, push, changeset
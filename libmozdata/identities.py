@@ -0,0 +1,198 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import threading
+import time
+from collections.abc import MutableMapping
+
+
+class IdentityCache(MutableMapping):
+    """Store of the resolved identities (e.g. hg author -> Bugzilla emails)
+
+    It can be used as a dict, for example as author_cache or reviewer_cache in
+    patchanalysis, and it's thread-safe.
+    Each identity comes with the confidence of the resolution and the time when
+    it has been resolved. When a path is given, the identities are appended to
+    this file (one json object per line) and loaded from it when the cache is
+    created, so the resolutions survive a restart.
+    The names which can't be resolved are kept too (with None as identity) for
+    unresolved_ttl seconds, so they aren't searched again in the meantime.
+    """
+
+    # The confidence of the different ways to resolve an identity
+    CONFIDENCE_EXACT = 1.0
+    CONFIDENCE_BUG = 0.9
+    CONFIDENCE_CC = 0.8
+    CONFIDENCE_SEARCH = 0.6
+    CONFIDENCE_RELAXED = 0.4
+    CONFIDENCE_UNRESOLVED = 0.0
+    # The lifetime in seconds of an unresolved name
+    UNRESOLVED_TTL = 7 * 24 * 3600
+
+    def __init__(self, path=None, data=None, unresolved_ttl=None):
+        """Constructor
+
+        Args:
+            path (Optional[str]): the file where the identities are saved
+            data (Optional): identities to seed the cache with (see load)
+            unresolved_ttl (Optional[int]): the lifetime in seconds of an unresolved name
+        """
+        self.path = path
+        self.unresolved_ttl = (
+            IdentityCache.UNRESOLVED_TTL if unresolved_ttl is None else unresolved_ttl
+        )
+        self.__lock = threading.RLock()
+        self.__entries = {}
+        if path and os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        if entry.get("deleted"):
+                            self.__entries.pop(entry["key"], None)
+                        else:
+                            self.__entries[entry["key"]] = entry
+        if data:
+            self.load(data)
+
+    def __getitem__(self, key):
+        return self.__entries[key]["value"]
+
+    def __setitem__(self, key, value):
+        self.set(key, value, force=True)
+
+    def __delitem__(self, key):
+        with self.__lock:
+            del self.__entries[key]
+            self.__save({"key": key, "deleted": True})
+
+    def __iter__(self):
+        return iter(list(self.__entries.keys()))
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __save(self, entry):
+        if self.path:
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def set(self, key, value, confidence=CONFIDENCE_EXACT, force=False):
+        """Set an identity unless there's already one with a better confidence
+
+        Args:
+            key (str): the name to resolve
+            value: the resolved identity
+            confidence (Optional[float]): the confidence of the resolution
+            force (Optional[bool]): if True the identity is always set
+
+        Returns:
+            the identity in the cache
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if (
+                force
+                or entry is None
+                or entry["confidence"] < confidence
+                or (entry["value"] is None and value is not None)
+            ):
+                entry = {
+                    "key": key,
+                    "value": value,
+                    "confidence": confidence,
+                    "timestamp": int(time.time()),
+                }
+                self.__entries[key] = entry
+                self.__save(entry)
+            return entry["value"]
+
+    def setdefault(self, key, default=None):
+        return self.set(key, default, confidence=-1)
+
+    def set_unresolved(self, key):
+        """Remember that a name can't be resolved
+
+        Args:
+            key (str): the name
+
+        Returns:
+            the identity in the cache, None if the name is still unresolved
+        """
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry["value"] is not None:
+                return entry["value"]
+            return self.set(key, None, IdentityCache.CONFIDENCE_UNRESOLVED, force=True)
+
+    def is_unresolved(self, key):
+        """Check if a name is known to be unresolvable
+
+        Args:
+            key (str): the name
+
+        Returns:
+            bool: True if the name couldn't be resolved less than unresolved_ttl seconds ago
+        """
+        entry = self.__entries.get(key)
+        return (
+            entry is not None
+            and entry["value"] is None
+            and entry["timestamp"] + self.unresolved_ttl >= time.time()
+        )
+
+    def get_entry(self, key):
+        """Get an identity with its confidence and its timestamp
+
+        Args:
+            key (str): the name
+
+        Returns:
+            dict: the entry or None if the name isn't in the cache
+        """
+        entry = self.__entries.get(key)
+        return dict(entry) if entry is not None else None
+
+    def load(self, data, confidence=CONFIDENCE_EXACT):
+        """Seed the cache with identities (e.g. from a bulk export)
+
+        Args:
+            data (dict|List[dict]|str): a dict name -> identity, a list of entries
+                as saved in the cache file or the path of a json file containing one of them
+            confidence (Optional[float]): the confidence for the identities in a dict
+        """
+        if isinstance(data, str):
+            with open(data) as f:
+                data = json.load(f)
+
+        if isinstance(data, dict):
+            data = [
+                {"key": key, "value": value, "confidence": confidence}
+                for key, value in data.items()
+            ]
+
+        with self.__lock:
+            for entry in data:
+                self.set(
+                    entry["key"],
+                    entry["value"],
+                    confidence=entry.get("confidence", confidence),
+                )
+
+    def compact(self):
+        """Rewrite the cache file with only the current identities"""
+        if not self.path:
+            return
+        with self.__lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                for entry in self.__entries.values():
+                    f.write(json.dumps(entry) + "\n")
+            os.replace(tmp, self.path)
@@ -2,75 +2,203 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
-import argparse
 import fnmatch
 import json
 import os
+import re
 
-with open(os.path.join(os.path.dirname(__file__), "modules.json")) as f:
-    data = json.load(f)
-    MODULES = [module["name"] for module in data]
+GLOB_CHARS = ("*", "?", "[")
 
 
-def __match(path, pattern):
-    pattern = os.path.normpath(pattern)
-    path = os.path.normpath(path)
+def __new_node():
+    return {"children": {}, "prefixes": {}, "globs": []}
+
+
+def __build_index(modules):
+    """Build the index used to find the module of a path
+
+    The source directories are put in a trie of their path components:
+     - a pattern with a '*' (or another glob character) is put in the globs of the
+       node of its literal leading components;
+     - a pattern with a '.' is a file and it must be equal to the path;
+     - any other pattern is a directory and it matches the paths starting with it,
+       so it's put in the prefixes of the node of its parent, under its last component.
+    Each entry is a tuple (order, directory, module, regex).
 
-    # If the pattern contains a '*', assume the pattern is correct and we don't have to modify it.
-    if "*" in pattern:
-        return fnmatch.fnmatch(path, pattern)
-    # If the pattern contains a '.', assume it is a specific file.
-    elif "." in pattern:
-        return path == pattern
-    # Otherwise, assume the pattern is a directory and add a '*' to match all its children.
+    Args:
+        modules (List[dict]): the modules
+
+    Returns:
+        tuple: the root of the trie and the dict of the files
+    """
+    root = __new_node()
+    files = {}
+    order = 0
+    for module in modules:
+        for directory in module["sourceDirs"]:
+            pattern = os.path.normpath(directory)
+            entry = (order, directory, module, None)
+            order += 1
+            if "*" not in pattern and "." in pattern:
+                files.setdefault(pattern, []).append(entry)
+                continue
+
+            components = pattern.split("/")
+            if not any(c in pattern for c in GLOB_CHARS):
+                node = root
+                for component in components[:-1]:
+                    node = node["children"].setdefault(component, __new_node())
+                node["prefixes"].setdefault(components[-1], []).append(entry)
+                continue
+
+            if "*" not in pattern:
+                pattern += "*"
+            regex = re.compile(fnmatch.translate(os.path.normcase(pattern)))
+            node = root
+            for component in components[:-1]:
+                if any(c in component for c in GLOB_CHARS):
+                    break
+                node = node["children"].setdefault(component, __new_node())
+            node["globs"].append(entry[:3] + (regex,))
+
+    return root, files
+
+
+__index = None
+
+
+def __get_index():
+    """Load modules.json and build the index the first time it's needed
+
+    Returns:
+        dict: the modules (data and MODULES), the trie, the files and the
+            modules by lowercased name
+    """
+    global __index
+    if __index is None:
+        with open(os.path.join(os.path.dirname(__file__), "modules.json")) as f:
+            data = json.load(f)
+        trie, files = __build_index(data)
+        modules_by_name = {}
+        for module in data:
+            modules_by_name.setdefault(module["name"].lower(), module)
+        __index = {
+            "data": data,
+            "MODULES": [module["name"] for module in data],
+            "trie": trie,
+            "files": files,
+            "modules_by_name": modules_by_name,
+        }
+    return __index
+
+
+def __getattr__(name):
+    # data and MODULES are only loaded when they're used
+    if name in ("data", "MODULES"):
+        return __get_index()[name]
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+def __get_candidates(path):
+    """Get the source directories matching a path"""
+    path = os.path.normpath(path)
+    normpath = os.path.normcase(path)
+    index = __get_index()
+    candidates = list(index["files"].get(path, []))
+    node = index["trie"]
+    for component in path.split("/"):
+        for entry in node["globs"]:
+            if entry[3].match(normpath):
+                candidates.append(entry)
+        prefixes = node["prefixes"]
+        if prefixes:
+            for i in range(len(component) + 1):
+                candidates += prefixes.get(component[:i], [])
+        node = node["children"].get(component)
+        if node is None:
+            break
     else:
-        return fnmatch.fnmatch(path, pattern + "*")
+        for entry in node["globs"]:
+            if entry[3].match(normpath):
+                candidates.append(entry)
+
+    return candidates
 
 
 def module_from_path(path):
-    maxCommon = dict(module=None, directory="")
+    """Get the module of a path
+
+    The module is the one of the source directory matching the path and having
+    the longest common prefix with it.
+
+    Args:
+        path (str): the path of a file or a directory
+
+    Returns:
+        dict: the module or None
+    """
+    best = None
+    best_length = 0
+    for entry in __get_candidates(path):
+        length = len(os.path.commonprefix([path, entry[1]]))
+        if length > best_length or (
+            length == best_length and best is not None and entry[0] < best[0]
+        ):
+            best = entry
+            best_length = length
 
-    for module in data:
-        for directory in module["sourceDirs"]:
-            if (
-                len(os.path.commonprefix([path, directory]))
-                > len(os.path.commonprefix([path, maxCommon["directory"]]))
-            ) and __match(path, directory):
-                maxCommon["module"] = module
-                maxCommon["directory"] = directory
+    if best is not None:
+        return best[2]
 
     # If we couldn't pinpoint the module, use some heuristics.
-    if maxCommon["module"] is None:
-        if (
-            path.endswith("configure.in")
-            or path.endswith("moz.build")
-            or path.endswith("client.mk")
-            or path.endswith("moz.configure")
-            or path.endswith("aclocal.m4")
-            or path.endswith("Makefile.in")
-            or path.startswith("python/mach")
-        ):
-            return module_info("Build Config")
+    if (
+        path.endswith("configure.in")
+        or path.endswith("moz.build")
+        or path.endswith("client.mk")
+        or path.endswith("moz.configure")
+        or path.endswith("aclocal.m4")
+        or path.endswith("Makefile.in")
+        or path.startswith("python/mach")
+    ):
+        return module_info("Build Config")
+
+    if path.startswith("js/"):
+        return module_info("JavaScript")
 
-        if path.startswith("js/"):
-            return module_info("JavaScript")
+    if path.startswith("security/"):
+        return module_info("security")
 
-        if path.startswith("security/"):
-            return module_info("security")
+    if path.startswith("tools/profiler/"):
+        return module_info("Code Analysis and Debugging Tools")
 
-        if path.startswith("tools/profiler/"):
-            return module_info("Code Analysis and Debugging Tools")
+    return None
 
-    return maxCommon["module"]
+
+def modules_from_paths(paths):
+    """Get the modules of several paths
+
+    Args:
+        paths (List[str]): the paths
+
+    Returns:
+        List[dict]: the module (or None) for each path
+    """
+    cache = {}
+    res = []
+    for path in paths:
+        if path not in cache:
+            cache[path] = module_from_path(path)
+        res.append(cache[path])
+    return res
 
 
 def module_info(moduleName):
-    for module in data:
-        if module["name"].lower() == moduleName.lower():
-            return module
+    return __get_index()["modules_by_name"].get(moduleName.lower())
 
 
 if __name__ == "__main__":
+    import argparse
+
     parser = argparse.ArgumentParser(description="Mozilla Modules")
     parser.add_argument("-p", "--path", action="store", help="the path to the file")
     parser.add_argument("-m", "--module", action="store", help="the module name")
@@ -1,17 +1,17 @@
-import base64
 import collections
+import concurrent.futures
+import io
+import multiprocessing
 import numbers
 import re
+import threading
 import warnings
-import weakref
 from datetime import datetime, timedelta, timezone
 
-import whatthepatch
-
 from . import hgmozilla, modules, utils, versions
 from .bugzilla import Bugzilla, BugzillaUser
 from .connection import Query
-from .HGFileInfo import HGFileInfo
+from .identities import IdentityCache
 
 try:
     from urllib.request import urlopen
@@ -48,8 +48,55 @@ def short_name_match(short_name, real_name, email, exact_matching=True):
         )
 
 
+def _cache_identity(cache, key, value, confidence):
+    """Put a resolved identity in a cache
+
+    Args:
+        cache (dict|IdentityCache): the cache
+        key (str): the name
+        value: the identity
+        confidence (float): the confidence of the resolution
+
+    Returns:
+        the identity in the cache (another thread may have set it first)
+    """
+    if isinstance(cache, IdentityCache):
+        return cache.set(key, value, confidence)
+    return cache.setdefault(key, value)
+
+
+def _set_unresolved(cache, key):
+    """Remember in a cache that a name can't be resolved
+
+    Only an IdentityCache keeps the unresolved names, since it makes them expire.
+
+    Args:
+        cache (dict|IdentityCache): the cache
+        key (str): the name
+    """
+    if isinstance(cache, IdentityCache):
+        cache.set_unresolved(key)
+
+
+def _is_unresolved(cache, key):
+    """Check if a cache knows that a name can't be resolved
+
+    Args:
+        cache (dict|IdentityCache): the cache
+        key (str): the name
+
+    Returns:
+        bool: True if the name is known to be unresolvable
+    """
+    return isinstance(cache, IdentityCache) and cache.is_unresolved(key)
+
+
 def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
-    if short_name in reviewer_cache:
+    if _is_unresolved(reviewer_cache, short_name):
+        warnings.warn("Reviewer " + short_name + " could not be found.", stacklevel=3)
+        return None
+
+    if reviewer_cache.get(short_name) is not None:
         if reviewer_cache[short_name] not in bugzilla_reviewers:
             warnings.warn(
                 "Reviewer "
@@ -64,6 +111,7 @@ def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
 
     found = set()
     bugzilla_users = []
+    confidence = IdentityCache.CONFIDENCE_BUG
 
     # Check if we can find the reviewer in the list of reviewers from the bug.
     for bugzilla_name in bugzilla_reviewers:
@@ -72,6 +120,7 @@ def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
 
     if len(found) == 0:
         # Otherwise, check if we can find him/her in the CC list.
+        confidence = IdentityCache.CONFIDENCE_CC
         found |= set(
             [
                 entry["email"]
@@ -87,6 +136,7 @@ def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
 
         INCLUDE_FIELDS = ["email", "real_name"]
 
+        confidence = IdentityCache.CONFIDENCE_SEARCH
         BugzillaUser(
             search_strings="match="
             + short_name
@@ -109,6 +159,7 @@ def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
 
     if len(found) == 0:
         # Otherwise, check if we can find him/her in the CC list with a relaxed matching algorithm.
+        confidence = IdentityCache.CONFIDENCE_RELAXED
         found |= set(
             [
                 entry["email"]
@@ -124,6 +175,7 @@ def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
     # reviewer_cache dict or find a new clever way to retrieve it.
     if len(found) == 0:
         warnings.warn("Reviewer " + short_name + " could not be found.", stacklevel=3)
+        _set_unresolved(reviewer_cache, short_name)
         return None
 
     for elem in found:
@@ -141,15 +193,19 @@ def reviewer_match(short_name, bugzilla_reviewers, cc_list, reviewer_cache={}):
         "Too many matching reviewers (" + ", ".join(found) + ") found for " + short_name
     )
 
-    assert short_name not in reviewer_cache
-    reviewer_cache[short_name] = found.pop()
-    return reviewer_cache[short_name]
+    return _cache_identity(reviewer_cache, short_name, found.pop(), confidence)
 
 
 def author_match(
     author_mercurial, author_real_name, bugzilla_authors, cc_list, author_cache={}
 ):
-    if author_mercurial in author_cache:
+    if _is_unresolved(author_cache, author_mercurial):
+        warnings.warn(
+            "Author " + author_mercurial + " could not be found.", stacklevel=3
+        )
+        return set([])
+
+    if author_cache.get(author_mercurial) is not None:
         if not any(a in bugzilla_authors for a in author_cache[author_mercurial]):
             warnings.warn(
                 "None of "
@@ -163,11 +219,17 @@ def author_match(
         return set([author_mercurial] + author_cache[author_mercurial])
 
     if author_mercurial in bugzilla_authors:
-        assert author_mercurial not in author_cache
-        author_cache[author_mercurial] = [author_mercurial]
-        return set([author_mercurial])
+        return set(
+            _cache_identity(
+                author_cache,
+                author_mercurial,
+                [author_mercurial],
+                IdentityCache.CONFIDENCE_EXACT,
+            )
+        )
 
     found = set()
+    confidence = IdentityCache.CONFIDENCE_BUG
 
     if len(bugzilla_authors) == 1:
         found.add(list(bugzilla_authors)[0])
@@ -180,6 +242,7 @@ def author_match(
     if len(found) == 0:
         # Otherwise, search on Bugzilla.
         bugzilla_users = []
+        confidence = IdentityCache.CONFIDENCE_SEARCH
 
         def user_handler(u):
             bugzilla_users.append(u)
@@ -201,6 +264,7 @@ def author_match(
         warnings.warn(
             "Author " + author_mercurial + " could not be found.", stacklevel=3
         )
+        _set_unresolved(author_cache, author_mercurial)
         return set([])
 
     for elem in found:
@@ -216,9 +280,11 @@ def author_match(
 
     for elem in found:
         if author_mercurial.lower() == elem.lower():
-            assert author_mercurial not in author_cache
-            author_cache[author_mercurial] = [author_mercurial]
-            return set([author_mercurial])
+            return set(
+                _cache_identity(
+                    author_cache, author_mercurial, [author_mercurial], confidence
+                )
+            )
 
     assert len(found) <= 1, (
         "Too many matching authors ("
@@ -227,10 +293,8 @@ def author_match(
         + author_mercurial
     )
 
-    assert author_mercurial not in author_cache
-    result = set([author_mercurial, found.pop()])
-    author_cache[author_mercurial] = list(result)
-    return result
+    result = list(set([author_mercurial, found.pop()]))
+    return set(_cache_identity(author_cache, author_mercurial, result, confidence))
 
 
 def _is_test(path):
@@ -250,7 +314,189 @@ def get_user_details(username):
     return output
 
 
-hginfos = weakref.WeakValueDictionary()
+__hginfos = None
+__hginfos_lock = threading.Lock()
+
+
+def _get_hginfos():
+    """Get the cache of the file infos used by patch_analysis"""
+    global __hginfos
+    with __hginfos_lock:
+        if __hginfos is None:
+            from .HGFileInfo import HGFileInfoCache
+
+            __hginfos = HGFileInfoCache()
+        return __hginfos
+
+
+def __getattr__(name):
+    # The file infos cache is only created when it's used
+    if name == "hginfos":
+        return _get_hginfos()
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+
+DIFF_GIT_PATTERN = re.compile(r"^diff --git a/(.*) b/(.*)$")
+DIFF_HUNK_PATTERN = re.compile(r"^@@ -[0-9]+(?:,([0-9]+))? \+[0-9]+(?:,([0-9]+))? @@")
+# str.splitlines (used by whatthepatch) splits on these characters too
+DIFF_LINE_BREAKS_PATTERN = re.compile("[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]")
+DIFF_EXTENDED_HEADERS = (
+    "old mode ",
+    "new mode ",
+    "new file mode ",
+    "deleted file mode ",
+    "rename from ",
+    "rename to ",
+    "copy from ",
+    "copy to ",
+    "similarity index ",
+    "dissimilarity index ",
+    "index ",
+    "--- ",
+    "+++ ",
+)
+
+
+class _DiffStatsFallback(Exception):
+    pass
+
+
+def _strip_diff_path(path, prefix):
+    return path[2:] if path.startswith(prefix) else path
+
+
+def _new_diff_stats(old_path, new_path):
+    return {
+        "old_path": _strip_diff_path(old_path, "a/"),
+        "new_path": _strip_diff_path(new_path, "b/"),
+        "changes": None,
+        "add": 0,
+        "del": 0,
+        "binary": False,
+        "rename": False,
+        "copy": False,
+        "mode": False,
+        "new_file": False,
+        "deleted_file": False,
+    }
+
+
+def _get_diff_flags(text):
+    return {
+        "binary": "Binary file" in text
+        and (" has changed" in text or " differ" in text),
+        "rename": "rename " in text,
+        "copy": "copy " in text,
+        "mode": "new mode " in text,
+        "new_file": "new file mode " in text,
+        "deleted_file": "deleted file mode " in text,
+    }
+
+
+def _get_diff_stats_with_whatthepatch(patch):
+    import whatthepatch
+
+    res = []
+    for diff in whatthepatch.parse_patch(patch):
+        stats = _new_diff_stats(diff.header.old_path, diff.header.new_path)
+        stats.update(_get_diff_flags(diff.text))
+        if diff.changes is not None:
+            stats["changes"] = len(diff.changes)
+            for change in diff.changes:
+                if change.old is None and change.new is not None:
+                    stats["add"] += 1
+                elif change.new is None and change.old is not None:
+                    stats["del"] += 1
+        res.append(stats)
+    return res
+
+
+def _scan_diff_stats(patch):
+    res = []
+    stats = None
+    binary = False
+    old_count = new_count = 0
+
+    for line in io.StringIO(patch):
+        line = line[:-1] if line.endswith("\n") else line
+
+        if old_count > 0 or new_count > 0:
+            c = line[:1]
+            if c == "+":
+                new_count -= 1
+                stats["add"] += 1
+            elif c == "-":
+                old_count -= 1
+                stats["del"] += 1
+            elif c == " ":
+                old_count -= 1
+                new_count -= 1
+            elif c == "\\":
+                continue
+            else:
+                raise _DiffStatsFallback()
+            if old_count < 0 or new_count < 0:
+                raise _DiffStatsFallback()
+            stats["changes"] += 1
+            continue
+
+        if line.startswith("diff "):
+            m = DIFF_GIT_PATTERN.match(line)
+            if not m or " b/" in m.group(1) or line.count('"'):
+                raise _DiffStatsFallback()
+            stats = _new_diff_stats("a/" + m.group(1), "b/" + m.group(2))
+            res.append(stats)
+            binary = False
+        elif stats is None or binary:
+            # the changeset header or the data of a binary patch
+            continue
+        elif line.startswith("@@ "):
+            m = DIFF_HUNK_PATTERN.match(line)
+            if not m:
+                raise _DiffStatsFallback()
+            old_count = int(m.group(1)) if m.group(1) is not None else 1
+            new_count = int(m.group(2)) if m.group(2) is not None else 1
+            if stats["changes"] is None:
+                stats["changes"] = 0
+        elif line.startswith("\\") and stats["changes"] is not None:
+            continue
+        elif line.startswith(DIFF_EXTENDED_HEADERS):
+            if stats["changes"] is not None:
+                raise _DiffStatsFallback()
+            for flag, value in _get_diff_flags(line).items():
+                stats[flag] |= value
+        elif line.startswith("Binary file"):
+            stats["binary"] = binary = True
+        elif line:
+            # e.g. a GIT binary patch
+            raise _DiffStatsFallback()
+
+    if old_count > 0 or new_count > 0 or not res:
+        raise _DiffStatsFallback()
+
+    return res
+
+
+def get_diff_stats(patch):
+    """Get the statistics of the files modified by a patch
+
+    The unified diff is scanned line by line and whatthepatch is only used
+    for the patches which aren't simple git diffs.
+
+    Args:
+        patch (str): the patch (e.g. a raw revision)
+
+    Returns:
+        List[dict]: for each file, the paths, the number of changed lines
+            (None when there are no hunks), of additions and of deletions and
+            whether it's a binary, renamed, copied, new or deleted file or a mode change
+    """
+    if not DIFF_LINE_BREAKS_PATTERN.search(patch):
+        try:
+            return _scan_diff_stats(patch)
+        except _DiffStatsFallback:
+            pass
+    return _get_diff_stats_with_whatthepatch(patch)
 
 
 def patch_analysis(
@@ -272,52 +518,32 @@ def patch_analysis(
 
     paths = []
     languages = set()
-    for diff in whatthepatch.parse_patch(patch):
-        old_path = (
-            diff.header.old_path[2:]
-            if diff.header.old_path.startswith("a/")
-            else diff.header.old_path
-        )
-        new_path = (
-            diff.header.new_path[2:]
-            if diff.header.new_path.startswith("b/")
-            else diff.header.new_path
-        )
+    for stats in get_diff_stats(patch):
+        old_path = stats["old_path"]
+        new_path = stats["new_path"]
 
-        if diff.changes is None:
+        if stats["changes"] is None:
             assert any(
-                subtext in diff.text
-                for subtext in [
-                    "new mode ",
-                    "rename ",
-                    "copy ",
-                    "new file mode ",
-                    "deleted file mode ",
+                stats[flag]
+                for flag in [
+                    "mode",
+                    "rename",
+                    "copy",
+                    "new_file",
+                    "deleted_file",
+                    "binary",
                 ]
-            ) or any(
-                subtext1 in diff.text and subtext2 in diff.text
-                for (subtext1, subtext2) in [("Binary file ", " has changed")]
-            ), "Can't parse changes from patch: " + str(
-                diff
-            )
+            ), "Can't parse changes from patch: " + str(stats)
         else:
             # Calc changes additions & deletions
-            counts = [
-                (
-                    change.old is None and change.new is not None,
-                    change.new is None and change.old is not None,
-                )
-                for change in diff.changes
-            ]
-            counts = list(zip(*counts))  # inverse zip
-            info["changes_add"] += sum(counts[0])
-            info["changes_del"] += sum(counts[1])
+            info["changes_add"] += stats["add"]
+            info["changes_del"] += stats["del"]
 
             # TODO: Split C/C++, Rust, Java, JavaScript, build system changes
             if _is_test(new_path):
-                info["test_changes_size"] += len(diff.changes)
+                info["test_changes_size"] += stats["changes"]
             else:
-                info["changes_size"] += len(diff.changes)
+                info["changes_size"] += stats["changes"]
 
         if old_path != "/dev/null" and old_path != new_path:
             paths.append(old_path)
@@ -328,15 +554,11 @@ def patch_analysis(
             languages.add(utils.get_language(new_path))
 
     used_modules = {}
-    for path in paths:
-        module = modules.module_from_path(path)
+    for path, module in zip(paths, modules.modules_from_paths(paths)):
         if module and module["name"] not in used_modules:
             used_modules[module["name"]] = 1
 
-        if path in hginfos:
-            hi = hginfos[path]
-        else:
-            hi = hginfos[path] = HGFileInfo(path, date_type="creation")
+        hi = _get_hginfos().get(path)
 
         utc_ts_to = (
             utils.get_timestamp(creation_date) - 1
@@ -385,6 +607,54 @@ def patch_analysis(
     return info
 
 
+def _patch_analysis_worker(index, args):
+    return index, patch_analysis(*args)
+
+
+def patch_analysis_many(patches, processes=None, ordered=True, max_pending=None):
+    """Analyze some patches in a pool of processes
+
+    Only the arguments of patch_analysis are sent to the workers and only
+    the result dicts are sent back. Each worker has its own file info cache
+    (which can be shared on disk, see HGFileInfoCache).
+
+    Args:
+        patches (iterable): the (patch, authors, reviewers[, creation_date]) tuples
+        processes (Optional[int]): the number of processes, by default the number of cpus
+        ordered (Optional[bool]): if False, the results are yielded as soon as they're ready
+        max_pending (Optional[int]): the maximal number of patches sent to the workers
+            and not yet yielded, by default twice the number of processes
+
+    Yields:
+        (int, dict): the index of the patch in patches and its analysis
+    """
+    processes = processes or multiprocessing.cpu_count()
+    max_pending = max_pending or 2 * processes
+    patches = enumerate(patches)
+
+    with concurrent.futures.ProcessPoolExecutor(processes) as executor:
+        pending = collections.deque()
+
+        def submit():
+            for index, args in patches:
+                pending.append(executor.submit(_patch_analysis_worker, index, args))
+                if len(pending) >= max_pending:
+                    break
+
+        submit()
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                future = done.pop()
+                pending.remove(future)
+            yield future.result()
+            submit()
+
+
 MOZREVIEW_URL_PATTERN = "https://reviewboard.mozilla.org/r/([0-9]+)/"
 
 
@@ -418,17 +688,81 @@ def get_bugzilla_authors_reviewers(bug):
     return bugzilla_authors, bugzilla_reviewers
 
 
-def get_commits_for_bug(bug):
+BACKOUT_PATTERN = re.compile(
+    r"(?:backout|back out|backed out|backedout) (?:changeset )?([a-z0-9]{12,})"
+)
+
+
+def _get_landings(bug):
+    return Bugzilla.get_landing_comments(
+        bug["comments"], ["inbound", "central", "fx-team"]
+    )
+
+
+def _get_backout_revisions(desc):
+    backout_revisions = set()
+    for match in BACKOUT_PATTERN.finditer(desc):
+        backout_revisions.add(match.group(1)[:12])
+
+    # TODO: Improve matching a backout of multiple changesets in a single line (e.g. bug 683280).
+    if not backout_revisions:
+        match = re.search("(?:backout|back out|backed out|backedout) changesets", desc)
+        if match:
+            pattern = re.compile(r"([a-z0-9]{12,})")
+            for match in pattern.finditer(desc):
+                backout_revisions.add(match.group(1)[:12])
+
+    return backout_revisions
+
+
+def _get_landing_revisions(bugs):
+    """Get the revisions landed for some bugs
+
+    The landing revisions are retrieved concurrently, then the parents of the
+    backouts which don't say what they back out are retrieved in a second wave.
+
+    Args:
+        bugs (List[dict]): the bugs with their comments
+
+    Returns:
+        (dict, dict): the revisions and the parents for each (channel, node),
+            the descriptions of the revisions are lowercased
+    """
+    # TODO: No need to get the revision, we have everything in the raw format.
+    #       We can use pylib/mozautomation/mozautomation/commitparser.py from version-control-tools
+    # Or maybe it's better this way, so we can avoid downloading a lot of changes when it's unneeded
+    # to do so (e.g. for backouts or merges we only need the description).
+    metas = hgmozilla.Revision.get_revisions(
+        [
+            (landing["channel"], landing["revision"][:12])
+            for bug in bugs
+            for landing in _get_landings(bug)
+        ]
+    )
+
+    parents = []
+    for (channel, rev), meta in metas.items():
+        if not meta:
+            continue
+        meta["desc"] = meta["desc"].lower()
+        if not _get_backout_revisions(meta["desc"]) and re.search(
+            "backout|back out|backed out|backedout", meta["desc"]
+        ):
+            parents += [(channel, parent) for parent in meta["parents"]]
+
+    return metas, hgmozilla.Revision.get_revisions(parents)
+
+
+def get_commits_for_bug(bug, landing_revisions=None):
     reviewer_pattern = re.compile(r"r=([a-zA-Z0-9._]+)")
     author_pattern = re.compile(r"<([^>]+)>")
     email_pattern = re.compile(r"<?([\w\-\._\+%]+@[\w\-\._\+%]+)>?")
-    backout_pattern = re.compile(
-        r"(?:backout|back out|backed out|backedout) (?:changeset )?([a-z0-9]{12,})"
-    )
     bug_pattern = re.compile(r"[\t ]*bug[\t ]*([0-9]+)")
-    landings = Bugzilla.get_landing_comments(
-        bug["comments"], ["inbound", "central", "fx-team"]
-    )
+    landings = _get_landings(bug)
+    if landing_revisions is None:
+        landing_revisions = _get_landing_revisions([bug])
+    metas, parent_metas = landing_revisions
+
     revs = {}
     backed_out_revs = set()
     backout_comments = set()
@@ -436,37 +770,20 @@ def get_commits_for_bug(bug):
         rev = landing["revision"][:12]
         channel = landing["channel"]
 
-        # TODO: No need to get the revision, we have everything in the raw format.
-        #       We can use pylib/mozautomation/mozautomation/commitparser.py from version-control-tools
-        # Or maybe it's better this way, so we can avoid downloading a lot of changes when it's unneeded
-        # to do so (e.g. for backouts or merges we only need the description).
-        meta = hgmozilla.Revision.get_revision(channel, rev)
+        meta = metas[(channel, rev)]
         if not meta:
             warnings.warn("Revision " + rev + " doesn't exist.", stacklevel=2)
             continue
-        meta["desc"] = meta["desc"].lower()
 
         # Check if it was a backout
-        backout_revisions = set()
-        for match in backout_pattern.finditer(meta["desc"]):
-            backout_revisions.add(match.group(1)[:12])
-
-        # TODO: Improve matching a backout of multiple changesets in a single line (e.g. bug 683280).
-        if not backout_revisions:
-            match = re.search(
-                "(?:backout|back out|backed out|backedout) changesets", meta["desc"]
-            )
-            if match:
-                pattern = re.compile(r"([a-z0-9]{12,})")
-                for match in pattern.finditer(meta["desc"]):
-                    backout_revisions.add(match.group(1)[:12])
+        backout_revisions = _get_backout_revisions(meta["desc"])
 
         if not backout_revisions:
             match = re.search("backout|back out|backed out|backedout", meta["desc"])
             if match:
                 for parent in meta["parents"]:
-                    for match in backout_pattern.finditer(
-                        hgmozilla.Revision.get_revision(channel, parent)["desc"].lower()
+                    for match in BACKOUT_PATTERN.finditer(
+                        parent_metas[(channel, parent)]["desc"].lower()
                     ):
                         backout_revisions.add(match.group(1)[:12])
 
@@ -537,61 +854,84 @@ def get_commits_for_bug(bug):
     return revs, backout_comments
 
 
-# TODO: Consider feedback+ and feedback- as review+ and review-
-def bug_analysis(bug, uplift_channel=None, author_cache={}, reviewer_cache={}):
-    if isinstance(bug, numbers.Number):
-        bug_id = bug
-        bug = {}
+def _get_bugs(bug_ids, attachment_include_fields=[]):
+    """Get the data needed to analyze some bugs
 
-        def bughandler(found_bug):
-            bug.update(found_bug)
+    Args:
+        bug_ids (List[int]): the bug ids
+        attachment_include_fields (Optional[List[str]]): more fields for the attachments
 
-        def commenthandler(found_bug, bugid):
-            bug["comments"] = found_bug["comments"]
+    Returns:
+        dict: the bug for each bug id
+    """
+    bugs = {}
+
+    def get_bug(bugid):
+        return bugs.setdefault(int(bugid), {})
+
+    def bughandler(found_bug):
+        get_bug(found_bug["id"]).update(found_bug)
+
+    def commenthandler(found_bug, bugid):
+        get_bug(bugid)["comments"] = found_bug["comments"]
+
+    def attachmenthandler(attachments, bugid):
+        get_bug(bugid)["attachments"] = attachments
+
+    def historyhandler(found_bug):
+        get_bug(found_bug["id"])["history"] = found_bug["history"]
+
+    INCLUDE_FIELDS = [
+        "id",
+        "flags",
+        "depends_on",
+        "keywords",
+        "blocks",
+        "whiteboard",
+        "resolution",
+        "status",
+        "url",
+        "version",
+        "summary",
+        "priority",
+        "product",
+        "component",
+        "severity",
+        "platform",
+        "op_sys",
+        "cc",
+        "assigned_to",
+        "creator",
+    ]
 
-        def attachmenthandler(attachments, bugid):
-            bug["attachments"] = attachments
+    ATTACHMENT_INCLUDE_FIELDS = ["flags", "is_patch", "creator", "content_type"]
 
-        def historyhandler(found_bug):
-            bug["history"] = found_bug["history"]
+    COMMENT_INCLUDE_FIELDS = ["id", "text", "author", "time"]
 
-        INCLUDE_FIELDS = [
-            "id",
-            "flags",
-            "depends_on",
-            "keywords",
-            "blocks",
-            "whiteboard",
-            "resolution",
-            "status",
-            "url",
-            "version",
-            "summary",
-            "priority",
-            "product",
-            "component",
-            "severity",
-            "platform",
-            "op_sys",
-            "cc",
-            "assigned_to",
-            "creator",
-        ]
+    Bugzilla(
+        bug_ids,
+        INCLUDE_FIELDS,
+        bughandler=bughandler,
+        commenthandler=commenthandler,
+        comment_include_fields=COMMENT_INCLUDE_FIELDS,
+        attachmenthandler=attachmenthandler,
+        historyhandler=historyhandler,
+        attachment_include_fields=ATTACHMENT_INCLUDE_FIELDS + attachment_include_fields,
+    ).get_data().wait()
 
-        ATTACHMENT_INCLUDE_FIELDS = ["flags", "is_patch", "creator", "content_type"]
+    return bugs
 
-        COMMENT_INCLUDE_FIELDS = ["id", "text", "author", "time"]
 
-        Bugzilla(
-            bug_id,
-            INCLUDE_FIELDS,
-            bughandler=bughandler,
-            commenthandler=commenthandler,
-            comment_include_fields=COMMENT_INCLUDE_FIELDS,
-            attachmenthandler=attachmenthandler,
-            historyhandler=historyhandler,
-            attachment_include_fields=ATTACHMENT_INCLUDE_FIELDS,
-        ).get_data().wait()
+# The attachment fields retrieved when the bug has no landing
+ATTACHMENT_METADATA_FIELDS = ["id", "is_obsolete", "creation_time"]
+
+
+# TODO: Consider feedback+ and feedback- as review+ and review-
+def bug_analysis(
+    bug, uplift_channel=None, author_cache={}, reviewer_cache={}, commits=None
+):
+    if isinstance(bug, numbers.Number):
+        bug = _get_bugs([bug])[bug]
 
     info = {
         "backout_num": 0,
@@ -623,7 +963,9 @@ def bug_analysis(bug, uplift_channel=None, author_cache={}, reviewer_cache={}):
     # Get all reviewers and authors, we will match them with the changeset description (r=XXX).
     bugzilla_authors, bugzilla_reviewers = get_bugzilla_authors_reviewers(bug)
 
-    revs, backout_comments = get_commits_for_bug(bug)
+    if commits is None:
+        commits = get_commits_for_bug(bug)
+    revs, backout_comments = commits
 
     if len(revs) > 0:
         for rev, obj in revs.items():
@@ -676,37 +1018,44 @@ def bug_analysis(bug, uplift_channel=None, author_cache={}, reviewer_cache={}):
             for i in range(0, len(bug["attachments"])):
                 bug["attachments"][i].update(attachments[i])
 
-        Bugzilla(
-            bug["id"],
-            attachmenthandler=attachmenthandler,
-            attachment_include_fields=["id", "data", "is_obsolete", "creation_time"],
-        ).get_data().wait()
-
-        for attachment in bug["attachments"]:
-            if (
-                sum(
-                    flag["name"] == "review" and flag["status"] == "+"
-                    for flag in attachment["flags"]
-                )
-                == 0
-            ):
-                continue
-
-            data = None
+        # Only get the metadata here, the content of the interesting
+        # attachments is streamed below.
+        if not all("is_obsolete" in a for a in bug["attachments"]):
+            Bugzilla(
+                bug["id"],
+                attachmenthandler=attachmenthandler,
+                attachment_include_fields=ATTACHMENT_METADATA_FIELDS,
+            ).get_data().wait()
+
+        attachments = [
+            attachment
+            for attachment in bug["attachments"]
+            if sum(
+                flag["name"] == "review" and flag["status"] == "+"
+                for flag in attachment["flags"]
+            )
+            > 0
+            and attachment["is_obsolete"] == 0
+            and (
+                attachment["is_patch"] == 1
+                or attachment["content_type"] == "text/x-review-board-request"
+            )
+        ]
+        contents = Bugzilla.get_attachments_data(
+            [attachment["id"] for attachment in attachments]
+        )
 
-            if attachment["is_patch"] == 1 and attachment["is_obsolete"] == 0:
+        for attachment in attachments:
+            if attachment["is_patch"] == 1:
                 info["patches"][attachment["id"]] = {
                     "source": "attachment",
                     "url": "{}/attachment.cgi?id={}".format(
                         Bugzilla.URL, attachment["id"]
                     ),
                 }
-                data = base64.b64decode(attachment["data"]).decode("ascii", "ignore")
-            elif (
-                attachment["content_type"] == "text/x-review-board-request"
-                and attachment["is_obsolete"] == 0
-            ):
-                mozreview_url = base64.b64decode(attachment["data"]).decode("utf-8")
+                data = contents[attachment["id"]].decode("ascii", "ignore")
+            else:
+                mozreview_url = contents[attachment["id"]].decode("utf-8")
                 info["patches"][attachment["id"]] = {
                     "source": "mozreview",
                     "url": mozreview_url,
@@ -719,15 +1068,14 @@ def bug_analysis(bug, uplift_channel=None, author_cache={}, reviewer_cache={}):
                 response = urlopen(mozreview_raw_diff_url)
                 data = response.read().decode("ascii", "ignore")
 
-            if data is not None:
-                info["patches"][attachment["id"]].update(
-                    patch_analysis(
-                        data,
-                        [attachment["creator"]],
-                        bugzilla_reviewers,
-                        utils.get_date_ymd(attachment["creation_time"]),
-                    )
+            info["patches"][attachment["id"]].update(
+                patch_analysis(
+                    data,
+                    [attachment["creator"]],
+                    bugzilla_reviewers,
+                    utils.get_date_ymd(attachment["creation_time"]),
                 )
+            )
 
     # TODO: Add number of crashes with signatures from the bug (also before/after the patch?).
 
@@ -750,6 +1098,95 @@ def bug_analysis(bug, uplift_channel=None, author_cache={}, reviewer_cache={}):
     return info
 
 
+BUG_ANALYSIS_CHUNK_SIZE = 100
+
+
+def _prefetch_bug_analysis(bugs):
+    """Retrieve concurrently the data needed to analyze some bugs
+
+    The revisions are kept in the hgmozilla cache and the file logs are
+    retrieved in the background in the HGFileInfo cache, where bug_analysis
+    gets them.
+
+    Args:
+        bugs (List[dict]): the bugs
+
+    Returns:
+        dict: the commits (see get_commits_for_bug) for each bug id
+    """
+    landing_revisions = _get_landing_revisions(bugs)
+    commits = {bug["id"]: get_commits_for_bug(bug, landing_revisions) for bug in bugs}
+
+    revisions = [
+        (obj["channel"], rev)
+        for revs, _ in commits.values()
+        for rev, obj in revs.items()
+    ]
+    patches = hgmozilla.RawRevision.get_revisions(revisions)
+
+    # the paths in the order they're used by bug_analysis, so the ones which
+    # don't fit in the cache are the last ones to be used
+    paths = {}
+    for key in revisions:
+        if not patches.get(key):
+            continue
+        for stats in get_diff_stats(patches[key]):
+            old_path = stats["old_path"]
+            new_path = stats["new_path"]
+            if old_path != "/dev/null" and old_path != new_path:
+                paths[old_path] = None
+            if new_path != "/dev/null":
+                paths[new_path] = None
+
+    hginfos = _get_hginfos()
+    hginfos.prefetch(list(paths)[: hginfos.max_size])
+
+    return commits
+
+
+def bug_analysis_many(
+    bugs, uplift_channel=None, author_cache={}, reviewer_cache={}, chunk_size=None
+):
+    """Analyze a lot of bugs
+
+    The bugs are processed in chunks. For each chunk, the Bugzilla data are
+    retrieved with shared requests, the revisions are retrieved in concurrent
+    waves and the file logs of the modified files are requested before the bugs
+    are analyzed one by one with the same author and reviewer caches.
+
+    Args:
+        bugs (List[int|dict]): the bug ids or the bugs
+        uplift_channel (Optional[str]): the channel to use to get the uplift info
+        author_cache (Optional[dict|IdentityCache]): the cache for author_match
+        reviewer_cache (Optional[dict|IdentityCache]): the cache for reviewer_match
+        chunk_size (Optional[int]): the number of bugs in a chunk
+
+    Returns:
+        dict: the analysis for each bug id
+    """
+    res = {}
+    for chunk in utils.batched(bugs, chunk_size or BUG_ANALYSIS_CHUNK_SIZE):
+        bug_ids = [bug for bug in chunk if isinstance(bug, numbers.Number)]
+        found = _get_bugs(bug_ids, ATTACHMENT_METADATA_FIELDS) if bug_ids else {}
+        chunk_bugs = []
+        for bug in chunk:
+            if isinstance(bug, numbers.Number):
+                if "id" not in found.get(bug, {}):
+                    warnings.warn("Bug " + str(bug) + " was not found.", stacklevel=2)
+                    continue
+                bug = found[bug]
+            chunk_bugs.append(bug)
+
+        commits = _prefetch_bug_analysis(chunk_bugs)
+
+        for bug in chunk_bugs:
+            res[bug["id"]] = bug_analysis(
+                bug, uplift_channel, author_cache, reviewer_cache, commits[bug["id"]]
+            )
+
+    return res
+
+
 def uplift_info(bug, channel):
     if isinstance(bug, numbers.Number):
         bug_id = bug
@@ -889,8 +1326,129 @@ def get_patch_info(
     extra=None,
     channels=["release", "aurora", "beta", "nightly"],
 ):
+    """Get the landing dates of the patches for some bugs
+
+    The revisions of a bug are checked on Mercurial as soon as its bug data,
+    comments and history have been retrieved, while the other bugs are still
+    being retrieved. A revision is only requested once even if it appears in
+    several bugs.
+
+    Args:
+        bugs (List[str]): the bug ids
+        base_versions (Optional[dict]): the versions for the different channels
+        extra (Optional[Bugzilla]): a Bugzilla connection to merge with the one
+            used to get the bugs
+        channels (Optional[List[str]]): the channels
+
+    Returns:
+        dict: the info for each bug having landed patches
+    """
     landing_patterns = Bugzilla.get_landing_patterns(channels=channels)
     approval_pattern = re.compile(r"approval-mozilla-([a-zA-Z0-9]+)\+")
+    bug_pattern = re.compile(r"[\t ]*[Bb][Uu][Gg][\t ]*([0-9]+)")
+
+    info = {
+        str(bugid): {
+            "land": None,
+            "approval": None,
+            "affected": set(),
+            "signatures": [],
+        }
+        for bugid in bugs
+    }
+    status_flags = Bugzilla.get_status_flags(base_versions)
+    status_flags = {c: status_flags[c] for c in channels}
+
+    toremove = set()
+
+    lock = threading.Lock()
+    # The number of handlers (bug, comments, history) to wait for before checking
+    # the revisions of a bug
+    pending = {bugid: 3 for bugid in info}
+    # (channel, revision) -> {'json': ..., 'infos': [...]}
+    revisions = {}
+    # the mercurial connection, created with the first queries
+    hg = []
+
+    def check_revision(json, rev_info):
+        # a local repository doesn't know the pushes, so use the creation date
+        date = json["pushdate"] if "pushdate" in json else json["date"]
+        rev_info["date"] = utils.as_utc(
+            datetime.fromtimestamp(date[0], tz=timezone.utc)
+        )
+        rev_info["backedout"] = json.get("backedoutby", "") != ""
+        m = bug_pattern.search(json["desc"])
+        if not m or m.group(1) != rev_info["bugid"]:
+            rev_info["bugid"] = ""
+
+    def handler_revision(json, key):
+        hgmozilla.Mercurial.cache.put_revision(key[0], key[1], json)
+        with lock:
+            revision = revisions[key]
+            revision["json"] = json
+            rev_infos = list(revision["infos"])
+        for rev_info in rev_infos:
+            check_revision(json, rev_info)
+
+    def schedule_revisions(bugid):
+        i = info[bugid]
+        land = i["land"]
+        if not land:
+            # nothing landed so useless...
+            toremove.add(bugid)
+            return
+
+        # we need to check that patches haven't been backed out
+        # so prepare query for mercurial
+        approval = i["approval"] or set()
+        queries = []
+        for chan in list(land.keys()):
+            if chan != "nightly" and chan not in approval:
+                # no approval
+                del land[chan]
+                continue
+
+            url = hgmozilla.Revision.get_url(chan)
+            for rev_num, rev_info in land[chan].items():
+                key = (chan, rev_num)
+                with lock:
+                    revision = revisions.get(key)
+                    if revision is None:
+                        # a revision can be backed out after it has been cached
+                        json = hgmozilla.Mercurial.cache.get_revision(chan, rev_num)
+                        if json is not None and not json.get("backedoutby"):
+                            json = None
+                        revision = revisions[key] = {"json": json, "infos": []}
+                        if json is None:
+                            queries.append(
+                                Query(url, {"node": rev_num}, handler_revision, key)
+                            )
+                    json = revision["json"]
+                    if json is None:
+                        revision["infos"].append(rev_info)
+                if json is not None:
+                    check_revision(json, rev_info)
+
+        if not land:
+            toremove.add(bugid)
+
+        if queries:
+            with lock:
+                if hg:
+                    hg[0].exec_queries(queries)
+                else:
+                    hg.append(hgmozilla.Revision(queries=queries))
+
+    def handled(bugid):
+        with lock:
+            if bugid not in pending:
+                return
+            pending[bugid] -= 1
+            if pending[bugid] != 0:
+                return
+            del pending[bugid]
+        if bugid not in toremove:
+            schedule_revisions(bugid)
 
     def comment_handler(bug, bugid, data):
         r = Bugzilla.get_landing_comments(bug["comments"], [], landing_patterns)
@@ -909,6 +1467,7 @@ def get_patch_info(
                     d[channel] = {revision: dr}
 
             data[bugid]["land"] = d
+        handled(bugid)
 
     def history_handler(_history, data):
         bugid = str(_history["id"])
@@ -927,20 +1486,7 @@ def get_patch_info(
                                 approval.discard(m.group(1))
 
         data[bugid]["approval"] = approval
-
-    info = {
-        str(bugid): {
-            "land": None,
-            "approval": None,
-            "affected": set(),
-            "signatures": [],
-        }
-        for bugid in bugs
-    }
-    status_flags = Bugzilla.get_status_flags(base_versions)
-    status_flags = {c: status_flags[c] for c in channels}
-
-    toremove = set()
+        handled(bugid)
 
     def bug_handler(bug, data):
         bugid = str(bug["id"])
@@ -954,6 +1500,7 @@ def get_patch_info(
             else:
                 # Bug for thunderbird or anything else except Firefox
                 toremove.add(bugid)
+        handled(bugid)
 
     bz = Bugzilla(
         bugs,
@@ -969,49 +1516,13 @@ def get_patch_info(
         bz = extra.merge(bz)
     bz.get_data().wait()
 
-    for r in toremove:
-        del info[r]
-
-    toremove.clear()
-    queries = []
-
-    bug_pattern = re.compile(r"[\t ]*[Bb][Uu][Gg][\t ]*([0-9]+)")
-
-    def handler_revision(json, data):
-        data["date"] = utils.as_utc(
-            datetime.fromtimestamp(json["pushdate"][0], tz=timezone.utc)
-        )
-        data["backedout"] = json.get("backedoutby", "") != ""
-        m = bug_pattern.search(json["desc"])
-        if not m or m.group(1) != data["bugid"]:
-            data["bugid"] = ""
-
-    for bugid, i in info.items():
-        land = i["land"]
-        if land:
-            # we need to check that patches haven't been backed out
-            # so prepare query for mercurial
-            approval = i["approval"]
-            chan_toremove = set()
-            for chan, revs in land.items():
-                if chan == "nightly" or chan in approval:
-                    url = hgmozilla.Revision.get_url(chan)
-                    for rev_num, rev_info in revs.items():
-                        queries.append(
-                            Query(url, {"node": rev_num}, handler_revision, rev_info)
-                        )
-                else:
-                    # no approval
-                    chan_toremove.add(chan)
-            for c in chan_toremove:
-                del land[c]
-            if not land:
-                toremove.add(bugid)
-        else:  # nothing landed so useless...
-            toremove.add(bugid)
+    # The bugs which haven't been retrieved entirely
+    for bugid in list(pending.keys()):
+        if bugid not in toremove:
+            schedule_revisions(bugid)
 
-    if queries:
-        hgmozilla.Revision(queries=queries).wait()
+    if hg:
+        hg[0].wait()
 
     for r in toremove:
         del info[r]
@@ -1038,12 +1549,14 @@ def get_patch_info(
     return info
 
 
-def parse_uplift_comment(text, bug_id=None):
-    """
-    Parse a raw uplift comment to render
-    links and headers as HTML
+class UpliftCommentRenderer(object):
+    """Render raw uplift comments as HTML (links and headers)
+
+    The regular expressions are compiled once, so the same renderer can be
+    used to render a lot of comments (see render_many).
     """
-    headers = (
+
+    HEADERS = (
         r"Feature/regressing bug #",
         r"Feature/Bug causing the regression",
         r"User impact if declined",
@@ -1058,108 +1571,161 @@ def parse_uplift_comment(text, bug_id=None):
         r"String/UUID change made/needed",
         r"String changes made/needed",
     )
-    no_header = "no-header"
+    NO_HEADER = "no-header"
+    HTML_ESCAPE_TABLE = str.maketrans(
+        {"&": "&amp;", '"': "&quot;", "'": "&apos;", ">": "&gt;", "<": "&lt;"}
+    )
+    HEADER_PATTERN = re.compile(
+        r"^\[({})\]:?\s*(.*)".format("|".join(HEADERS)), re.IGNORECASE
+    )
+    # Links, bugs, attachments and comments are all replaced in a single pass
+    LINK_PATTERN = re.compile(
+        r"(https?://[\w\.\/_@#-]*)|bug (\d+)|attachment (\d+)", re.IGNORECASE
+    )
+    LINK_WITH_COMMENT_PATTERN = re.compile(
+        r"(https?://[\w\.\/_@#-]*)|bug (\d+)|attachment (\d+)|comment (\d+)",
+        re.IGNORECASE,
+    )
+    NON_WORD_PATTERN = re.compile(r"[^\w]+")
+
+    def __init__(self, bugzilla_url=None):
+        """Constructor
+
+        Args:
+            bugzilla_url (Optional[str]): the Bugzilla url used in the links
+        """
+        self.bugzilla_url = bugzilla_url or Bugzilla.URL
+        self.__keys = {}
+
+    def __get_key(self, header):
+        # Build clean key from header
+        key = self.__keys.get(header)
+        if key is None:
+            parts = self.NON_WORD_PATTERN.sub(" ", header.lower()).split(" ")[:3]
+            key = self.__keys[header] = "-".join(parts)
+        return key
+
+    def __replace_links(self, line, bug_id):
+        def replace(match):
+            url, bug, attachment, comment = (match.groups() + (None,))[:4]
+            if url is not None:
+                link = output = url
+            elif bug is not None:
+                link = "{}/{}".format(self.bugzilla_url, bug)
+                output = "Bug " + bug
+            elif attachment is not None:
+                link = "{}/attachment.cgi?id={}&action=edit".format(
+                    self.bugzilla_url, attachment
+                )
+                output = "Attachment " + attachment
+            else:
+                link = "{}/show_bug.cgi?id={}#c{}".format(
+                    self.bugzilla_url, bug_id, comment
+                )
+                output = "Comment " + comment
+            return '<a href="{}" target="_blank">{}</a>'.format(link, output)
 
-    def _replace_link(pattern, link, output, line):
-        replacement = '<a href="{}" target="_blank">{}</a>'.format(link, output)
-        return re.sub(pattern, replacement, line, flags=re.IGNORECASE)
+        if bug_id is None:
+            return self.LINK_PATTERN.sub(replace, line)
+        return self.LINK_WITH_COMMENT_PATTERN.sub(replace, line)
 
-    def _parse_line(h, v):
-        # Detect initial http links first
-        v = _replace_link(r"(https?://[\w\.\/_@#-]*)", r"\1", r"\1", v)
+    @staticmethod
+    def __cleanup_lines(lines):
+        text = UpliftCommentRenderer.NON_WORD_PATTERN.sub(" ", "".join(lines))
+        return text.lower().strip()
 
-        # Bug XXX goes to bugzilla
-        v = _replace_link(r"bug (\d+)", r"{}/\1".format(Bugzilla.URL), r"Bug \1", v)
+    def render(self, text, bug_id=None):
+        """Render a raw uplift comment
 
-        # Attachment XXX goes to bugzilla
-        v = _replace_link(
-            r"attachment (\d+)",
-            r"{}/attachment.cgi?id=\1&action=edit".format(Bugzilla.URL),
-            r"Attachment \1",
-            v,
-        )
+        Args:
+            text (str): the comment
+            bug_id (Optional[int]): the bug id, used to link the comments
+
+        Returns:
+            str: the html
+        """
+        no_header = self.NO_HEADER
+        out = collections.OrderedDict()
+
+        # Remove html entities and detect headers
+        header, key = no_header, no_header
+        for line in text.translate(self.HTML_ESCAPE_TABLE).split("\n"):
+            match = self.HEADER_PATTERN.match(line)
+            if match:
+                # Add on a new header
+                header, line = match.groups()
+                key = self.__get_key(header)
+
+            line = self.__replace_links(line, bug_id)
+            if key not in out:
+                out[key] = {"title": header, "lines": [], "risky": False}
+            if line != "":
+                out[key]["lines"].append(line)
+
+        # Detect risks on specific items
+        if "risks-and-why" in out:
+            # If risk is tagged as "medium" or "high"
+            cleaned = self.__cleanup_lines(out["risks-and-why"]["lines"])
+            out["risks-and-why"]["risky"] = cleaned in ("medium", "high")
+
+        if "string-uuid-change" in out:
+            # If the "string/UUID change" is set to anything but "No or None or N/A".
+            cleaned = self.__cleanup_lines(out["string-uuid-change"]["lines"])
+            out["string-uuid-change"]["risky"] = cleaned not in ("no", "none", "n a")
+
+        if "describe-test-coverage" in out:
+            # If test coverage question is empty or No or N/A
+            cleaned = self.__cleanup_lines(out["describe-test-coverage"]["lines"])
+            out["describe-test-coverage"]["risky"] = cleaned in (
+                "",
+                "no",
+                "none",
+                "n a",
+            )
 
-        # Comment XXX goes to bugzilla
-        if bug_id is not None:
-            v = _replace_link(
-                r"comment (\d+)",
-                r"{}/show_bug.cgi?id={}#c\1".format(Bugzilla.URL, bug_id),
-                r"Comment \1",
-                v,
+        # Build complete html output
+        html = []
+        for key, p in out.items():
+            css_classes = key + " risky" if p["risky"] else key
+            if key != no_header:
+                html.append('<h1 class="{}">{}</h1>'.format(css_classes, p["title"]))
+            html.append(
+                '<div class="{}">{}</div>'.format(
+                    css_classes, "<br />".join(p["lines"])
+                )
             )
 
-        # Add to output structure
-        if h == no_header:
-            key = no_header
-        else:
-            # Build clean key from header
-            parts = re.sub(r"[^\w]+", " ", h.lower()).split(" ")[:3]
-            key = "-".join(parts)
-
-        if key not in out:
-            out[key] = {"title": h, "lines": [], "risky": False}
-        if v != "":
-            out[key]["lines"].append(v)
-
-    # Remove html entities
-    html_escape_table = {
-        "&": "&amp;",
-        '"': "&quot;",
-        "'": "&apos;",
-        ">": "&gt;",
-        "<": "&lt;",
-    }
-    text = "".join(html_escape_table.get(c, c) for c in text)
-    lines = text.split("\n")
+        return "".join(html)
 
-    # Build headers
-    header_regex = r"^\[({})\]:?\s*(.*)".format("|".join(headers))
-    header_regex = re.compile(header_regex, re.IGNORECASE)
+    def render_many(self, comments):
+        """Render a lot of raw uplift comments
 
-    out = collections.OrderedDict()
+        Args:
+            comments (iterable): the comments, each one is either a text or
+                a pair (text, bug_id)
 
-    # Detect headers
-    header = no_header
-    for line in lines:
-        match = header_regex.match(line)
-        if match:
-            # Add on a new header
-            header, post_header = match.groups()
-            _parse_line(header, post_header)
-        else:
-            # Add on last header
-            _parse_line(header, line)
+        Returns:
+            List[str]: the html for each comment
+        """
+        res = []
+        for comment in comments:
+            if isinstance(comment, str):
+                res.append(self.render(comment))
+            else:
+                res.append(self.render(*comment))
+        return res
 
-    def _cleanup_lines(lines):
-        text = re.sub(r"[^\w]+", " ", "".join(lines))
-        return text.lower().strip()
 
-    # Detect risks on specific items
-    if "risks-and-why" in out:
-        # If risk is tagged as "medium" or "high"
-        cleaned = _cleanup_lines(out["risks-and-why"]["lines"])
-        out["risks-and-why"]["risky"] = cleaned in ("medium", "high")
-
-    if "string-uuid-change" in out:
-        # If the "string/UUID change" is set to anything but "No or None or N/A".
-        cleaned = _cleanup_lines(out["string-uuid-change"]["lines"])
-        out["string-uuid-change"]["risky"] = cleaned not in ("no", "none", "n a")
-
-    if "describe-test-coverage" in out:
-        # If test coverage question is empty or No or N/A
-        cleaned = _cleanup_lines(out["describe-test-coverage"]["lines"])
-        out["describe-test-coverage"]["risky"] = cleaned in ("", "no", "none", "n a")
-
-    # Build complete html output
-    html = ""
-    for key, p in out.items():
-        css_classes = [key]
-        if p["risky"]:
-            css_classes.append("risky")
-        if key != no_header:
-            html += '<h1 class="{}">{}</h1>'.format(" ".join(css_classes), p["title"])
-        html += '<div class="{}">{}</div>'.format(
-            " ".join(css_classes), "<br />".join(p["lines"])
-        )
+__uplift_comment_renderer = None
 
-    return html
+
+def parse_uplift_comment(text, bug_id=None):
+    """
+    Parse a raw uplift comment to render
+    links and headers as HTML
+    """
+    global __uplift_comment_renderer
+    renderer = __uplift_comment_renderer
+    if renderer is None or renderer.bugzilla_url != Bugzilla.URL:
+        renderer = __uplift_comment_renderer = UpliftCommentRenderer()
+    return renderer.render(text, bug_id)
@@ -12,7 +12,6 @@ import time
 from functools import cached_property
 from urllib.parse import urlencode, urlparse
 
-import hglib
 import requests
 
 from . import config
@@ -52,6 +51,8 @@ def revision_available(repo, revision):
     """
     Check if a revision is available on a Mercurial repo
     """
+    import hglib
+
     try:
         repo.identify(revision)
         return True
@@ -2,6 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import gzip
+import json
+import os
+import re
+import tempfile
+from collections import deque
+from datetime import timedelta
+from urllib.parse import urlencode
+
 import six
 
 from . import config, utils
@@ -14,6 +23,8 @@ class Socorro(Connection):
     CRASH_STATS_URL = config.get("Socorro", "URL", "https://crash-stats.mozilla.org")
     API_URL = CRASH_STATS_URL + "/api"
     TOKEN = config.get("Socorro", "token", "")
+    # The maximal length of the urls built to query a list of values
+    MAX_URL_LENGTH = 4096
 
     def __init__(self, queries, **kwargs):
         """Constructor
@@ -28,12 +39,43 @@ class Socorro(Connection):
         header["Auth-Token"] = self.get_apikey()
         return header
 
+    @staticmethod
+    def chunks_by_url_length(url, name, values, max_length=None):
+        """Split the values of a query parameter to keep the urls short enough
+
+        Args:
+            url (str): the url of the endpoint
+            name (str): the name of the parameter
+            values (List[str]): the values of the parameter
+            max_length (Optional[int]): the maximal length of an url, by default MAX_URL_LENGTH
+
+        Yields:
+            List[str]: a chunk of the values
+        """
+        max_length = max_length or Socorro.MAX_URL_LENGTH
+        # The url is followed by a '?' and the values are separated by a '&'
+        chunk, length = [], len(url)
+        for value in values:
+            value_length = len(urlencode({name: value})) + 1
+            if chunk and length + value_length > max_length:
+                yield chunk
+                chunk, length = [], len(url)
+            chunk.append(value)
+            length += value_length
+
+        if chunk:
+            yield chunk
+
 
 class SuperSearch(Socorro):
     """SuperSearch: https://crash-stats.mozilla.org/api/#SuperSearch"""
 
     URL = Socorro.API_URL + "/SuperSearch/"
     WEB_URL = Socorro.CRASH_STATS_URL + "/search/"
+    PAGE_SIZE = 1000
+    MAX_PAGES = 4
+    # The default value of _facets_size
+    FACETS_SIZE = 50
 
     def __init__(
         self, params=None, handler=None, handlerdata=None, queries=None, **kwargs
@@ -96,6 +138,87 @@ class SuperSearch(Socorro):
     def get_link(params):
         return utils.get_url(SuperSearch.WEB_URL) + utils.get_params_for_url(params)
 
+    @staticmethod
+    def default_handler(json, data):
+        """Default handler
+
+        Args:
+            json (dict): json
+            data (dict): dictionary to update with data
+        """
+        data.update(json)
+
+    @staticmethod
+    def __page_handler(json, data):
+        pages, offset = data
+        pages[offset] = json
+
+    @classmethod
+    def iter_hits(cls, params, columns=None, page_size=None, max_pages=None, **kwargs):
+        """Iterate over all the hits of a query
+
+        The first page gives the total number of hits, then the other pages are
+        retrieved concurrently and the hits are yielded in order as soon as their
+        page is there.
+
+        Args:
+            params (dict): the params for the query, _results_offset and
+                _results_number (if any) give the range of the hits to get
+            columns (Optional[List[str]]): the columns to get (i.e. _columns)
+            page_size (Optional[int]): the number of hits in a page
+            max_pages (Optional[int]): the maximal number of pages retrieved at the same time
+
+        Yields:
+            dict: the hits
+        """
+        params = dict(params)
+        if columns is not None:
+            params["_columns"] = columns
+        page_size = page_size or cls.PAGE_SIZE
+        max_pages = max_pages or cls.MAX_PAGES
+        start = int(params.pop("_results_offset", 0))
+        number = params.pop("_results_number", None)
+        first_size = page_size if number is None else min(page_size, int(number))
+
+        pages = {}
+        connection = cls(
+            params=dict(params, _results_offset=start, _results_number=first_size),
+            handler=cls.__page_handler,
+            handlerdata=(pages, start),
+            **kwargs
+        )
+        connection.wait()
+        # the responses contain the pages, so they're not kept once handled
+        connection.results.clear()
+        page = pages.pop(start)
+        end = page["total"]
+        if number is not None:
+            end = min(end, start + int(number))
+
+        for hit in page["hits"]:
+            yield hit
+
+        offsets = deque(range(start + first_size, end, page_size))
+        futures = deque()
+        while offsets or futures:
+            while offsets and len(futures) < max_pages:
+                offset = offsets.popleft()
+                page_params = dict(
+                    params,
+                    _results_offset=offset,
+                    _results_number=min(page_size, end - offset),
+                )
+                connection.exec_queries(
+                    Query(cls.URL, page_params, cls.__page_handler, (pages, offset))
+                )
+                futures.append((offset, connection.results[-1]))
+
+            offset, future = futures.popleft()
+            future.result()
+            connection.results.remove(future)
+            for hit in pages.pop(offset)["hits"]:
+                yield hit
+
     @staticmethod
     def get_search_date(start, end=None):
         """Get a search date list for [start, end[ (end can be in the future)
@@ -121,6 +244,127 @@ class SuperSearch(Socorro):
 
         return search_date
 
+    @classmethod
+    def get_sharded(cls, params, start, end=None, days=1, **kwargs):
+        """Run a facets query over a date range as several smaller queries
+
+        The range [start, end[ is split in shards of some days, the queries for
+        the shards are run concurrently and their results are merged
+        (see merge_results).
+
+        Args:
+            params (dict): the params for the query (without the date)
+            start (str): start date in 'YYYY-mm-dd' format or 'today'
+            end (Optional[str]): end date in 'YYYY-mm-dd' format or 'today',
+                by default the shards go until today (included)
+            days (Optional[int]): the number of days in a shard
+
+        Returns:
+            dict: the merged results
+        """
+        _start = utils.get_date_ymd(start)
+        _end = utils.get_date_ymd(end or "tomorrow")
+        results = []
+        queries = []
+        while _start < _end:
+            shard_end = min(_start + timedelta(days), _end)
+            result = {}
+            results.append(result)
+            date = cls.get_search_date(
+                utils.get_date_str(_start), utils.get_date_str(shard_end)
+            )
+            queries.append(
+                Query(cls.URL, dict(params, date=date), cls.default_handler, result)
+            )
+            _start = shard_end
+
+        if queries:
+            cls(queries=queries, **kwargs).wait()
+
+        facets_size = params.get("_facets_size", cls.FACETS_SIZE)
+        merged = SuperSearch.merge_results(results, facets_size=facets_size)
+        if "_results_number" in params:
+            merged["hits"] = merged["hits"][: int(params["_results_number"])]
+        return merged
+
+    @staticmethod
+    def merge_results(results, facets_size=FACETS_SIZE):
+        """Merge the results of some queries on different date ranges
+
+        The totals are summed, the hits are concatenated and the facets are merged:
+         - the counts of the terms are summed, then the terms are sorted by count and
+           only the facets_size first ones are kept. Since each query only returns its
+           facets_size first terms, the counts of the less frequent terms can be underestimated;
+         - the histograms are merged in the same way but they're sorted by term and not truncated;
+         - the cardinalities are summed, so the result is an upper bound: the values
+           appearing in several date ranges are counted several times.
+
+        Args:
+            results (List[dict]): the results of the queries
+            facets_size (Optional[int]): the maximal number of terms in a facet
+
+        Returns:
+            dict: the merged results, with the same shape as the result of a query
+        """
+        merged = {"hits": [], "total": 0, "facets": {}, "errors": []}
+        for result in results:
+            merged["hits"] += result.get("hits", [])
+            merged["total"] += result.get("total", 0)
+            merged["errors"] += result.get("errors", [])
+        merged["facets"] = SuperSearch.__merge_facets(
+            [result.get("facets", {}) for result in results], facets_size
+        )
+        return merged
+
+    @staticmethod
+    def __merge_facets(facets_list, facets_size):
+        by_name = {}
+        for facets in facets_list:
+            for name, facet in facets.items():
+                by_name.setdefault(name, []).append(facet)
+
+        merged = {}
+        for name, facets in by_name.items():
+            if isinstance(facets[0], dict) and "value" in facets[0]:
+                # a cardinality
+                merged[name] = {"value": sum(facet["value"] for facet in facets)}
+            elif isinstance(facets[0], list):
+                merged[name] = SuperSearch.__merge_terms(
+                    facets, facets_size, name.startswith("histogram_")
+                )
+            else:
+                merged[name] = facets[0]
+
+        return merged
+
+    @staticmethod
+    def __merge_terms(facets, facets_size, histogram):
+        terms = {}
+        for facet in facets:
+            for item in facet:
+                term = terms.get(item["term"])
+                if term is None:
+                    term = terms[item["term"]] = {"count": 0, "facets": []}
+                term["count"] += item["count"]
+                if "facets" in item:
+                    term["facets"].append(item["facets"])
+
+        merged = []
+        for term, data in terms.items():
+            item = {"term": term, "count": data["count"]}
+            if data["facets"]:
+                item["facets"] = SuperSearch.__merge_facets(data["facets"], facets_size)
+            merged.append(item)
+
+        if histogram:
+            merged.sort(key=lambda item: item["term"])
+        else:
+            merged.sort(key=lambda item: (-item["count"], item["term"]))
+            if facets_size is not None:
+                merged = merged[:facets_size]
+
+        return merged
+
 
 class SuperSearchUnredacted(SuperSearch):
     """SuperSearchUnredacted: https://crash-stats.mozilla.org/api/#SuperSearchUnredacted"""
@@ -132,6 +376,10 @@ class ProcessedCrash(Socorro):
     """ProcessedCrash: https://crash-stats.mozilla.org/api/#ProcessedCrash"""
 
     URL = Socorro.API_URL + "/ProcessedCrash/"
+    # The processed crashes never change, so they can be kept forever on disk
+    CACHE_DIRECTORY = config.get("Socorro", "ProcessedCrashCache", "")
+    MAX_PENDING = 16
+    CRASH_ID_PATTERN = re.compile(r"^[0-9a-f-]+$")
 
     def __init__(
         self, params=None, handler=None, handlerdata=None, queries=None, **kwargs
@@ -201,6 +449,133 @@ class ProcessedCrash(Socorro):
 
         return data
 
+    @staticmethod
+    def project(crash, fields):
+        """Keep only some fields of a processed crash
+
+        Args:
+            crash (dict): the processed crash
+            fields (List[str]|function): the fields to keep or a function returning
+                the projected crash. A field is a dotted path (e.g. 'json_dump.crashing_thread')
+                which is applied on each element of the lists it goes through
+                (e.g. 'json_dump.threads.frames.function').
+
+        Returns:
+            the projected crash
+        """
+        if fields is None:
+            return crash
+        if callable(fields):
+            return fields(crash)
+
+        res = {}
+        for field in fields:
+            ProcessedCrash.__project(crash, field.split("."), res)
+        return res
+
+    @staticmethod
+    def __project(value, path, res):
+        key, path = path[0], path[1:]
+        if key not in value:
+            return
+
+        value = value[key]
+        if not path:
+            res[key] = value
+        elif isinstance(value, dict):
+            ProcessedCrash.__project(value, path, res.setdefault(key, {}))
+        elif isinstance(value, list):
+            projected = res.setdefault(key, [{} for _ in value])
+            for element, projected_element in zip(value, projected):
+                if isinstance(element, dict):
+                    ProcessedCrash.__project(element, path, projected_element)
+
+    @staticmethod
+    def __get_cache_path(directory, crashid):
+        if not directory or not ProcessedCrash.CRASH_ID_PATTERN.match(crashid):
+            return None
+        return os.path.join(directory, crashid[:2], crashid + ".json.gz")
+
+    @staticmethod
+    def __save(path, crash):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with gzip.open(os.fdopen(fd, "wb"), "wt") as f:
+                json.dump(crash, f)
+            os.replace(tmp, path)
+        except Exception:
+            os.remove(tmp)
+            raise
+
+    @staticmethod
+    def iter_processed(
+        crashids, fields=None, max_pending=None, directory=None, **kwargs
+    ):
+        """Iterate over some processed crashes
+
+        The crashes are read from the disk cache when they're there, else they're
+        retrieved (with at most max_pending requests at the same time) and saved
+        in the cache. Only the projection of a crash (see project) is kept in memory.
+
+        Args:
+            crashids (iterable): the crash ids
+            fields (Optional[List[str]|function]): the fields to keep (see project)
+            max_pending (Optional[int]): the maximal number of crashes retrieved and
+                not yet yielded
+            directory (Optional[str]): the cache directory, by default CACHE_DIRECTORY
+
+        Yields:
+            (str, dict): the crash id and the projected crash
+        """
+        if directory is None:
+            directory = ProcessedCrash.CACHE_DIRECTORY
+        max_pending = max_pending or ProcessedCrash.MAX_PENDING
+        crashids = iter(crashids)
+
+        def handler(crash, data):
+            path, result = data
+            if path:
+                ProcessedCrash.__save(path, crash)
+            result.append(ProcessedCrash.project(crash, fields))
+
+        pending = deque()
+        connection = None
+        while True:
+            for crashid in crashids:
+                path = ProcessedCrash.__get_cache_path(directory, crashid)
+                if path and os.path.exists(path):
+                    with gzip.open(path, "rt") as f:
+                        crash = ProcessedCrash.project(json.load(f), fields)
+                    pending.append((crashid, [crash], None))
+                else:
+                    result = []
+                    query = Query(
+                        ProcessedCrash.URL,
+                        {"crash_id": crashid, "datatype": "processed"},
+                        handler,
+                        (path, result),
+                    )
+                    if connection is None:
+                        connection = ProcessedCrash(queries=query, **kwargs)
+                    else:
+                        connection.exec_queries(query)
+                    pending.append((crashid, result, connection.results[-1]))
+
+                if len(pending) >= max_pending:
+                    break
+
+            if not pending:
+                return
+
+            crashid, result, future = pending.popleft()
+            if future is not None:
+                future.result()
+                # the response contains the whole crash, so don't keep it
+                connection.results.remove(future)
+            yield crashid, result[0] if result else None
+
 
 class Bugs(Socorro):
     """Bugs: https://crash-stats.mozilla.org/api/#Bugs"""
@@ -244,19 +619,14 @@ class Bugs(Socorro):
                         data[signature].add(hit["id"])
 
         if isinstance(signatures, six.string_types):
-            data = {signatures: set()}
-            Bugs(
-                params={"signatures": signatures},
-                handler=default_handler,
-                handlerdata=data,
-            ).wait()
-        else:
-            data = {s: set() for s in signatures}
-            queries = []
-            for sgns in Connection.chunks(signatures, 10):
-                queries.append(
-                    Query(Bugs.URL, {"signatures": sgns}, default_handler, data)
-                )
+            signatures = [signatures]
+
+        data = {s: set() for s in signatures}
+        queries = [
+            Query(Bugs.URL, {"signatures": sgns}, default_handler, data)
+            for sgns in Socorro.chunks_by_url_length(Bugs.URL, "signatures", list(data))
+        ]
+        if queries:
             Bugs(queries=queries).wait()
 
         for k, v in data.items():
@@ -302,11 +672,25 @@ class SignatureFirstDate(Socorro):
         def default_handler(json, data):
             data.extend(json["hits"])
 
-        data = []
-        SignatureFirstDate(
-            params={"signatures": signatures},
-            handler=default_handler,
-            handlerdata=data,
-        ).wait()
+        if isinstance(signatures, six.string_types):
+            signatures = [signatures]
+
+        # The chunks are retrieved concurrently but merged in their order
+        results = []
+        queries = []
+        for sgns in Socorro.chunks_by_url_length(
+            SignatureFirstDate.URL, "signatures", signatures
+        ):
+            results.append([])
+            queries.append(
+                Query(
+                    SignatureFirstDate.URL,
+                    {"signatures": sgns},
+                    default_handler,
+                    results[-1],
+                )
+            )
+        if queries:
+            SignatureFirstDate(queries=queries).wait()
 
-        return data
+        return [hit for result in results for hit in result]
@@ -9,12 +9,12 @@ import os.path
 import random
 from datetime import date, datetime, timedelta, timezone
 from itertools import count
+from urllib.parse import quote
 
 import dateutil.parser
 import pytz
 import six
 from dateutil.relativedelta import relativedelta
-from requests.utils import quote
 
 __pacific = pytz.timezone("US/Pacific")
 
@@ -2,15 +2,21 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import bisect
+import json
+import logging
+import os
 import re
-from datetime import timedelta
-from os.path import commonprefix
+import threading
+import time
+from datetime import datetime
 
 import requests
-from icalendar import Calendar
 
 from . import config, utils
 
+logger = logging.getLogger(__name__)
+
 __versions = None
 __version_dates = None
 __stability_version_dates = None
@@ -27,6 +33,13 @@ URL_STABILITY = (
 
 REGEX_EVENT = re.compile("Firefox ([0-9]+) Release", re.IGNORECASE)
 
+# The data are saved in this directory and they're refreshed (in background)
+# when they're older than CACHE_TTL seconds.
+# In offline mode, only the saved data are used whatever their age.
+CACHE_DIRECTORY = config.get("Versions", "CacheDir", "")
+CACHE_TTL = config.get("Versions", "CacheTTL", 24 * 3600, type=int)
+OFFLINE = config.get("Versions", "Offline", "").lower() in ("1", "true", "yes")
+
 
 def __get_major(v):
     if not v:
@@ -66,6 +79,8 @@ def __getVersions():
 
 
 def __getVersionDates():
+    from icalendar import Calendar
+
     resp = requests.get(
         URL_HISTORY,
         headers={"User-Agent": config.get("User-Agent", "name", required=True)},
@@ -102,6 +117,99 @@ def __getStabilityVersionDates():
     return dict([(v, utils.get_moz_date(d)) for v, d in resp.json().items()])
 
 
+def __dumpDates(data):
+    return {v: d.isoformat() for v, d in data.items()}
+
+
+def __loadDates(data):
+    return {v: utils.as_utc(datetime.fromisoformat(d)) for v, d in data.items()}
+
+
+# name -> (function to get the data, function to convert them in json, function to load them)
+__datasets = {
+    "versions": (__getVersions, None, None),
+    "version_dates": (__getVersionDates, __dumpDates, __loadDates),
+    "stability_version_dates": (__getStabilityVersionDates, __dumpDates, __loadDates),
+}
+__refresh_lock = threading.Lock()
+__refreshes = {}
+
+
+def __getCachePath(name):
+    return os.path.join(CACHE_DIRECTORY, name + ".json")
+
+
+def __fetchDataset(name):
+    fetch, dump, _ = __datasets[name]
+    data = fetch()
+    if CACHE_DIRECTORY:
+        path = __getCachePath(name)
+        os.makedirs(CACHE_DIRECTORY, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(
+                {"timestamp": time.time(), "data": dump(data) if dump else data}, f
+            )
+        os.replace(path + ".tmp", path)
+
+    return data
+
+
+def __refreshDataset(name):
+    try:
+        globals()["__" + name] = __fetchDataset(name)
+    except Exception:
+        logger.exception("Cannot refresh the {} data".format(name))
+    finally:
+        with __refresh_lock:
+            del __refreshes[name]
+
+
+def __getDataset(name):
+    """Get some data from the cache or from the network
+
+    Fresh saved data are used as is, stale ones are used while they're refreshed
+    in background and missing ones are retrieved (unless we're offline).
+
+    Args:
+        name (str): the name of the data
+
+    Returns:
+        dict: the data
+    """
+    if CACHE_DIRECTORY:
+        try:
+            with open(__getCachePath(name)) as f:
+                saved = json.load(f)
+        except (IOError, ValueError):
+            saved = None
+
+        if saved is not None:
+            load = __datasets[name][2]
+            data = load(saved["data"]) if load else saved["data"]
+            if not OFFLINE and time.time() - saved["timestamp"] > CACHE_TTL:
+                with __refresh_lock:
+                    if name not in __refreshes:
+                        thread = threading.Thread(
+                            target=__refreshDataset, args=(name,), daemon=True
+                        )
+                        __refreshes[name] = thread
+                        thread.start()
+            return data
+
+    if OFFLINE:
+        raise Exception("No saved {} data in offline mode".format(name))
+
+    return __fetchDataset(name)
+
+
+def wait_refresh():
+    """Wait for the refreshes running in background"""
+    with __refresh_lock:
+        threads = list(__refreshes.values())
+    for thread in threads:
+        thread.join()
+
+
 def get(base=False):
     """Get current version number by channel
 
@@ -110,7 +218,7 @@ def get(base=False):
     """
     global __versions
     if not __versions:
-        __versions = __getVersions()
+        __versions = __getDataset("versions")
 
     if base:
         res = {}
@@ -121,75 +229,135 @@ def get(base=False):
     return __versions
 
 
-def __getMatchingVersion(version, versions_dates):
-    date = None
-    longest_match = []
-    longest_match_v = None
-    for v, d in versions_dates:
-        match = commonprefix([v.split("."), str(version).split(".")])
-        if len(match) > 0 and (
-            len(match) > len(longest_match)
-            or (
-                len(match) == len(longest_match)
-                and int(v[-1]) <= int(longest_match_v[-1])
-            )
-        ):
-            longest_match = match
-            longest_match_v = v
-            date = d
-
-    return date
+class _VersionIndex(object):
+    """Index of the release dates of some versions
 
+    The versions are put in a trie of their components, where each node knows
+    the version to use for the versions matching its components, and the dates
+    are sorted to find the closest release with a bisection.
+    """
 
-def getMajorDate(version):
-    global __version_dates
+    def __init__(self, *versions_dates):
+        """Constructor
+
+        Args:
+            versions_dates (dict): the dates of the versions (several dicts can be given)
+        """
+        self.sources = versions_dates
+        self.trie = {"children": {}, "match": None}
+        entries = []
+        items = (item for source in versions_dates for item in source.items())
+        for order, (v, d) in enumerate(items):
+            node = self.trie
+            for component in v.split("."):
+                children = node["children"]
+                node = children.get(component)
+                if node is None:
+                    node = children[component] = {"children": {}, "match": None}
+                # On a tie, the last version with the smallest last digit wins
+                match = node["match"]
+                if match is None or int(v[-1]) <= int(match[0][-1]):
+                    node["match"] = (v, d)
+            entries.append((d, order, v))
+
+        entries.sort(key=lambda e: e[:2])
+        self.entries = entries
+        self.dates = [e[0] for e in entries]
+
+    def is_built_from(self, *versions_dates):
+        return len(self.sources) == len(versions_dates) and all(
+            a is b for a, b in zip(self.sources, versions_dates)
+        )
+
+    def get_date(self, version):
+        """Get the date of the version having the longest common prefix with a version
+
+        Args:
+            version (str): the version
+
+        Returns:
+            datetime: the date or None if no version matches
+        """
+        match = None
+        node = self.trie
+        for component in str(version).split("."):
+            node = node["children"].get(component)
+            if node is None:
+                break
+            match = node["match"]
+
+        return match[1] if match else None
+
+    def get_closer(self, date, negative=False):
+        """Get the version released at the closest date
+
+        Args:
+            date (datetime): the date
+            negative (Optional[bool]): if False, only the future releases are used
+
+        Returns:
+            tuple: the version and its date
+        """
+        if negative:
+            # the first release at or after the date and the last one before it
+            i = bisect.bisect_left(self.dates, date)
+            candidates = []
+            if i < len(self.entries):
+                candidates.append(self.entries[i])
+            if i > 0:
+                j = bisect.bisect_left(self.dates, self.dates[i - 1])
+                candidates.append(self.entries[j])
+            if not candidates:
+                raise Exception("No future release found")
+            d, _, v = min(candidates, key=lambda e: (abs(e[0] - date), e[1]))
+        else:
+            i = bisect.bisect_right(self.dates, date)
+            if i == len(self.entries):
+                raise Exception("No future release found")
+            d, _, v = self.entries[i]
+
+        return v, d
+
+
+__major_index = None
+__index = None
+
+
+def __getMajorIndex():
+    global __version_dates, __major_index
     if not __version_dates:
-        __version_dates = __getVersionDates()
+        __version_dates = __getDataset("version_dates")
+    if __major_index is None or not __major_index.is_built_from(__version_dates):
+        __major_index = _VersionIndex(__version_dates)
 
-    return __getMatchingVersion(version, __version_dates.items())
+    return __major_index
 
 
-def getDate(version):
-    global __version_dates, __stability_version_dates
+def __getIndex():
+    global __version_dates, __stability_version_dates, __index
     if not __version_dates:
-        __version_dates = __getVersionDates()
+        __version_dates = __getDataset("version_dates")
     if not __stability_version_dates:
-        __stability_version_dates = __getStabilityVersionDates()
+        __stability_version_dates = __getDataset("stability_version_dates")
+    if __index is None or not __index.is_built_from(
+        __version_dates, __stability_version_dates
+    ):
+        __index = _VersionIndex(__version_dates, __stability_version_dates)
 
-    return __getMatchingVersion(
-        version, list(__version_dates.items()) + list(__stability_version_dates.items())
-    )
+    return __index
 
 
-def __getCloserDate(date, versions_dates, negative=False):
-    def diff(d):
-        return d - date
+def getMajorDate(version):
+    return __getMajorIndex().get_date(version)
 
-    future_dates = [
-        (v, d) for v, d in versions_dates if negative or diff(d) > timedelta(0)
-    ]
-    if not future_dates:
-        raise Exception("No future release found")
-    return min(future_dates, key=lambda i: abs(diff(i[1])))
 
+def getDate(version):
+    return __getIndex().get_date(version)
 
-def getCloserMajorRelease(date, negative=False):
-    global __version_dates
-    if not __version_dates:
-        __version_dates = __getVersionDates()
 
-    return __getCloserDate(date, __version_dates.items(), negative)
+def getCloserMajorRelease(date, negative=False):
+    return __getMajorIndex().get_closer(date, negative)
 
 
 def getCloserRelease(date, negative=False):
-    global __version_dates, __stability_version_dates
-    if not __version_dates:
-        __version_dates = __getVersionDates()
-    if not __stability_version_dates:
-        __stability_version_dates = __getStabilityVersionDates()
-
-    return __getCloserDate(
-        date,
-        list(__version_dates.items()) + list(__stability_version_dates.items()),
-        negative,
-    )
+    return __getIndex().get_closer(date, negative)
@@ -2,9 +2,13 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import base64
+import io
+import json
 import os
 import re
 import unittest
+from urllib.parse import parse_qs, parse_qsl, urlparse
 
 import responses
 from requests import HTTPError
@@ -1392,5 +1396,137 @@ class LandingPatternTest(unittest.TestCase):
         self.assertEqual(patterns[2][0].pattern, autoland_pattern.pattern)
 
 
+class BugAttachmentDataTest(unittest.TestCase):
+    CONTENT = b"".join(bytes([i % 256]) for i in range(5000))
+
+    def setUp(self):
+        data = base64.b64encode(self.CONTENT).decode("ascii").replace("/", "\\/")
+        responses.add(
+            responses.GET,
+            bugzilla.Bugzilla.ATTACHMENT_API_URL + "/123",
+            body='{"attachments": {"123": {"data": "%s"}}, "bugs": {}}' % data,
+            content_type="application/json",
+        )
+
+    @responses.activate
+    def test_iter_attachment_data(self):
+        for chunk_size in [1, 7, 1024]:
+            chunks = list(
+                bugzilla.Bugzilla.iter_attachment_data(123, chunk_size=chunk_size)
+            )
+            self.assertEqual(b"".join(chunks), self.CONTENT)
+
+    @responses.activate
+    def test_get_attachment_data(self):
+        self.assertEqual(bugzilla.Bugzilla.get_attachment_data(123), self.CONTENT)
+        self.assertEqual(
+            bugzilla.Bugzilla.get_attachment_data(123, max_size=100),
+            self.CONTENT[:100],
+        )
+
+        out = io.BytesIO()
+        size = bugzilla.Bugzilla.get_attachment_data(123, fileobj=out)
+        self.assertEqual(size, len(self.CONTENT))
+        self.assertEqual(out.getvalue(), self.CONTENT)
+
+    @responses.activate
+    def test_get_attachments_data(self):
+        responses.add(
+            responses.GET,
+            bugzilla.Bugzilla.ATTACHMENT_API_URL + "/456",
+            body='{"attachments": {"456": {"data": "Zm9v"}}, "bugs": {}}',
+            content_type="application/json",
+        )
+        self.assertEqual(
+            bugzilla.Bugzilla.get_attachments_data([123, 456]),
+            {123: self.CONTENT, 456: b"foo"},
+        )
+        self.assertEqual(
+            bugzilla.Bugzilla.get_attachments_data([123, 456], max_size=2),
+            {123: self.CONTENT[:2], 456: b"fo"},
+        )
+        self.assertEqual(bugzilla.Bugzilla.get_attachments_data([]), {})
+
+
+class BugSearchWindowsTest(unittest.TestCase):
+    BUGS = [
+        {"id": i, "creation_time": "2020-01-%02dT%02d:00:00Z" % (1 + i // 24, i % 24)}
+        for i in range(1, 700)
+    ]
+
+    def request_callback(self, request):
+        params = dict(parse_qsl(urlparse(request.url).query))
+        bugs = self.BUGS
+        for n in range(1, 10):
+            if params.get("f%d" % n) != "creation_ts":
+                continue
+            value = params["v%d" % n]
+            if params["o%d" % n] == "greaterthaneq":
+                bugs = [b for b in bugs if b["creation_time"] >= value]
+            else:
+                bugs = [b for b in bugs if b["creation_time"] < value]
+
+        if "count_only" in params:
+            self.count_queries += 1
+            return (200, {}, json.dumps({"bug_count": len(bugs)}))
+
+        self.include_fields.append(
+            parse_qs(urlparse(request.url).query)["include_fields"]
+        )
+        offset = int(params["offset"])
+        limit = int(params["limit"])
+        return (200, {}, json.dumps({"bugs": bugs[offset : offset + limit]}))
+
+    @responses.activate
+    def test_search_by_time_windows(self):
+        self.count_queries = 0
+        self.include_fields = []
+        responses.add_callback(
+            responses.GET,
+            re.compile("^" + re.escape(bugzilla.Bugzilla.API_URL)),
+            callback=self.request_callback,
+            content_type="application/json",
+        )
+
+        bugs = {}
+
+        def bughandler(bug, data):
+            self.assertNotIn(bug["id"], data)
+            data[bug["id"]] = bug
+
+        bugzilla.Bugzilla.search_by_time_windows(
+            {"product": "Core"},
+            "2020-01-01",
+            "2020-02-01",
+            bughandler=bughandler,
+            bugdata=bugs,
+            max_count=150,
+        )
+
+        self.assertEqual(sorted(bugs.keys()), list(range(1, 700)))
+        self.assertGreater(self.count_queries, 1)
+        self.assertEqual(self.include_fields[0], ["_default"])
+
+        # The include fields are sent with each page
+        self.include_fields = []
+        bugzilla.Bugzilla.search_by_time_windows(
+            {"product": "Core"},
+            "2020-01-01",
+            "2020-02-01",
+            include_fields=["creation_time"],
+            bughandler=lambda bug: None,
+            max_count=150,
+        )
+        self.assertGreater(len(self.include_fields), 1)
+        for include_fields in self.include_fields:
+            self.assertEqual(include_fields, ["creation_time", "id"])
+
+    def test_search_windows_bad_field(self):
+        with self.assertRaises(Exception):
+            bugzilla.Bugzilla.get_search_windows(
+                {"product": "Core"}, "2020-01-01", field="cf_last_resolved"
+            )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,6 +2,10 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import unittest
+from urllib.parse import parse_qs, urlparse
+
 import responses
 
 from libmozdata import clouseau
@@ -21,3 +25,43 @@ class ReportsTest(MockTestCase):
         res = clouseau.Reports.get_by_signatures(signatures)
 
         self.assertEqual(res.keys(), signatures)
+
+
+class ReportsBatchTest(unittest.TestCase):
+    def callback(self, request):
+        params = parse_qs(urlparse(request.url).query)
+        self.assertEqual(params["product"], ["Firefox"])
+        self.assertLessEqual(len(params["signatures"]), clouseau.Reports.BATCH_SIZE)
+        reports = [
+            {"signature": signature, "uuid": "%s-%d" % (signature, i)}
+            for signature in params["signatures"]
+            for i in range(2)
+        ]
+        return (200, {}, json.dumps(reports))
+
+    @responses.activate
+    def test_get_by_signatures(self):
+        responses.add_callback(
+            responses.GET,
+            clouseau.Reports.API_URL,
+            callback=self.callback,
+            content_type="application/json",
+        )
+        signatures = ["signature%d" % i for i in range(45)]
+
+        res = clouseau.Reports.get_by_signatures(
+            signatures, product="Firefox", max_workers=2
+        )
+
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(
+            res,
+            {
+                signature: [
+                    {"signature": signature, "uuid": "%s-%d" % (signature, i)}
+                    for i in range(2)
+                ]
+                for signature in signatures
+            },
+        )
+        self.assertEqual(clouseau.Reports.get_by_signatures([]), {})
@@ -0,0 +1,66 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import unittest
+
+import responses
+
+from libmozdata import bugzilla
+from libmozdata.comments import CommentCorpus
+from tests.auto_mock import MockTestCase
+
+
+class CommentCorpusTest(unittest.TestCase):
+    def get_comments(self, bugid, n):
+        return [
+            {
+                "id": bugid * 100 + i,
+                "author": "user%d@mozilla.com" % (i % 3),
+                "creation_time": "2020-01-0%dT00:00:00Z" % (1 + i % 2),
+                "text": "Comment %d on bug %d: %s" % (i, bugid, "é" * i),
+            }
+            for i in range(n)
+        ]
+
+    def test_corpus(self):
+        corpus = CommentCorpus(block_size=64, compression="zlib")
+        for bugid in range(1, 20):
+            corpus({"comments": self.get_comments(bugid, bugid)}, str(bugid))
+
+        self.assertEqual(len(corpus), sum(range(1, 20)))
+        self.assertIn(5, corpus)
+        self.assertNotIn(20, corpus)
+        self.assertEqual(corpus.count(7), 7)
+        self.assertEqual(corpus.count(20), 0)
+
+        for bugid in [19, 1, 12]:
+            comments = self.get_comments(bugid, bugid)
+            self.assertEqual(corpus.get(bugid, bugid - 1), comments[-1])
+            self.assertEqual(corpus.get_comments(bugid), comments)
+
+        seen = 0
+        for bugid, index, comment in corpus.iter_comments():
+            self.assertEqual(comment, self.get_comments(int(bugid), index + 1)[index])
+            seen += 1
+        self.assertEqual(seen, len(corpus))
+
+    def test_bad_compression(self):
+        with self.assertRaises(Exception):
+            CommentCorpus(compression="lzma")
+
+
+class CommentCorpusBugzillaTest(MockTestCase):
+    mock_urls = [bugzilla.Bugzilla.URL]
+
+    @responses.activate
+    def test_commenthandler(self):
+        corpus = CommentCorpus()
+        bugzilla.Bugzilla(12345, commenthandler=corpus).get_data().wait()
+
+        self.assertEqual(corpus.count(12345), 19)
+        self.assertTrue(corpus.get(12345, 0)["text"].startswith("Steps to reproduce"))
+
+
+if __name__ == "__main__":
+    unittest.main()
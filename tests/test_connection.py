@@ -4,7 +4,7 @@
 
 import unittest
 
-from libmozdata.connection import Query
+from libmozdata.connection import Connection, Query
 
 
 class QueryTest(unittest.TestCase):
@@ -34,3 +34,10 @@ class QueryTest(unittest.TestCase):
             representation,
             "url: https://www.mozilla.org/?var1=True\nurl: https://www.mozilla.org/?var2=marco",
         )
+
+
+class ConnectionTest(unittest.TestCase):
+    def test_max_workers(self):
+        connection = Connection("https://www.mozilla.org/", max_workers=3)
+        self.assertEqual(connection.MAX_WORKERS, 3)
+        self.assertEqual(connection.session.executor._max_workers, 3)
@@ -2,12 +2,18 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import re
+import shutil
+import tempfile
+import threading
 import unittest
+from urllib.parse import parse_qsl, urlparse
 
 import responses
 
 from libmozdata import utils
-from libmozdata.HGFileInfo import HGFileInfo
+from libmozdata.HGFileInfo import HGFileInfo, HGFileInfoCache
 from libmozdata.hgmozilla import Mercurial
 from tests.auto_mock import MockTestCase
 
@@ -183,6 +189,23 @@ class HGFileInfoTest(MockTestCase):
         self.assertEqual(fi["patches"][0]["user"], "philringnalda@gmail.com")
         self.assertEqual(fi["patches"][1]["user"], "hg@mozilla.com")
 
+    @responses.activate
+    def test_hgfileinfo_index(self):
+        path = "netwerk/protocol/http/nsHttpConnectionMgr.cpp"
+        hi = HGFileInfo(path)
+        utc_ts_from = utils.get_timestamp("2015-01-01")
+        fi = hi.get(path, utc_ts_from)
+        dates = [patch["pushdate"][0] for patch in fi["patches"]]
+        self.assertTrue(all(d >= utc_ts_from for d in dates))
+
+        for author, info in fi["authors"].items():
+            fi_author = hi.get(path, utc_ts_from, authors=[author])
+            self.assertEqual(fi_author["authors"], {author: info})
+            self.assertEqual(
+                fi_author["patches"],
+                [p for p in fi["patches"] if p["user"] == author],
+            )
+
     @responses.activate
     def test_hgfileinfo_multiple(self):
         path1 = "netwerk/protocol/http/nsHttpConnectionMgr.cpp"
@@ -201,5 +224,225 @@ class HGFileInfoTest(MockTestCase):
         self.assertIsNotNone(fi2["bugs"])
 
 
+class HGFileInfoParallelTest(unittest.TestCase):
+    @responses.activate
+    def test_hgfileinfo_parallel(self):
+        # a lot of changes in 2012 to force the split of a window
+        dates = [utils.get_timestamp("2012-01-01") + i * 3600 for i in range(5000)]
+        dates += [utils.get_timestamp("2013-01-01") + i * 86400 for i in range(1000)]
+        entries = [
+            {
+                "node": "%040x" % i,
+                "user": "Author %d <author%d@mozilla.com>" % (i % 5, i % 5),
+                "desc": "Bug %d - Change r=reviewer" % i,
+                "date": [d, 0],
+                "pushdate": [d + 60, 0],
+                "pushid": i,
+            }
+            for i, d in enumerate(dates)
+        ]
+        # commits with a wrong date, pushed after the other ones
+        for d in [-86400 * 365, utils.get_timestamp("2200-01-01")]:
+            i = len(entries)
+            entries.append(
+                {
+                    "node": "%040x" % i,
+                    "user": "Author 1 <author1@mozilla.com>",
+                    "desc": "Bug %d - Change r=reviewer" % i,
+                    "date": [d, 0],
+                    "pushdate": [entries[-1]["pushdate"][0] + 60, 0],
+                    "pushid": i,
+                }
+            )
+        date_pattern = re.compile(
+            r'date\("(?:<([0-9-]+)|>([0-9-]+)|([0-9-]+) to ([0-9-]+))"\)'
+        )
+
+        def request_callback(request):
+            params = dict(parse_qsl(urlparse(request.url).query))
+            self.assertTrue(params["rev"].startswith('filelog("LICENSE") and '))
+            m = date_pattern.search(params["rev"])
+            if m.group(1):
+                ts_from = float("-inf")
+                ts_to = utils.get_timestamp(m.group(1)) + 86400
+            elif m.group(2):
+                ts_from = utils.get_timestamp(m.group(2))
+                ts_to = float("inf")
+            else:
+                ts_from = utils.get_timestamp(m.group(3))
+                ts_to = utils.get_timestamp(m.group(4)) + 86400
+            res = [e for e in entries if ts_from <= e["date"][0] < ts_to]
+            res = res[::-1][: int(params["revcount"])]
+            return (200, {}, json.dumps({"entries": res}))
+
+        responses.add_callback(
+            responses.GET,
+            re.compile(
+                "^" + re.escape(Mercurial.get_repo_url("nightly") + "/json-log")
+            ),
+            callback=request_callback,
+            content_type="application/json",
+        )
+
+        path = "LICENSE"
+        hi = HGFileInfo(path, parallel=True)
+        fi = hi.get(path, utc_ts_to=entries[-1]["pushdate"][0])
+        self.assertEqual(
+            [p["pushid"] for p in fi["patches"]], list(range(6001, -1, -1))
+        )
+        self.assertEqual(fi["authors"]["author1@mozilla.com"]["count"], 1202)
+
+    @responses.activate
+    def test_hgfileinfo_parallel_escape(self):
+        revsets = []
+
+        def request_callback(request):
+            params = dict(parse_qsl(urlparse(request.url).query))
+            revsets.append(params["rev"])
+            return (200, {}, json.dumps({"entries": []}))
+
+        responses.add_callback(
+            responses.GET,
+            re.compile(
+                "^" + re.escape(Mercurial.get_repo_url("nightly") + "/json-log")
+            ),
+            callback=request_callback,
+            content_type="application/json",
+        )
+
+        path = 'dir\\a "b".txt'
+        hi = HGFileInfo(path, parallel=True)
+        self.assertEqual(hi.get(path)["patches"], [])
+        self.assertTrue(revsets)
+        for revset in revsets:
+            self.assertTrue(revset.startswith('filelog("dir\\\\a \\"b\\".txt") and '))
+
+
+class HGFileInfoCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        Mercurial.cache.clear()
+        self.entries = [
+            {
+                "node": "%040x" % i,
+                "user": "Author <author%d@mozilla.com>" % (i % 3),
+                "desc": "Bug %d - Change r=reviewer" % i,
+                "date": [1000000 + i, 0],
+                "pushdate": [1000060 + i, 0],
+                "pushid": i,
+            }
+            for i in range(300)
+        ]
+        self.head = 200
+        self.requests = []
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+        Mercurial.cache.clear()
+
+    def get_revision(self, request):
+        return (200, {}, json.dumps(self.entries[self.head - 1]))
+
+    def get_filelog(self, request):
+        params = dict(parse_qsl(urlparse(request.url).query))
+        self.requests.append(params)
+        if params["node"] == "default":
+            start = self.head
+        else:
+            start = int(params["node"], 16) + 1
+        res = self.entries[:start][::-1][: int(params["revcount"])]
+        return (200, {}, json.dumps({"entries": res}))
+
+    def add_callbacks(self):
+        for endpoint, callback in [
+            ("json-rev", self.get_revision),
+            ("json-filelog", self.get_filelog),
+        ]:
+            responses.add_callback(
+                responses.GET,
+                Mercurial.get_repo_url("nightly") + "/" + endpoint,
+                callback=callback,
+                content_type="application/json",
+            )
+
+    @responses.activate
+    def test_lru(self):
+        self.add_callbacks()
+        cache = HGFileInfoCache(max_size=2)
+        hi = cache.get("a")
+        for path in ["a", "b", "a", "c"]:
+            cache.get(path).wait()
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(len(self.requests), 3)
+
+        self.assertIs(cache.get("a"), hi)
+        cache.get("b").wait()
+        self.assertEqual(len(self.requests), 4)
+
+    @responses.activate
+    def test_disk(self):
+        self.add_callbacks()
+        fi = HGFileInfoCache(directory=self.tmpdir).get("a").get("a", utc_ts_to=2e6)
+        self.assertEqual(len(fi["patches"]), 200)
+        self.assertEqual(len(self.requests), 1)
+
+        # a new process with the same head doesn't retrieve anything
+        Mercurial.cache.clear()
+        fi = HGFileInfoCache(directory=self.tmpdir).get("a").get("a", utc_ts_to=2e6)
+        self.assertEqual(len(fi["patches"]), 200)
+        self.assertEqual(len(self.requests), 1)
+
+        # the head has moved, only the new entries are retrieved
+        self.head = 300
+        Mercurial.cache.clear()
+        fi = HGFileInfoCache(directory=self.tmpdir).get("a").get("a", utc_ts_to=2e6)
+        self.assertEqual([p["pushid"] for p in fi["patches"]], list(range(299, -1, -1)))
+        self.assertEqual(
+            [int(r["revcount"]) for r in self.requests[1:]],
+            [HGFileInfoCache.INCREMENT + 1] * 2,
+        )
+
+    @responses.activate
+    def test_prefetch(self):
+        revisions = []
+        release = threading.Event()
+
+        def get_revision(request):
+            revisions.append(request.url)
+            return self.get_revision(request)
+
+        def get_filelog(request):
+            release.wait(10)
+            return self.get_filelog(request)
+
+        for endpoint, callback in [
+            ("json-rev", get_revision),
+            ("json-filelog", get_filelog),
+        ]:
+            responses.add_callback(
+                responses.GET,
+                Mercurial.get_repo_url("nightly") + "/" + endpoint,
+                callback=callback,
+                content_type="application/json",
+            )
+
+        cache = HGFileInfoCache(directory=self.tmpdir)
+        # the file logs are blocked, so prefetch mustn't wait for them
+        cache.prefetch(["a", "b", "c", "a"])
+        self.assertEqual(self.requests, [])
+        release.set()
+
+        for path in ["a", "b", "c"]:
+            fi = cache.get(path).get(path, utc_ts_to=2e6)
+            self.assertEqual(len(fi["patches"]), 200)
+        self.assertEqual(len(self.requests), 3)
+        self.assertEqual(len(revisions), 1)
+
+        # the file infos are in the cache
+        cache.prefetch(["a"])
+        cache.get("a")
+        self.assertEqual(len(self.requests), 3)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,10 +2,21 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
+from datetime import datetime
+from unittest import mock
+from urllib.parse import parse_qsl, urlparse
+
+import hglib
+import responses
 
 from libmozdata import hgmozilla
 from libmozdata.connection import Query
+from libmozdata.HGFileInfo import HGFileInfo
 
 
 class RevisionTest(unittest.TestCase):
@@ -66,6 +77,157 @@ class RevisionTest(unittest.TestCase):
         self.assertEqual(data1["first"]["node"], data2["node"])
 
 
+class RevisionCacheTest(unittest.TestCase):
+    def setUp(self):
+        hgmozilla.Mercurial.cache.clear()
+
+    def tearDown(self):
+        hgmozilla.Mercurial.cache.clear()
+
+    @responses.activate
+    def test_revision(self):
+        node = "1584ba8c1b86f9c4de5ccda5241cef36e80f042c"
+        responses.add(
+            responses.GET,
+            hgmozilla.Revision.get_url("nightly"),
+            json={"node": node, "desc": "Bug 1234 - Foo", "pushid": 1},
+        )
+
+        rev = hgmozilla.Revision.get_revision("nightly", "default")
+        self.assertEqual(rev["node"], node)
+        rev["desc"] = "modified"
+
+        for channel, n in [("nightly", "default"), ("central", node[:12])]:
+            rev = hgmozilla.Revision.get_revision(channel, n)
+            self.assertEqual(rev["desc"], "Bug 1234 - Foo")
+        self.assertEqual(len(responses.calls), 1)
+
+        # the push data depend on the repository
+        responses.add(
+            responses.GET,
+            hgmozilla.Revision.get_url("beta"),
+            json={"node": node, "desc": "Bug 1234 - Foo", "pushid": 2},
+        )
+        self.assertEqual(hgmozilla.Revision.get_revision("beta", node)["pushid"], 2)
+        self.assertEqual(len(responses.calls), 2)
+
+    @responses.activate
+    def test_revision_push_data(self):
+        node = "1584ba8c1b86f9c4de5ccda5241cef36e80f042c"
+        backout = "2584ba8c1b86f9c4de5ccda5241cef36e80f042c"
+        responses.add(
+            responses.GET,
+            hgmozilla.Revision.get_url("nightly"),
+            json={"node": node, "backedoutby": ""},
+        )
+        responses.add(
+            responses.GET,
+            hgmozilla.Revision.get_url("nightly"),
+            json={"node": node, "backedoutby": backout},
+        )
+
+        self.assertEqual(
+            hgmozilla.Revision.get_revision("nightly", node)["backedoutby"], ""
+        )
+        self.assertEqual(
+            hgmozilla.Revision.get_revision("nightly", node)["backedoutby"], ""
+        )
+        self.assertEqual(len(responses.calls), 1)
+
+        # the backout is seen once the revision is expired
+        hgmozilla.Mercurial.cache.revision_ttl = 0
+        try:
+            rev = hgmozilla.Revision.get_revision("nightly", node)
+        finally:
+            hgmozilla.Mercurial.cache.revision_ttl = (
+                hgmozilla.RevisionCache.REVISION_TTL
+            )
+        self.assertEqual(rev["backedoutby"], backout)
+        self.assertEqual(len(responses.calls), 2)
+
+        # the raw revisions never expire
+        hgmozilla.Mercurial.cache.put_raw_revision(
+            "nightly", node, "# HG changeset patch\n# Node ID %s\n" % node
+        )
+        hgmozilla.Mercurial.cache.revision_ttl = 0
+        try:
+            self.assertIsNotNone(
+                hgmozilla.Mercurial.cache.get_raw_revision("nightly", node)
+            )
+        finally:
+            hgmozilla.Mercurial.cache.revision_ttl = (
+                hgmozilla.RevisionCache.REVISION_TTL
+            )
+
+    @responses.activate
+    def test_revisions(self):
+        def get_revision(request):
+            node = dict(parse_qsl(urlparse(request.url).query))["node"]
+            return (200, {}, json.dumps({"node": node.ljust(40, "0"), "desc": node}))
+
+        for channel in ["nightly", "beta"]:
+            responses.add_callback(
+                responses.GET,
+                hgmozilla.Revision.get_url(channel),
+                callback=get_revision,
+                content_type="application/json",
+            )
+
+        revisions = [("nightly", "%012x" % i) for i in range(10)]
+        revisions += [("beta", "%012x" % i) for i in range(5)] + revisions[:2]
+        revs = hgmozilla.Revision.get_revisions(revisions)
+
+        self.assertEqual(len(revs), 15)
+        self.assertEqual(revs[("beta", "%012x" % 3)]["desc"], "%012x" % 3)
+        self.assertEqual(len(responses.calls), 15)
+
+        hgmozilla.Revision.get_revisions(revisions)
+        self.assertEqual(len(responses.calls), 15)
+
+    @responses.activate
+    def test_raw_revision(self):
+        node = "1584ba8c1b86f9c4de5ccda5241cef36e80f042c"
+        responses.add(
+            responses.GET,
+            hgmozilla.RawRevision.get_url("nightly"),
+            body="# HG changeset patch\n# Node ID %s\n" % node,
+        )
+
+        rev = hgmozilla.RawRevision.get_revision("nightly", node[:12])
+        self.assertIn("# Node ID " + node, rev)
+        for channel in ["nightly", "beta", "release"]:
+            self.assertEqual(hgmozilla.RawRevision.get_revision(channel, node), rev)
+        self.assertEqual(len(responses.calls), 1)
+
+        # a symbolic node is fetched again when it's expired
+        hgmozilla.Mercurial.cache.ttl = 0
+        try:
+            hgmozilla.RawRevision.get_revision("nightly", "default")
+            hgmozilla.RawRevision.get_revision("nightly", "default")
+        finally:
+            hgmozilla.Mercurial.cache.ttl = hgmozilla.RevisionCache.TTL
+        self.assertEqual(len(responses.calls), 3)
+
+    def test_eviction(self):
+        cache = hgmozilla.RevisionCache(max_size=2)
+        nodes = ["a" * 40, "ab" * 20, "c" * 40]
+        for node in nodes:
+            cache.put_revision("nightly", node, {"node": node})
+
+        self.assertIsNone(cache.get_revision("nightly", nodes[0]))
+        self.assertIsNone(cache.get_revision("nightly", nodes[0][:12]))
+        self.assertEqual(
+            cache.get_revision("nightly", nodes[1][:12]), {"node": nodes[1]}
+        )
+        self.assertEqual(
+            cache.get_revision("nightly", nodes[2][:12]), {"node": nodes[2]}
+        )
+
+        # a short hash must be unambiguous
+        cache.put_revision("nightly", "c" * 39 + "d", {"node": "c" * 39 + "d"})
+        self.assertIsNone(cache.get_revision("nightly", nodes[2][:12]))
+
+
 class RawRevisionTest(unittest.TestCase):
     def test_revision(self):
         rev = hgmozilla.RawRevision.get_revision("central", "1584ba8c1b86")
@@ -110,6 +272,107 @@ class RawRevisionTest(unittest.TestCase):
         )
 
 
+class PushlogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def get_pushes(self, request):
+        params = dict(parse_qsl(urlparse(request.url).query))
+        self.assertEqual(params["version"], "2")
+        if "startdate" in params:
+            self.assertEqual(params["startdate"], "2020-01-01 00:00:00 +0000")
+            ids = range(11, 21)
+        elif "startID" in params:
+            ids = range(int(params["startID"]) + 1, int(params["endID"]) + 1)
+        else:
+            ids = range(41, 51)
+
+        pushes = {}
+        for i in ids:
+            node = "%040x" % i
+            if "full" in params:
+                changesets = [{"node": node, "desc": "Bug %d" % i}]
+            else:
+                changesets = [node]
+            pushes[str(i)] = {"changesets": changesets, "date": i, "user": "a@b.c"}
+
+        return (200, {}, json.dumps({"lastpushid": 50, "pushes": pushes}))
+
+    def add_callback(self):
+        responses.add_callback(
+            responses.GET,
+            hgmozilla.Pushlog.get_url("nightly"),
+            callback=self.get_pushes,
+            content_type="application/json",
+        )
+
+    @responses.activate
+    def test_pushes(self):
+        self.add_callback()
+
+        self.assertEqual(hgmozilla.Pushlog.get_last_push_id(), 50)
+        pushes = list(hgmozilla.Pushlog.iter_pushes(start_id=5, page_size=7))
+        self.assertEqual([i for i, _ in pushes], list(range(6, 51)))
+        self.assertEqual(pushes[0][1]["changesets"][0]["desc"], "Bug 6")
+        # the last push id and 7 pages
+        self.assertEqual(len(responses.calls), 2 + 7)
+
+    @responses.activate
+    def test_pushes_results(self):
+        self.add_callback()
+        connections = []
+        results_sizes = []
+
+        def exec_queries(connection, queries=None):
+            if connection not in connections:
+                connections.append(connection)
+            results_sizes.append(len(connection.results))
+            return hgmozilla.Mercurial.exec_queries(connection, queries)
+
+        with mock.patch.object(hgmozilla.Pushlog, "exec_queries", exec_queries):
+            pushes = list(
+                hgmozilla.Pushlog.iter_pushes(start_id=0, end_id=50, page_size=5)
+            )
+
+        self.assertEqual([i for i, _ in pushes], list(range(1, 51)))
+        # the consumed pages aren't kept by the connection
+        self.assertLessEqual(max(results_sizes), hgmozilla.Pushlog.MAX_PAGES)
+        self.assertEqual(connections[0].results, [])
+
+    @responses.activate
+    def test_pushes_by_date(self):
+        self.add_callback()
+
+        changesets = list(
+            hgmozilla.Pushlog.iter_changesets(
+                startdate=datetime(2020, 1, 1), page_size=4, full=False
+            )
+        )
+        self.assertEqual([i for i, _, _ in changesets], list(range(11, 21)))
+        self.assertEqual(changesets[-1][2], "%040x" % 20)
+
+    @responses.activate
+    def test_checkpoint(self):
+        self.add_callback()
+        checkpoint = os.path.join(self.tmpdir, "pushlog.json")
+
+        for push_id, _ in hgmozilla.Pushlog.iter_pushes(
+            end_id=30, page_size=10, checkpoint=checkpoint
+        ):
+            if push_id == 15:
+                break
+
+        pushes = hgmozilla.Pushlog.iter_pushes(
+            end_id=30, page_size=10, checkpoint=checkpoint
+        )
+        self.assertEqual([i for i, _ in pushes], list(range(11, 31)))
+        with open(checkpoint) as f:
+            self.assertEqual(json.load(f), {hgmozilla.Pushlog.get_url("nightly"): 30})
+
+
 class FileInfoTest(unittest.TestCase):
     def test_fileinfo(self):
         path = "netwerk/protocol/http/nsHttpConnectionMgr.cpp"
@@ -180,5 +443,114 @@ class AnnotateTest(unittest.TestCase):
         self.assertTrue("annotate" in annotations)
 
 
+@unittest.skipIf(shutil.which("hg") is None, "Mercurial is not installed")
+class LocalRepositoryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        client = hglib.init(self.tmpdir, encoding="utf-8")
+        client.close()
+        client = hglib.open(self.tmpdir)
+        path = os.path.join(self.tmpdir, "file.txt")
+        for i, content in enumerate(["a\nb\n", "a\nc\n", "d\nc\n"]):
+            with open(path, "w") as f:
+                f.write(content)
+            if i == 0:
+                client.add([path.encode("utf-8")])
+            client.commit(
+                message=("Bug %d - Change %d r=reviewer" % (100 + i, i)).encode(),
+                user=b"Author <author@mozilla.com>",
+            )
+        client.bookmark(b"central")
+        client.close()
+        self.old_local_repo = hgmozilla.Mercurial.LOCAL_REPO
+        hgmozilla.Mercurial.LOCAL_REPO = self.tmpdir
+
+    def tearDown(self):
+        hgmozilla.Mercurial.LOCAL_REPO = self.old_local_repo
+        hgmozilla.LocalRepository.get(self.tmpdir).close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_revision(self):
+        tip = hgmozilla.Revision.get_revision()
+        self.assertEqual(tip["desc"], "Bug 102 - Change 2 r=reviewer")
+        self.assertEqual(tip["bookmarks"], ["central"])
+
+        data = {}
+        hgmozilla.Revision(
+            queries=[
+                Query(
+                    hgmozilla.Revision.get_url("nightly"),
+                    [{"node": tip["parents"][0][:12]}, {"node": "default"}],
+                    lambda json, data: data.update({json["desc"]: json}),
+                    data,
+                )
+            ]
+        ).wait()
+        self.assertEqual(
+            sorted(data.keys()),
+            ["Bug 101 - Change 1 r=reviewer", "Bug 102 - Change 2 r=reviewer"],
+        )
+
+    def test_raw_revision(self):
+        rev = hgmozilla.RawRevision.get_revision("central", "default")
+        self.assertTrue(rev.startswith("# HG changeset patch"))
+        self.assertIn("-a\n+d", rev)
+
+    def test_raw_revisions(self):
+        repo = hgmozilla.LocalRepository.get(self.tmpdir)
+        nodes = [
+            e["node"] for e in hgmozilla.FileInfo.get("file.txt")["file.txt"]["entries"]
+        ]
+        n2, n1, n0 = nodes
+
+        patches = repo.get_raw_revisions(
+            [n0, n0[:12], n1, n2, "default", "deadbeef" * 5], "central"
+        )
+        self.assertEqual(
+            sorted(patches.keys()), sorted([n0, n0[:12], n1, n2, "default"])
+        )
+        for node, change in [(n0, 0), (n0[:12], 0), (n1, 1), (n2, 2), ("default", 2)]:
+            self.assertIn("# Node ID " + nodes[2 - change], patches[node])
+            self.assertIn("Change %d r=reviewer" % change, patches[node])
+
+        self.assertEqual(repo.get_raw_revisions(["deadbeef" * 5], "central"), {})
+
+    def test_fileinfo(self):
+        info = hgmozilla.FileInfo.get("file.txt")["file.txt"]
+        self.assertEqual(len(info["entries"]), 3)
+        self.assertEqual(info["entries"][0]["desc"], "Bug 102 - Change 2 r=reviewer")
+
+    def test_log(self):
+        data = {}
+        hgmozilla.Mercurial(
+            queries=Query(
+                hgmozilla.Mercurial.get_repo_url("nightly") + "/json-log",
+                {"rev": 'file("path:file.txt") and date(">2000-01-01")'},
+                hgmozilla.Revision.default_handler,
+                data,
+            )
+        ).wait()
+        self.assertEqual(len(data["entries"]), 3)
+        self.assertEqual(data["entries"][0]["desc"], "Bug 102 - Change 2 r=reviewer")
+
+    def test_annotate(self):
+        annotations = hgmozilla.Annotate.get(["file.txt"])["file.txt"]["annotate"]
+        self.assertEqual([a["line"] for a in annotations], ["d\n", "c\n"])
+        self.assertEqual([a["lineno"] for a in annotations], [1, 2])
+        self.assertEqual(annotations[1]["user"], "Author <author@mozilla.com>")
+
+        # A missing file doesn't prevent the other ones to be annotated
+        annotations = hgmozilla.Annotate.get(["missing.txt", "file.txt"])
+        self.assertEqual(annotations["missing.txt"], {})
+        self.assertEqual(len(annotations["file.txt"]["annotate"]), 2)
+
+    def test_push_dates(self):
+        with self.assertRaises(Exception):
+            HGFileInfo("file.txt")
+
+        fi = HGFileInfo("file.txt", date_type="creation")
+        self.assertEqual(len(fi.get("file.txt")["patches"]), 3)
+
+
 if __name__ == "__main__":
     unittest.main()
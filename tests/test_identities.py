@@ -0,0 +1,155 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import warnings
+
+import responses
+
+from libmozdata import patchanalysis
+from libmozdata.bugzilla import BugzillaUser
+from libmozdata.identities import IdentityCache
+
+
+class IdentityCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, "identities.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cache(self):
+        cache = IdentityCache(self.path)
+        self.assertEqual(
+            cache.set("mt", "mt@mozilla.com", IdentityCache.CONFIDENCE_SEARCH),
+            "mt@mozilla.com",
+        )
+        # a less confident resolution doesn't replace the identity
+        self.assertEqual(
+            cache.set("mt", "mt@gmail.com", IdentityCache.CONFIDENCE_RELAXED),
+            "mt@mozilla.com",
+        )
+        self.assertEqual(
+            cache.set("mt", "martin.thomson@gmail.com", IdentityCache.CONFIDENCE_BUG),
+            "martin.thomson@gmail.com",
+        )
+        cache["foo@bar.com"] = ["foo@bar.com", "foo@mozilla.com"]
+        cache["old"] = "old@mozilla.com"
+        del cache["old"]
+
+        cache = IdentityCache(self.path)
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn("old", cache)
+        self.assertEqual(cache["mt"], "martin.thomson@gmail.com")
+        self.assertEqual(cache["foo@bar.com"], ["foo@bar.com", "foo@mozilla.com"])
+        entry = cache.get_entry("mt")
+        self.assertEqual(entry["confidence"], IdentityCache.CONFIDENCE_BUG)
+        self.assertIn("timestamp", entry)
+
+        cache.compact()
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+
+    def test_unresolved(self):
+        cache = IdentityCache(self.path)
+        self.assertIsNone(cache.set_unresolved("nobody"))
+        self.assertTrue(cache.is_unresolved("nobody"))
+        self.assertTrue(IdentityCache(self.path).is_unresolved("nobody"))
+        self.assertFalse(
+            IdentityCache(self.path, unresolved_ttl=-1).is_unresolved("nobody")
+        )
+
+        # a resolution replaces an unresolved name but not the reverse
+        cache.set("nobody", "nobody@mozilla.com", IdentityCache.CONFIDENCE_RELAXED)
+        self.assertFalse(cache.is_unresolved("nobody"))
+        self.assertEqual(cache.set_unresolved("nobody"), "nobody@mozilla.com")
+        self.assertEqual(IdentityCache(self.path)["nobody"], "nobody@mozilla.com")
+
+    def test_seed(self):
+        export = os.path.join(self.tmpdir, "export.json")
+        with open(export, "w") as f:
+            json.dump({"mt": "martin.thomson@gmail.com"}, f)
+
+        cache = IdentityCache(data=export)
+        cache.load([{"key": "bz", "value": "bz@mozilla.com", "confidence": 0.5}])
+        self.assertEqual(
+            dict(cache), {"mt": "martin.thomson@gmail.com", "bz": "bz@mozilla.com"}
+        )
+        self.assertEqual(cache.get_entry("bz")["confidence"], 0.5)
+
+    def test_threads(self):
+        cache = IdentityCache(self.path)
+        results = []
+
+        def resolve(i):
+            results.append(cache.setdefault("name", "email%d@mozilla.com" % i))
+
+        threads = [threading.Thread(target=resolve, args=(i,)) for i in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(IdentityCache(self.path)["name"], results[0])
+
+    @responses.activate
+    def test_warm_match(self):
+        # no response is registered, so any request would fail
+        cache = IdentityCache(self.path)
+        cache.set("mt", "martin.thomson@gmail.com", IdentityCache.CONFIDENCE_SEARCH)
+        cache.set("foo@bar.com", ["foo@bar.com", "foo@mozilla.com"])
+
+        cache = IdentityCache(self.path)
+        self.assertEqual(
+            patchanalysis.reviewer_match(
+                "mt", {"martin.thomson@gmail.com"}, [], reviewer_cache=cache
+            ),
+            "martin.thomson@gmail.com",
+        )
+        self.assertEqual(
+            patchanalysis.author_match(
+                "foo@bar.com", "Foo", {"foo@mozilla.com"}, [], author_cache=cache
+            ),
+            {"foo@bar.com", "foo@mozilla.com"},
+        )
+        self.assertEqual(len(responses.calls), 0)
+
+    @responses.activate
+    def test_warm_unresolved(self):
+        responses.add(
+            responses.GET,
+            BugzillaUser.API_URL,
+            json={"users": [], "faults": []},
+        )
+
+        def match(cache):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                return (
+                    patchanalysis.reviewer_match(
+                        "nobody", set(), [], reviewer_cache=cache
+                    ),
+                    patchanalysis.author_match(
+                        "no@body.com", "No Body", set(), [], author_cache=cache
+                    ),
+                )
+
+        self.assertEqual(match(IdentityCache(self.path)), (None, set()))
+        self.assertEqual(len(responses.calls), 2)
+
+        # the names aren't searched again
+        responses.calls.reset()
+        self.assertEqual(match(IdentityCache(self.path)), (None, set()))
+        self.assertEqual(len(responses.calls), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+# This Source Code Form is subject to the terms of the Mozilla Public
+# License, v. 2.0. If a copy of the MPL was not distributed with this file,
+# You can obtain one at http://mozilla.org/MPL/2.0/.
+
+import subprocess
+import sys
+import unittest
+
+
+class LazyImportTest(unittest.TestCase):
+    MODULES = [
+        "BZInfo",
+        "FileStats",
+        "HGFileInfo",
+        "bugzilla",
+        "buildhub",
+        "clouseau",
+        "comments",
+        "config",
+        "connection",
+        "fx_trains",
+        "handler",
+        "hgmozilla",
+        "identities",
+        "lando",
+        "modules",
+        "patchanalysis",
+        "phabricator",
+        "redash",
+        "socorro",
+        "utils",
+        "vcs_map",
+        "versions",
+        "wiki_parser",
+    ]
+    # The modules which are only imported when they're used
+    LAZY_IMPORTS = ["argparse", "hglib", "icalendar", "whatthepatch"]
+
+    def run_python(self, code, *options):
+        return subprocess.run(
+            [sys.executable] + list(options) + ["-c", code],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+            check=True,
+        )
+
+    def test_lazy_imports(self):
+        for module in self.MODULES:
+            res = self.run_python(
+                "import sys, libmozdata.%s;"
+                "print(' '.join(m for m in %r if m in sys.modules))"
+                % (module, self.LAZY_IMPORTS)
+            )
+            self.assertEqual(res.stdout.split(), [], module)
+
+    def test_lazy_data(self):
+        res = self.run_python(
+            "import libmozdata.modules as m, libmozdata.patchanalysis as p;"
+            "print(getattr(m, '__index') is None, getattr(p, '__hginfos') is None);"
+            "m.module_from_path('xpcom/string');"
+            "print(getattr(m, '__index') is None)"
+        )
+        self.assertEqual(res.stdout.split(), ["True", "True", "False"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -66,6 +66,23 @@ class ModulesTest(unittest.TestCase):
             "Build and Release Tools",
         )
 
+    def test_modules_from_paths(self):
+        paths = [
+            "xpcom/string/nsString.cpp",
+            "doesntexist",
+            "dom/system/gonk/nfc/Nfc.js",
+            "xpcom/string/nsString.cpp",
+            "js/public/GCPolicyAPI.h",
+        ]
+        self.assertEqual(
+            modules.modules_from_paths(paths),
+            [modules.module_from_path(path) for path in paths],
+        )
+        self.assertEqual(
+            [m and m["name"] for m in modules.modules_from_paths(paths)],
+            ["String", None, "Near Field Communication", "String", "JavaScript"],
+        )
+
     def test_module_info(self):
         self.assertEqual(modules.module_info("XPCOM")["name"], "XPCOM")
         self.assertEqual(modules.module_info("xpcom")["name"], "XPCOM")
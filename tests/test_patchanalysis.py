@@ -4,16 +4,18 @@
 
 import json
 import os
+import re
 import sys
 import unittest
 import warnings
 from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlparse
 
 import pytz
 import responses
 from requests.exceptions import HTTPError
 
-from libmozdata import patchanalysis, utils, versions
+from libmozdata import hgmozilla, patchanalysis, utils, versions
 from libmozdata.bugzilla import Bugzilla
 from libmozdata.hgmozilla import Mercurial
 from libmozdata.socorro import Socorro
@@ -778,6 +780,225 @@ class PatchAnalysisTest(MockTestCase):
             info["land"]["nightly"], utils.get_date_ymd("2011-07-07 19:25:02")
         )
 
+    @responses.activate
+    def test_patch_analysis_many(self):
+        patches = [
+            (
+                hgmozilla.RawRevision.get_revision("central", rev),
+                {"author@mozilla.com"},
+                {"reviewer@mozilla.com"},
+                datetime(2016, 6, 1, tzinfo=pytz.UTC),
+            )
+            for rev in ["1584ba8c1b86", "f5578fdc50ef", "8364cb62506e"]
+        ]
+        expected = [patchanalysis.patch_analysis(*patch) for patch in patches]
+
+        results = list(patchanalysis.patch_analysis_many(patches, processes=2))
+        self.assertEqual(results, list(enumerate(expected)))
+
+        results = patchanalysis.patch_analysis_many(
+            patches, processes=2, ordered=False, max_pending=1
+        )
+        self.assertEqual(sorted(results), list(enumerate(expected)))
+
+    @responses.activate
+    def test_bug_analysis_many(self):
+        bugs = [
+            patchanalysis._get_bugs([bug_id])[bug_id]
+            for bug_id in [901821, 859425, 699633]
+        ]
+        infos = patchanalysis.bug_analysis_many(bugs, chunk_size=2)
+
+        self.assertEqual(list(infos.keys()), [901821, 859425, 699633])
+        for bug in bugs:
+            self.assertEqual(infos[bug["id"]], patchanalysis.bug_analysis(bug))
+        self.assertEqualPatches(infos[859425]["patches"], 859425)
+
+
+class PatchInfoTest(unittest.TestCase):
+    REVISION = "1584ba8c1b86"
+
+    def bugzilla_callback(self, request):
+        url = urlparse(request.url)
+        query = dict(parse_qsl(url.query))
+        path = url.path.split("/")
+        if path[-1] == "comment":
+            ids = [path[-2]] + query.get("ids", "").split(",")
+            text = "https://hg.mozilla.org/mozilla-central/rev/" + self.REVISION
+            data = {
+                "bugs": {
+                    i: {"comments": [{"text": text, "time": "2016-06-01T00:00:00Z"}]}
+                    for i in ids
+                    if i
+                }
+            }
+        elif path[-1] == "history":
+            ids = [path[-2]] + query.get("ids", "").split(",")
+            data = {"bugs": [{"id": int(i), "history": []} for i in ids if i]}
+        else:
+            data = {
+                "bugs": [
+                    {"id": int(i), "cf_status_firefox52": "affected"}
+                    for i in query["id"].split(",")
+                ]
+            }
+        return (200, {}, json.dumps(data))
+
+    @responses.activate
+    def test_shared_revision(self):
+        responses.add_callback(
+            responses.GET,
+            re.compile("^" + re.escape(Bugzilla.API_URL)),
+            callback=self.bugzilla_callback,
+            content_type="application/json",
+        )
+        responses.add(
+            responses.GET,
+            hgmozilla.Revision.get_url("nightly"),
+            json={
+                "node": self.REVISION + "f9c4de5ccda5241cef36e80f042c",
+                "desc": "Bug 1 - Foo. r=bar",
+                "pushdate": [1464739200, 0],
+            },
+        )
+
+        hgmozilla.Mercurial.cache.clear()
+        info = patchanalysis.get_patch_info(
+            ["1", "2"], base_versions={"nightly": 52}, channels=["nightly"]
+        )
+
+        # the revision is only for bug 1 but it's requested once
+        self.assertEqual(list(info.keys()), ["1"])
+        self.assertEqual(info["1"]["affected"], {"nightly"})
+        self.assertEqual(
+            info["1"]["land"]["nightly"], utils.get_date_ymd("2016-06-01 00:00:00")
+        )
+        hg_calls = [
+            call
+            for call in responses.calls
+            if call.request.url.startswith(hgmozilla.Mercurial.HG_URL)
+        ]
+        self.assertEqual(len(hg_calls), 1)
+
+    @responses.activate
+    def test_backout_after_cache(self):
+        responses.add_callback(
+            responses.GET,
+            re.compile("^" + re.escape(Bugzilla.API_URL)),
+            callback=self.bugzilla_callback,
+            content_type="application/json",
+        )
+        node = self.REVISION + "f9c4de5ccda5241cef36e80f042c"
+        url = hgmozilla.Revision.get_url("nightly")
+        # no pushdate as with a local repository
+        responses.add(
+            responses.GET,
+            url,
+            json={"node": node, "desc": "Bug 1 - Foo", "date": [1464739200, 0]},
+        )
+
+        def get_patch_info():
+            return patchanalysis.get_patch_info(
+                ["1"], base_versions={"nightly": 52}, channels=["nightly"]
+            )
+
+        hgmozilla.Mercurial.cache.clear()
+        info = get_patch_info()
+        self.assertEqual(
+            info["1"]["land"]["nightly"], utils.get_date_ymd("2016-06-01 00:00:00")
+        )
+
+        # the cached revision isn't used since it could have been backed out
+        responses.replace(
+            responses.GET,
+            url,
+            json={
+                "node": node,
+                "desc": "Bug 1 - Foo",
+                "pushdate": [1464739200, 0],
+                "backedoutby": "2584ba8c1b86",
+            },
+        )
+        self.assertEqual(get_patch_info(), {})
+
+        # but a backed out revision is final
+        self.assertEqual(get_patch_info(), {})
+        hg_calls = [
+            call for call in responses.calls if call.request.url.startswith(url)
+        ]
+        self.assertEqual(len(hg_calls), 2)
+
+
+class DiffStatsTest(unittest.TestCase):
+    PATCH = """# HG changeset patch
+# User Foo <foo@bar.com>
+# Node ID 1584ba8c1b86f9c4de5ccda5241cef36e80f042c
+Bug 1234 - Foo. r=bar
+
+diff --git a/foo b/bar
+rename from foo
+rename to bar
+diff --git a/new b/new
+new file mode 100644
+diff --git a/old b/old
+deleted file mode 100644
+--- a/old
++++ /dev/null
+@@ -1,2 +0,0 @@
+-a
+-b
+diff --git a/dom/tests/c.cpp b/dom/tests/c.cpp
+--- a/dom/tests/c.cpp
++++ b/dom/tests/c.cpp
+@@ -1,3 +1,3 @@
+ x
+--- y
+++++ z
+ w
+@@ -10 +10,2 @@
+-v
+\\ No newline at end of file
++v
++@@ -1 +1 @@
+diff --git a/m b/m
+old mode 100644
+new mode 100755
+diff --git a/b.bin b/b.bin
+Binary file b.bin has changed
+"""
+
+    def test_diff_stats(self):
+        stats = patchanalysis.get_diff_stats(self.PATCH)
+        self.assertEqual(
+            stats, patchanalysis._get_diff_stats_with_whatthepatch(self.PATCH)
+        )
+        self.assertEqual(
+            [(s["old_path"], s["new_path"], s["changes"]) for s in stats],
+            [
+                ("foo", "bar", None),
+                ("new", "new", None),
+                ("old", "old", 2),
+                ("dom/tests/c.cpp", "dom/tests/c.cpp", 7),
+                ("m", "m", None),
+                ("b.bin", "b.bin", None),
+            ],
+        )
+        self.assertEqual((stats[3]["add"], stats[3]["del"]), (3, 2))
+        self.assertTrue(stats[0]["rename"])
+        self.assertTrue(stats[1]["new_file"])
+        self.assertTrue(stats[2]["deleted_file"])
+        self.assertTrue(stats[4]["mode"])
+        self.assertTrue(stats[5]["binary"])
+
+    def test_diff_stats_fallback(self):
+        # not a git diff
+        patch = "--- a/foo\n+++ b/foo\n@@ -1 +1 @@\n-a\n+b\n"
+        stats = patchanalysis.get_diff_stats(patch)
+        self.assertEqual(
+            [(s["old_path"], s["new_path"], s["changes"]) for s in stats],
+            [("foo", "foo", 2)],
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,7 +2,15 @@
 # License, v. 2.0. If a copy of the MPL was not distributed with this file,
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
+import json
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
+
+import responses
 
 from libmozdata import socorro
 
@@ -25,6 +33,144 @@ class SuperSearchTest(unittest.TestCase):
         self.assertIsNotNone(data)
 
 
+class ResultsSpy(object):
+    def spy_results(self):
+        """Record the number of futures kept by the connections"""
+        self.connections = []
+        self.results_sizes = []
+
+        def exec_queries(connection, queries=None):
+            if connection not in self.connections:
+                self.connections.append(connection)
+            self.results_sizes.append(len(connection.results))
+            return socorro.Connection.exec_queries(connection, queries)
+
+        return mock.patch.object(socorro.Socorro, "exec_queries", exec_queries)
+
+
+class SuperSearchIterTest(ResultsSpy, unittest.TestCase):
+    TOTAL = 25
+
+    def callback(self, request):
+        params = parse_qs(urlparse(request.url).query)
+        offset = int(params["_results_offset"][0])
+        number = int(params["_results_number"][0])
+        hits = [
+            {"uuid": "uuid%d" % i, "build_id": str(i)}
+            for i in range(offset, min(offset + number, self.TOTAL))
+        ]
+        self.assertEqual(params["_columns"], ["uuid", "build_id"])
+        return (200, {}, json.dumps({"hits": hits, "total": self.TOTAL}))
+
+    @responses.activate
+    def test_iter_hits(self):
+        responses.add_callback(
+            responses.GET,
+            socorro.SuperSearch.URL,
+            callback=self.callback,
+            content_type="application/json",
+        )
+        params = {"product": "Firefox", "signature": "=foo"}
+        hits = socorro.SuperSearch.iter_hits(
+            params, columns=["uuid", "build_id"], page_size=10, max_pages=2
+        )
+        with self.spy_results():
+            hits = list(hits)
+        self.assertEqual(
+            [hit["uuid"] for hit in hits], ["uuid%d" % i for i in range(self.TOTAL)]
+        )
+        # the retrieved pages aren't kept
+        self.assertLessEqual(max(self.results_sizes), 2)
+        self.assertEqual(self.connections[0].results, [])
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(params, {"product": "Firefox", "signature": "=foo"})
+
+        responses.calls.reset()
+        params = dict(params, _results_offset=5, _results_number=12)
+        hits = socorro.SuperSearch.iter_hits(
+            params, columns=["uuid", "build_id"], page_size=10
+        )
+        self.assertEqual(
+            [hit["build_id"] for hit in hits], [str(i) for i in range(5, 17)]
+        )
+        self.assertEqual(len(responses.calls), 2)
+
+
+class SuperSearchShardsTest(unittest.TestCase):
+    # the signatures crashing each day
+    CRASHES = {
+        "2020-01-01": {"foo": 3, "bar": 1},
+        "2020-01-02": {"foo": 1, "bar": 2, "baz": 2},
+        "2020-01-03": {"qux": 5},
+    }
+
+    def callback(self, request):
+        params = parse_qs(urlparse(request.url).query)
+        self.assertEqual(params["_facets"], ["signature"])
+        self.assertEqual(len(params["date"]), 2)
+        day = params["date"][0][2:]
+        crashes = self.CRASHES[day]
+        data = {
+            "hits": [],
+            "total": sum(crashes.values()),
+            "facets": {
+                "signature": [
+                    {
+                        "term": signature,
+                        "count": count,
+                        "facets": {"cardinality_install_time": {"value": count}},
+                    }
+                    for signature, count in sorted(
+                        crashes.items(), key=lambda x: -x[1]
+                    )[:2]
+                ],
+                "histogram_date": [{"term": day + "T00:00:00+00:00", "count": 1}],
+            },
+            "errors": [],
+        }
+        return (200, {}, json.dumps(data))
+
+    @responses.activate
+    def test_get_sharded(self):
+        responses.add_callback(
+            responses.GET,
+            socorro.SuperSearch.URL,
+            callback=self.callback,
+            content_type="application/json",
+        )
+        params = {
+            "signature": "!=",
+            "_facets": ["signature"],
+            "_facets_size": 2,
+            "_results_number": 0,
+        }
+        res = socorro.SuperSearch.get_sharded(params, "2020-01-01", "2020-01-04")
+
+        self.assertEqual(len(responses.calls), 3)
+        self.assertEqual(res["total"], 14)
+        self.assertEqual(res["hits"], [])
+        self.assertEqual(
+            res["facets"]["signature"],
+            [
+                {
+                    "term": "qux",
+                    "count": 5,
+                    "facets": {"cardinality_install_time": {"value": 5}},
+                },
+                # foo is also 3 but its count on 2020-01-02 is truncated
+                {
+                    "term": "bar",
+                    "count": 3,
+                    "facets": {"cardinality_install_time": {"value": 3}},
+                },
+            ],
+        )
+        self.assertEqual(
+            [item["term"][:10] for item in res["facets"]["histogram_date"]],
+            ["2020-01-01", "2020-01-02", "2020-01-03"],
+        )
+
+
 class ProcessedCrashTest(unittest.TestCase):
     def test_processed(self):
         uuid = []
@@ -45,6 +191,95 @@ class ProcessedCrashTest(unittest.TestCase):
         self.assertIsNotNone(processed)
 
 
+class ProcessedCrashBulkTest(ResultsSpy, unittest.TestCase):
+    CRASH_IDS = ["0%d-cafe" % i for i in range(5)]
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def callback(self, request):
+        params = parse_qs(urlparse(request.url).query)
+        self.assertEqual(params["datatype"], ["processed"])
+        crashid = params["crash_id"][0]
+        crash = {
+            "uuid": crashid,
+            "build": "20240101",
+            "os_name": "Linux",
+            "json_dump": {
+                "crashing_thread": 0,
+                "threads": [
+                    {
+                        "frames": [
+                            {"frame": 0, "function": "foo", "offset": "0x1"},
+                            {"frame": 1, "function": "bar", "offset": "0x2"},
+                        ]
+                    }
+                ],
+            },
+        }
+        return (200, {}, json.dumps(crash))
+
+    @responses.activate
+    def test_iter_processed(self):
+        responses.add_callback(
+            responses.GET,
+            socorro.ProcessedCrash.URL,
+            callback=self.callback,
+            content_type="application/json",
+        )
+        fields = ["build", "os_name", "json_dump.threads.frames.function"]
+        crashes = socorro.ProcessedCrash.iter_processed(
+            self.CRASH_IDS, fields=fields, max_pending=2, directory=self.tmpdir
+        )
+        with self.spy_results():
+            crashes = list(crashes)
+        # the retrieved responses aren't kept
+        self.assertLessEqual(max(self.results_sizes), 2)
+        self.assertEqual(self.connections[0].results, [])
+        self.assertEqual([crashid for crashid, _ in crashes], self.CRASH_IDS)
+        self.assertEqual(
+            crashes[0][1],
+            {
+                "build": "20240101",
+                "os_name": "Linux",
+                "json_dump": {
+                    "threads": [{"frames": [{"function": "foo"}, {"function": "bar"}]}]
+                },
+            },
+        )
+        self.assertEqual(len(responses.calls), 5)
+        self.assertTrue(
+            os.path.exists(os.path.join(self.tmpdir, "00", "00-cafe.json.gz"))
+        )
+
+        # The crashes are now read from the disk, with another projection
+        responses.calls.reset()
+        crashes = socorro.ProcessedCrash.iter_processed(
+            self.CRASH_IDS[:3] + ["05-cafe"],
+            fields=lambda crash: crash["json_dump"]["threads"][0]["frames"][0],
+            directory=self.tmpdir,
+        )
+        self.assertEqual(
+            dict(crashes),
+            {
+                crashid: {"frame": 0, "function": "foo", "offset": "0x1"}
+                for crashid in self.CRASH_IDS[:3] + ["05-cafe"]
+            },
+        )
+        self.assertEqual(len(responses.calls), 1)
+
+    def test_project(self):
+        crash = {"a": {"b": [{"c": 1, "d": 2}, 3, {"d": 4}]}, "e": 5}
+        self.assertIs(socorro.ProcessedCrash.project(crash, None), crash)
+        self.assertEqual(
+            socorro.ProcessedCrash.project(crash, ["a.b.d", "e", "f", "a.g"]),
+            {"a": {"b": [{"d": 2}, {}, {"d": 4}]}, "e": 5},
+        )
+
+
 class BugsTest(unittest.TestCase):
     def test_bugs(self):
         signature = []
@@ -69,6 +304,75 @@ class BugsTest(unittest.TestCase):
         self.assertIsNotNone(bugs)
 
 
+class SignatureChunksTest(unittest.TestCase):
+    SIGNATURES = ["sig%d | foo::bar<%s>" % (i, "x" * (i % 7)) for i in range(60)]
+
+    def bugs_callback(self, request):
+        self.assertLessEqual(len(request.url), 256)
+        signatures = parse_qs(urlparse(request.url).query)["signatures"]
+        hits = [
+            {"id": i, "signature": signature}
+            for signature in signatures
+            for i in range(int(signature[3 : signature.index(" ")]) % 3)
+        ]
+        return (200, {}, json.dumps({"hits": hits, "total": len(hits)}))
+
+    def first_date_callback(self, request):
+        self.assertLessEqual(len(request.url), 256)
+        signatures = parse_qs(urlparse(request.url).query)["signatures"]
+        hits = [{"signature": signature} for signature in signatures]
+        return (200, {}, json.dumps({"hits": hits, "total": len(hits)}))
+
+    def test_chunks_by_url_length(self):
+        chunks = list(
+            socorro.Socorro.chunks_by_url_length(
+                "https://foo.bar/",
+                "s",
+                ["a" * 10, "b&c", "d" * 100, "e"],
+                max_length=40,
+            )
+        )
+        self.assertEqual(chunks, [["a" * 10, "b&c"], ["d" * 100], ["e"]])
+
+    @responses.activate
+    @mock.patch.object(socorro.Socorro, "MAX_URL_LENGTH", 256)
+    def test_get_bugs(self):
+        responses.add_callback(
+            responses.GET,
+            socorro.Bugs.URL,
+            callback=self.bugs_callback,
+            content_type="application/json",
+        )
+        bugs = socorro.Bugs.get_bugs(self.SIGNATURES)
+        self.assertGreater(len(responses.calls), 1)
+        self.assertEqual(
+            {signature: sorted(ids) for signature, ids in bugs.items()},
+            {
+                signature: list(range(i % 3))
+                for i, signature in enumerate(self.SIGNATURES)
+            },
+        )
+
+        self.assertEqual(
+            socorro.Bugs.get_bugs(self.SIGNATURES[2]), {self.SIGNATURES[2]: [0, 1]}
+        )
+        self.assertEqual(socorro.Bugs.get_bugs([]), {})
+
+    @responses.activate
+    @mock.patch.object(socorro.Socorro, "MAX_URL_LENGTH", 256)
+    def test_get_signatures(self):
+        responses.add_callback(
+            responses.GET,
+            socorro.SignatureFirstDate.URL,
+            callback=self.first_date_callback,
+            content_type="application/json",
+        )
+        dates = socorro.SignatureFirstDate.get_signatures(self.SIGNATURES)
+        self.assertGreater(len(responses.calls), 1)
+        self.assertEqual([hit["signature"] for hit in dates], self.SIGNATURES)
+        self.assertEqual(socorro.SignatureFirstDate.get_signatures([]), [])
+
+
 class SignatureFirstDateTest(unittest.TestCase):
     def test_get_get_signatures(self):
         signature = [
@@ -188,6 +188,44 @@ class UtilsTest(unittest.TestCase):
             with open(html_path, "r") as html:
                 self.assertEqual(out, html.read())
 
+    def test_uplift_comment_renderer(self):
+        import glob
+
+        from libmozdata.patchanalysis import UpliftCommentRenderer
+
+        renderer = UpliftCommentRenderer(bugzilla_url="https://bugzilla.test")
+        out = renderer.render("See comment 4 in bug 1 (attachment 2)", bug_id=3)
+        self.assertEqual(
+            out,
+            '<div class="no-header">See <a href="https://bugzilla.test/show_bug.cgi?id=3#c4" target="_blank">Comment 4</a> in <a href="https://bugzilla.test/1" target="_blank">Bug 1</a> (<a href="https://bugzilla.test/attachment.cgi?id=2&action=edit" target="_blank">Attachment 2</a>)</div>',
+        )
+
+        # No link to the comments without a bug id
+        self.assertEqual(
+            renderer.render("comment 4"), '<div class="no-header">comment 4</div>'
+        )
+
+        # Batch rendering
+        renderer = UpliftCommentRenderer()
+        text_paths = sorted(glob.glob("tests/uplift/*.txt"))
+        texts = []
+        for text_path in text_paths:
+            with open(text_path, "r") as text:
+                texts.append(text.read())
+        outs = renderer.render_many(texts)
+        self.assertEqual(len(outs), len(text_paths))
+        for text_path, out in zip(text_paths, outs):
+            with open(text_path[:-4] + ".html", "r") as html:
+                self.assertEqual(out, html.read())
+
+        self.assertEqual(
+            renderer.render_many([("comment 1", 2), "bug 3"]),
+            [
+                '<div class="no-header"><a href="https://bugzilla.mozilla.org/show_bug.cgi?id=2#c1" target="_blank">Comment 1</a></div>',
+                '<div class="no-header"><a href="https://bugzilla.mozilla.org/3" target="_blank">Bug 3</a></div>',
+            ],
+        )
+
     def test_get_params_for_url(self):
         params = {"a": 1, "abc": 2, "efgh": 3, "bcd": [4, 5, 6]}
         self.assertEqual(
@@ -3,6 +3,10 @@
 # You can obtain one at http://mozilla.org/MPL/2.0/.
 
 import datetime
+import json
+import os
+import shutil
+import tempfile
 import unittest
 from contextlib import contextmanager
 
@@ -159,6 +163,49 @@ class VersionsTest(unittest.TestCase):
             ("48.0.2", datetime.datetime(2016, 8, 24, 7, 0, tzinfo=tzutc())),
         )
 
+    def test_version_index(self):
+        dates = {
+            "5.0": utils.get_date_ymd("2011-06-21"),
+            "6.0": utils.get_date_ymd("2011-08-16"),
+            "7.0": utils.get_date_ymd("2011-09-27"),
+        }
+        stability_dates = {
+            "6.0.1": utils.get_date_ymd("2011-08-26"),
+            "6.0.2": utils.get_date_ymd("2011-09-06"),
+        }
+        old = {
+            key: versions.__dict__.get(key)
+            for key in ["__version_dates", "__stability_version_dates"]
+        }
+        self.addCleanup(versions.__dict__.update, old)
+        versions.__dict__["__version_dates"] = dates
+        versions.__dict__["__stability_version_dates"] = stability_dates
+
+        self.assertEqual(versions.getMajorDate(6), dates["6.0"])
+        self.assertEqual(versions.getMajorDate("6.0.2"), dates["6.0"])
+        self.assertIsNone(versions.getMajorDate("8"))
+        self.assertEqual(versions.getDate("6"), dates["6.0"])
+        self.assertEqual(versions.getDate("6.0.2"), stability_dates["6.0.2"])
+
+        date = utils.get_date_ymd("2011-08-27")
+        self.assertEqual(versions.getCloserMajorRelease(date), ("7.0", dates["7.0"]))
+        self.assertEqual(
+            versions.getCloserMajorRelease(date, negative=True), ("6.0", dates["6.0"])
+        )
+        self.assertEqual(
+            versions.getCloserRelease(date), ("6.0.2", stability_dates["6.0.2"])
+        )
+        self.assertEqual(
+            versions.getCloserRelease(date, negative=True),
+            ("6.0.1", stability_dates["6.0.1"]),
+        )
+        with self.assertRaises(Exception):
+            versions.getCloserRelease(utils.get_date_ymd("2012-01-01"))
+
+        # The index is rebuilt when the data change
+        versions.__dict__["__stability_version_dates"] = {"6.0.3": dates["7.0"]}
+        self.assertEqual(versions.getDate("6.0.2"), dates["6.0"])
+
     def test_dual_esr(self):
         # Check esr & esr previous
         with self.setup_versions(
@@ -185,5 +232,105 @@ class VersionsTest(unittest.TestCase):
         )
 
 
+class VersionsCacheTest(unittest.TestCase):
+    VERSIONS = {
+        "FIREFOX_NIGHTLY": "55.0a1",
+        "FIREFOX_ESR": "52.1.1esr",
+        "FIREFOX_ESR_NEXT": None,
+        "LATEST_FIREFOX_RELEASED_DEVEL_VERSION": "54.0b6",
+        "LATEST_FIREFOX_VERSION": "53.0.2",
+    }
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.old = {
+            key: versions.__dict__[key]
+            for key in [
+                "CACHE_DIRECTORY",
+                "OFFLINE",
+                "__versions",
+                "__version_dates",
+                "__stability_version_dates",
+            ]
+        }
+        versions.CACHE_DIRECTORY = self.tmpdir
+        versions.OFFLINE = False
+        versions.__dict__["__version_dates"] = {
+            "53.0": utils.get_moz_date("2017-04-19")
+        }
+        self.reset()
+
+    def tearDown(self):
+        versions.wait_refresh()
+        versions.__dict__.update(self.old)
+        shutil.rmtree(self.tmpdir)
+
+    def reset(self):
+        # like in a new process
+        versions.__dict__["__versions"] = None
+        versions.__dict__["__stability_version_dates"] = None
+
+    def add_responses(self, nightly="55.0a1"):
+        responses.reset()
+        responses.add(
+            responses.GET,
+            versions.URL_VERSIONS,
+            json=dict(self.VERSIONS, FIREFOX_NIGHTLY=nightly),
+        )
+        responses.add(
+            responses.GET, versions.URL_STABILITY, json={"53.0.2": "2017-05-05"}
+        )
+
+    def set_age(self, name, age):
+        path = os.path.join(self.tmpdir, name + ".json")
+        with open(path) as f:
+            saved = json.load(f)
+        saved["timestamp"] -= age
+        with open(path, "w") as f:
+            json.dump(saved, f)
+
+    @responses.activate
+    def test_cache(self):
+        self.add_responses()
+        self.assertEqual(versions.get(base=True)["nightly"], 55)
+        self.assertEqual(versions.getDate("53.0.2"), utils.get_moz_date("2017-05-05"))
+        self.assertEqual(len(responses.calls), 2)
+
+        # fresh data are read from the disk
+        self.reset()
+        self.assertEqual(versions.get(base=True)["nightly"], 55)
+        self.assertEqual(versions.getDate("53.0.2"), utils.get_moz_date("2017-05-05"))
+        self.assertEqual(len(responses.calls), 2)
+
+        # stale data are used while they're refreshed
+        self.add_responses(nightly="56.0a1")
+        self.set_age("versions", versions.CACHE_TTL + 1)
+        self.reset()
+        self.assertEqual(versions.get(base=True)["nightly"], 55)
+        versions.wait_refresh()
+        self.assertEqual(len(responses.calls), 1)
+        self.assertEqual(versions.get(base=True)["nightly"], 56)
+        self.reset()
+        self.assertEqual(versions.get(base=True)["nightly"], 56)
+
+    @responses.activate
+    def test_offline(self):
+        versions.OFFLINE = True
+        with self.assertRaises(Exception):
+            versions.get()
+
+        versions.OFFLINE = False
+        self.add_responses()
+        versions.get()
+        self.set_age("versions", versions.CACHE_TTL + 1)
+
+        versions.OFFLINE = True
+        responses.reset()
+        self.reset()
+        self.assertEqual(versions.get(base=True)["nightly"], 55)
+        versions.wait_refresh()
+        self.assertEqual(len(responses.calls), 0)
+
+
 if __name__ == "__main__":
     unittest.main()